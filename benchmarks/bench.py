@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+"""Benchmarks for the frame, address and command hot paths.
+
+Run from the top of the source tree:
+
+    python benchmarks/bench.py [--json FILE] [--repeat N] [PATTERN ...]
+
+Each benchmark times a batch of operations with ``timeit`` and reports
+the best time per operation over several repeats.  With ``--json`` the
+results are also written as JSON, one object per benchmark with the
+keys ``name``, ``operations``, ``seconds_per_op`` and ``ops_per_second``,
+sorted by name, so that results of different releases can be compared.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from dali import address
+from dali import command
+from dali import frame
+from dali.device import general as generaldevice
+from dali.driver.daliserver import pack_command
+from dali.driver.daliserver import unpack_response
+from dali.driver.simulator import SimulatedBus
+from dali.driver.simulator import SimulatorDriver
+from dali.driver.tridonic import TridonicDALIUSBDriver
+from dali.gear import emergency
+from dali.gear import general as generalgear
+from dali.gear import incandescent
+from dali.gear import led
+import dali.bus
+
+
+_benchmarks = []
+
+
+def benchmark(name):
+    """Register a benchmark.
+
+    The decorated function does the setup and returns a tuple of the
+    callable to be timed and the number of operations it performs per
+    call.
+    """
+    def register(func):
+        _benchmarks.append((name, func))
+        return func
+    return register
+
+
+# Frames used as input, a mix of all kinds of commands
+_frames16 = [(a << 8) | b for a in range(0, 0x100, 5)
+             for b in range(0, 0x100, 9)]
+_frames24 = [(a << 16) | (0xfe << 8) | b for a in range(1, 0x100, 6)
+             for b in range(0, 0x100, 17)]
+
+
+@benchmark('frame.construct_int')
+def frame_construct_int():
+    frames = _frames16
+    ForwardFrame = frame.ForwardFrame
+
+    def run():
+        for d in frames:
+            ForwardFrame(16, d)
+    return run, len(frames)
+
+
+@benchmark('frame.construct_bytes')
+def frame_construct_bytes():
+    data = [(d >> 8, d & 0xff) for d in _frames16]
+    ForwardFrame = frame.ForwardFrame
+
+    def run():
+        for d in data:
+            ForwardFrame(16, d)
+    return run, len(data)
+
+
+@benchmark('frame.slice')
+def frame_slice():
+    frames = [frame.ForwardFrame(16, d) for d in _frames16]
+
+    def run():
+        for f in frames:
+            f[15:8]
+            f[7:0]
+            f[8]
+    return run, len(frames) * 3
+
+
+@benchmark('frame.pack')
+def frame_pack():
+    frames = [frame.ForwardFrame(16, d) for d in _frames16]
+
+    def run():
+        for f in frames:
+            f.pack
+    return run, len(frames)
+
+
+@benchmark('address.from_frame.16bit')
+def address_from_frame_16():
+    frames = [frame.ForwardFrame(16, d) for d in _frames16]
+    from_frame = address.from_frame
+
+    def run():
+        for f in frames:
+            from_frame(f)
+    return run, len(frames)
+
+
+@benchmark('address.from_frame.24bit')
+def address_from_frame_24():
+    frames = [frame.ForwardFrame(24, d) for d in _frames24]
+    from_frame = address.from_frame
+
+    def run():
+        for f in frames:
+            from_frame(f)
+    return run, len(frames)
+
+
+@benchmark('address.add_to_frame')
+def address_add_to_frame():
+    addresses = [address.Short(a) for a in range(64)] \
+        + [address.Group(g) for g in range(16)] \
+        + [address.Broadcast(), address.BroadcastUnaddressed()]
+    f = frame.ForwardFrame(16, 0)
+
+    def run():
+        for a in addresses:
+            a.add_to_frame(f)
+    return run, len(addresses)
+
+
+@benchmark('command.from_frame.16bit')
+def command_from_frame_16():
+    frames = [frame.ForwardFrame(16, d) for d in _frames16]
+    from_frame = command.from_frame
+
+    def run():
+        for f in frames:
+            from_frame(f)
+    return run, len(frames)
+
+
+@benchmark('command.from_frame.24bit')
+def command_from_frame_24():
+    frames = [frame.ForwardFrame(24, d) for d in _frames24]
+    from_frame = command.from_frame
+
+    def run():
+        for f in frames:
+            from_frame(f)
+    return run, len(frames)
+
+
+@benchmark('command.from_frame.devicetype')
+def command_from_frame_devicetype():
+    frames = [frame.ForwardFrame(16, (a, b)) for a in range(1, 0x100, 8)
+              for b in range(0xe0, 0x100)]
+    from_frame = command.from_frame
+
+    def run():
+        for f in frames:
+            from_frame(f, 6)
+    return run, len(frames)
+
+
+@benchmark('command.from_frames')
+def command_from_frames():
+    frames = _frames16 * 4
+
+    def run():
+        command.from_frames(frames)
+    return run, len(frames)
+
+
+def _samples(module):
+    """One (class, arguments) pair for every command class in module."""
+    samples = []
+    for cls in command.Command._commands:
+        if cls.__module__ != module.__name__:
+            continue
+        framesize = cls._framesize
+        high, low = cls._index_keys() or ((), None)
+        middles = (0xfe, 0xff, 0x00, 0x01) if framesize == 24 else (None,)
+        for h in high:
+            for m in middles:
+                d = (h << 8) | (low[0] if low else 0)
+                if m is not None:
+                    d = (h << 16) | (m << 8) | (d & 0xff)
+                c = command.from_frame(
+                    frame.ForwardFrame(framesize, d), cls._devicetype)
+                if c.__class__ is cls:
+                    break
+            if c.__class__ is cls:
+                break
+        else:
+            continue
+        args = c.parameters
+        if getattr(c, 'destination', None) is not None:
+            args = (c.destination,) + args
+        samples.append((cls, args))
+    return samples
+
+
+def _construct(module):
+    def setup():
+        samples = _samples(module)
+
+        def run():
+            for cls, args in samples:
+                cls(*args).frame
+        return run, len(samples)
+    return setup
+
+
+for _module in (generalgear, emergency, incandescent, led, generaldevice):
+    benchmark('command.construct.{}'.format(
+        _module.__name__.replace('dali.', '')))(_construct(_module))
+
+
+@benchmark('command.cache.gear.general')
+def command_cache():
+    samples = _samples(generalgear)
+    cache = command.CommandCache()
+    for cls, args in samples:
+        cache(cls, *args)
+
+    def run():
+        for cls, args in samples:
+            cache(cls, *args).frame
+    return run, len(samples)
+
+
+@benchmark('driver.tridonic.construct')
+def driver_tridonic_construct():
+    driver = TridonicDALIUSBDriver()
+    commands = [command.from_frame(frame.ForwardFrame(16, d))
+                for d in _frames16]
+
+    def run():
+        for c in commands:
+            driver.construct(c)
+    return run, len(commands)
+
+
+@benchmark('driver.tridonic.construct.24bit')
+def driver_tridonic_construct_24():
+    driver = TridonicDALIUSBDriver()
+    commands = [command.from_frame(frame.ForwardFrame(24, d))
+                for d in _frames24]
+
+    def run():
+        for c in commands:
+            driver.construct(c)
+    return run, len(commands)
+
+
+@benchmark('driver.tridonic.extract')
+def driver_tridonic_extract():
+    driver = TridonicDALIUSBDriver()
+    packets = []
+    for n, d in enumerate(_frames16):
+        for dr, ty in ((0x11, 0x73), (0x12, 0x72), (0x12, 0x71)):
+            data = bytearray(64)
+            data[0:9] = bytearray(
+                (dr, ty, 0, 0, d >> 8, d & 0xff, 0, 0, n & 0xff))
+            packets.append(data)
+
+    def run():
+        for data in packets:
+            driver.extract(data)
+    return run, len(packets)
+
+
+@benchmark('driver.daliserver.pack_command')
+def driver_daliserver_pack():
+    commands = [command.from_frame(frame.ForwardFrame(16, d))
+                for d in _frames16]
+
+    def run():
+        for c in commands:
+            pack_command(c)
+    return run, len(commands)
+
+
+@benchmark('driver.daliserver.unpack_response')
+def driver_daliserver_unpack():
+    c = generalgear.QueryActualLevel(address.Short(1))
+    results = [bytearray((2, status, rval, 0)) for status in (0, 1, 255)
+               for rval in range(256)]
+    results = [bytes(r) for r in results]
+
+    def run():
+        for r in results:
+            unpack_response(c, r)
+    return run, len(results)
+
+
+@benchmark('simulator.scan')
+def simulator_scan():
+    simulated = SimulatedBus(seed=0)
+    simulated.populate(32, addressed=True)
+    driver = SimulatorDriver(simulated)
+
+    def run():
+        dali.bus.Bus(interface=driver).scan()
+    return run, 64
+
+
+def run_benchmarks(patterns=None, repeat=5, target=0.2):
+    """Run the benchmarks matching any of patterns (shell style), all if
+    there are none.
+
+    :param repeat: number of timing runs, the best one is reported
+    :param target: approximate duration of a timing run in seconds
+    :return: list of result dicts
+    """
+    results = []
+    for name, setup in sorted(_benchmarks):
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        func, operations = setup()
+        timer = timeit.Timer(func)
+        number = 1
+        while True:
+            t = timer.timeit(number)
+            if t >= target / 10 or number >= 1 << 20:
+                break
+            number *= 2
+        number = max(1, int(number * target / max(t, 1e-9)))
+        best = min(timer.repeat(repeat, number)) / number
+        per_op = best / operations
+        results.append({
+            'name': name,
+            'operations': operations,
+            'seconds_per_op': per_op,
+            'ops_per_second': 1 / per_op,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('patterns', nargs='*', metavar='PATTERN',
+                        help='only run benchmarks matching PATTERN')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write results as JSON to FILE, - for stdout')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timing runs per benchmark')
+    parser.add_argument('--target', type=float, default=0.2,
+                        help='duration of a timing run in seconds')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.patterns, args.repeat, args.target)
+    if args.json != '-':
+        for r in results:
+            print('{:<40} {:>12.3f} us/op {:>14.0f} op/s'.format(
+                r['name'], r['seconds_per_op'] * 1e6, r['ops_per_second']))
+    if args.json:
+        output = json.dumps({
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'results': results,
+        }, indent=2, sort_keys=True)
+        if args.json == '-':
+            print(output)
+        else:
+            with open(args.json, 'w') as f:
+                f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
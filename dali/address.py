@@ -26,10 +26,67 @@ from __future__ import absolute_import
 from dali.compat import add_metaclass
 from dali.compat import python_2_unicode_compatible
 from dali.exceptions import IncompatibleFrame
+from dali.frame import ForwardFrame
 
 
 _bad_frame_length = IncompatibleFrame("Unsupported frame size")
 
+# Position of the address byte in frames of the supported sizes.  Only
+# the 7 most significant bits of the address byte are used to decode
+# the address; in 24-bit frames the least significant bit must be set.
+_address_shift = {16: 9, 24: 17}
+
+# Flyweight cache of address and instance objects, keyed by class and
+# value
+_flyweights = {}
+
+
+def _flyweight(cls, value):
+    """Return the object of class cls with value, creating it if
+    necessary.  Its value is stored in the attribute named by
+    cls._valueattr.
+    """
+    key = (cls, value)
+    obj = _flyweights.get(key)
+    if obj is None:
+        obj = object.__new__(cls)
+        if cls._valueattr:
+            object.__setattr__(obj, cls._valueattr, value)
+        obj = _flyweights.setdefault(key, obj)
+    return obj
+
+
+class _Immutable(object):
+    """Base for address and instance objects.
+
+    Objects are immutable and shared: constructing an object with the
+    same value twice returns the same object.  They are hashable and
+    can be used as dictionary keys.
+    """
+    __slots__ = ()
+
+    # Name of the attribute holding the value of the object, None for
+    # objects without a value
+    _valueattr = None
+
+    def _key(self):
+        if self._valueattr:
+            return getattr(self, self._valueattr)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            "{} objects are immutable".format(self.__class__.__name__))
+
+    __delattr__ = __setattr__
+
+    def __reduce__(self):
+        if self._valueattr:
+            return (self.__class__, (self._key(),))
+        return (self.__class__, ())
+
+    def __ne__(self, other):
+        return not self == other
+
 
 ###############################################################################
 # Address bytes
@@ -41,14 +98,18 @@ class AddressTracker(type):
     def __init__(cls, name, bases, attrs):
         if not hasattr(cls, '_addrtypes'):
             cls._addrtypes = []
+            cls._tables = {}
         else:
             cls._addrtypes.append(cls)
+            # The decoding tables are rebuilt on next use
+            cls._tables.clear()
 
 
 @python_2_unicode_compatible
 @add_metaclass(AddressTracker)
-class Address(object):
+class Address(_Immutable):
     """An address for one or more ballasts."""
+    __slots__ = ()
 
     @classmethod
     def from_frame(cls, f):
@@ -59,10 +120,38 @@ class Address(object):
         """
         if cls != Address:
             return
-        for at in cls._addrtypes:
-            r = at.from_frame(f)
-            if r:
-                return r
+        bits = len(f)
+        shift = _address_shift.get(bits)
+        if shift is None:
+            return
+        d = f.as_integer
+        if bits == 24 and not d & 0x10000:
+            return
+        table = cls._tables.get(bits)
+        if table is None:
+            table = cls._tables[bits] = cls._build_table(bits)
+        return table[d >> shift]
+
+    @classmethod
+    def _build_table(cls, bits):
+        """Decode the address of every possible address byte in frames
+        of the given size.
+
+        :return: tuple of the Address objects (or None) indexed by the
+        7 most significant bits of the address byte
+        """
+        shift = _address_shift[bits]
+        table = []
+        for key in range(0x80):
+            f = ForwardFrame(bits, (key << shift) | (1 << (shift - 1)))
+            for at in cls._addrtypes:
+                r = at.from_frame(f)
+                if r:
+                    break
+            else:
+                r = None
+            table.append(r)
+        return tuple(table)
 
     def add_to_frame(self, f):
         raise IncompatibleFrame("Cannot add unknown address to any frame")
@@ -74,6 +163,10 @@ class Address(object):
 @python_2_unicode_compatible
 class Broadcast(Address):
     """All control gear or devices connected to the network."""
+    __slots__ = ()
+
+    def __new__(cls):
+        return _flyweight(cls, None)
 
     @classmethod
     def from_frame(cls, f):
@@ -95,6 +188,9 @@ class Broadcast(Address):
     def __eq__(self, other):
         return isinstance(other, Broadcast)
 
+    def __hash__(self):
+        return hash(Broadcast)
+
     def __str__(self):
         return "<broadcast>"
 
@@ -106,6 +202,10 @@ class BroadcastUnaddressed(Address):
     All control gear or devices in the system that have no short
     address assigned.
     """
+    __slots__ = ()
+
+    def __new__(cls):
+        return _flyweight(cls, None)
 
     @classmethod
     def from_frame(cls, f):
@@ -127,6 +227,9 @@ class BroadcastUnaddressed(Address):
     def __eq__(self, other):
         return isinstance(other, BroadcastUnaddressed)
 
+    def __hash__(self):
+        return hash(BroadcastUnaddressed)
+
     def __str__(self):
         return "<broadcast unaddressed>"
 
@@ -134,13 +237,15 @@ class BroadcastUnaddressed(Address):
 @python_2_unicode_compatible
 class Group(Address):
     """All control gear or devices that are members of the specified group."""
+    __slots__ = ('group',)
+    _valueattr = 'group'
 
-    def __init__(self, group):
+    def __new__(cls, group):
         if not isinstance(group, int):
             raise ValueError("group must be an integer")
         if group < 0 or group > 31:
             raise ValueError("group must be in the range 0..31")
-        self.group = group
+        return _flyweight(cls, group)
 
     @classmethod
     def from_frame(cls, f):
@@ -167,6 +272,9 @@ class Group(Address):
     def __eq__(self, other):
         return isinstance(other, Group) and other.group == self.group
 
+    def __hash__(self):
+        return hash((Group, self.group))
+
     def __str__(self):
         return "<group %d>" % self.group
 
@@ -182,13 +290,15 @@ class Short(Address):
     it is legal for a control gear and control device to share a short
     address.
     """
+    __slots__ = ('address',)
+    _valueattr = 'address'
 
-    def __init__(self, address):
+    def __new__(cls, address):
         if not isinstance(address, int):
             raise ValueError("address must be an integer")
         if address < 0 or address > 63:
             raise ValueError("address must be in the range 0..63")
-        self.address = address
+        return _flyweight(cls, address)
 
     @classmethod
     def from_frame(cls, f):
@@ -212,6 +322,9 @@ class Short(Address):
     def __eq__(self, other):
         return isinstance(other, Short) and other.address == self.address
 
+    def __hash__(self):
+        return hash((Short, self.address))
+
     def __str__(self):
         return "<address %d>" % self.address
 
@@ -223,20 +336,31 @@ from_frame = Address.from_frame
 # Instance bytes
 ###############################################################################
 
-class Instance(object):
-    def __init__(self):
+class Instance(_Immutable):
+    __slots__ = ()
+
+    def __new__(cls, *args):
         raise NotImplementedError
 
     def add_to_frame(self, f):
         raise NotImplementedError
 
+    def __eq__(self, other):
+        return other.__class__ is self.__class__ \
+            and other._key() == self._key()
+
+    def __hash__(self):
+        return hash((self.__class__, self._key()))
+
 
 @python_2_unicode_compatible
 class ReservedInstance(Instance):
     """A reserved instance byte."""
+    __slots__ = ('_value',)
+    _valueattr = '_value'
 
-    def __init__(self, value):
-        self._value = value
+    def __new__(cls, value):
+        return _flyweight(cls, value)
 
     def add_to_frame(self, f):
         if len(f) != 24:
@@ -249,13 +373,16 @@ class ReservedInstance(Instance):
 
 @python_2_unicode_compatible
 class _AddressedInstance(Instance):
+    __slots__ = ('_value',)
+    _valueattr = '_value'
     _flags = None
-    def __init__(self, value):
+
+    def __new__(cls, value):
         if not isinstance(value, int):
             raise ValueError("value must be an integer")
         if value < 0 or value > 31:
             raise ValueError("value must be in the range 0..31")
-        self._value = value
+        return _flyweight(cls, value)
 
     def add_to_frame(self, f):
         if len(f) != 24:
@@ -268,10 +395,11 @@ class _AddressedInstance(Instance):
 
 @python_2_unicode_compatible
 class _UnaddressedInstance(Instance):
+    __slots__ = ()
     _val = None
 
-    def __init__(self):
-        pass
+    def __new__(cls):
+        return _flyweight(cls, None)
 
     def add_to_frame(self, f):
         if len(f) != 24:
@@ -283,51 +411,58 @@ class _UnaddressedInstance(Instance):
 
 
 class InstanceNumber(_AddressedInstance):
+    __slots__ = ()
     _flags = 0x00
 
 
 class InstanceGroup(_AddressedInstance):
+    __slots__ = ()
     _flags = 0x80
 
 
 class InstanceType(_AddressedInstance):
+    __slots__ = ()
     _flags = 0xc0
 
 
 class FeatureInstanceNumber(_AddressedInstance):
+    __slots__ = ()
     _flags = 0x20
 
 
 class FeatureInstanceGroup(_AddressedInstance):
+    __slots__ = ()
     _flags = 0xa0
 
 
 class FeatureInstanceType(_AddressedInstance):
+    __slots__ = ()
     _flags = 0x60
 
 
 class FeatureInstanceBroadcast(_UnaddressedInstance):
+    __slots__ = ()
     _val = 0xfd
 
 
 class InstanceBroadcast(_UnaddressedInstance):
+    __slots__ = ()
     _val = 0xff
 
 
 class FeatureDevice(_UnaddressedInstance):
+    __slots__ = ()
     _val = 0xfc
 
 
 class Device(_UnaddressedInstance):
+    __slots__ = ()
     _val = 0xfe
 
 
-def instance_from_frame(f):
-    if len(f) != 24:
-        return
-    flags = f[15:13]
-    p = f[12:8]
-    b = f[15:8]
+def _instance_from_byte(b):
+    flags = b >> 5
+    p = b & 0x1f
     if flags == 0:
         return InstanceNumber(p)
     elif flags == 4:
@@ -349,3 +484,13 @@ def instance_from_frame(f):
     elif b == 0xfe:
         return Device()
     return ReservedInstance(b)
+
+
+# Instance objects indexed by instance byte
+_instance_table = tuple(_instance_from_byte(b) for b in range(0x100))
+
+
+def instance_from_frame(f):
+    if len(f) != 24:
+        return
+    return _instance_table[(f.as_integer >> 8) & 0xff]
@@ -8,11 +8,14 @@ from dali.exceptions import DuplicateDevice
 from dali.exceptions import NoFreeAddress
 from dali.exceptions import NotConnected
 from dali.exceptions import ProgramShortAddressFailure
+from collections import namedtuple
 import dali.gear.general as gear
-import sets
 import time
 
 
+SearchResult = namedtuple('SearchResult', ['address', 'compares', 'frames'])
+
+
 class Device(object):
     """Any DALI slave device that has been configured with a short address."""
 
@@ -33,13 +36,21 @@ class Device(object):
 class Bus(object):
     """A DALI bus."""
 
-    _all_addresses = sets.ImmutableSet(range(64))
+    _all_addresses = frozenset(range(64))
 
     def __init__(self, name=None, interface=None):
         self._devices = {}
         self._bus_scanned = False  # Have we scanned the bus for devices?
         self.name = name
         self._interface = interface
+        # Search address bytes last sent to the bus, None if unknown
+        self._search_addr = [None, None, None]
+        # Number of SetSearchAddr frames not sent because the byte
+        # was already set
+        self.search_frames_saved = 0
+        # SearchResult for each ballast found by the last
+        # assign_short_addresses()
+        self.search_report = []
 
     def get_interface(self):
         if not self._interface:
@@ -59,15 +70,27 @@ class Bus(object):
 
     def unused_addresses(self):
         """Return all short addresses that are not in use."""
-        used_addresses = sets.ImmutableSet(self._devices.keys())
+        used_addresses = frozenset(self._devices.keys())
         return list(self._all_addresses - used_addresses)
 
-    def scan(self):
+    def scan(self, fast=False):
         """Scan the bus for devices and ensure there are device objects for
         each discovered device.
+
+        If fast is True, a single broadcast presence query is sent
+        first and the individual short addresses are only queried if
+        any control gear answered it.  Group addresses can't be used
+        to narrow the search down further, because group membership
+        is not related to the short address.
         """
         i = self.get_interface()
-        for sa in xrange(0, 64):
+        if fast:
+            response = i.send(
+                gear.QueryControlGearPresent(address.Broadcast()))
+            if not response.value:
+                self._bus_scanned = True
+                return
+        for sa in range(0, 64):
             if sa in self._devices:
                 continue
             response = i.send(
@@ -76,11 +99,39 @@ class Bus(object):
                 Device(address=sa, bus=self)
         self._bus_scanned = True
 
+    _search_addr_commands = (
+        (16, gear.SetSearchAddrH),
+        (8, gear.SetSearchAddrM),
+        (0, gear.SetSearchAddrL),
+    )
+
     def set_search_addr(self, addr):
+        """Set the search address of all control gear.  Only the bytes
+        that differ from the previously set search address are sent.
+
+        The bytes last sent are remembered until forget_search_addr()
+        is called, which happens whenever a search is started.  Call it
+        as well after sending search address commands by other means.
+
+        Returns the number of frames sent.
+        """
         i = self.get_interface()
-        i.send(gear.SetSearchAddrH((addr >> 16) & 0xff))
-        i.send(gear.SetSearchAddrM((addr >> 8) & 0xff))
-        i.send(gear.SetSearchAddrL(addr & 0xff))
+        sent = 0
+        for n, (shift, cmd) in enumerate(self._search_addr_commands):
+            b = (addr >> shift) & 0xff
+            if self._search_addr[n] == b:
+                self.search_frames_saved += 1
+                continue
+            i.send(cmd(b))
+            self._search_addr[n] = b
+            sent += 1
+        return sent
+
+    def forget_search_addr(self):
+        """Forget the search address previously set, so that all of its
+        bytes are sent again by the next set_search_addr().
+        """
+        self._search_addr = [None, None, None]
 
     def find_next(self, low, high):
         """Find the ballast with the lowest random address.  The caller
@@ -93,18 +144,7 @@ class Bus(object):
 
         If not found, returns None.
         """
-        i = self.get_interface()
-        self.set_search_addr(high)
-        if low == high:
-            response = i.send(gear.Compare())
-            if response.value is True:
-                return low
-            return None
-        response = i.send(gear.Compare())
-        if response.value is True:
-            midpoint = (low + high) // 2
-            return self.find_next(low, midpoint) \
-                or self.find_next(midpoint + 1, high)
+        return AddressSearch(self, low, high).find_next()
 
     def assign_short_addresses(self):
         """Search for devices on the bus with no short address allocated, and
@@ -120,21 +160,117 @@ class Bus(object):
         i.send(gear.Randomise())
         # Randomise may take up to 100ms
         time.sleep(0.1)
-        low = 0
-        high = 0xffffff
-        while low is not None:
-            low = self.find_next(low, high)
-            if low is not None:
-                if addrs:
-                    new_addr = addrs.pop(0)
-                    i.send(gear.ProgramShortAddress(new_addr))
-                    r = i.send(gear.VerifyShortAddress(new_addr))
-                    if r.value is not True:
-                        raise ProgramShortAddressFailure(new_addr)
-                    i.send(gear.Withdraw())
-                    Device(address=new_addr, bus=self)
-                else:
-                    i.send(gear.Terminate())
-                    raise NoFreeAddress()
-                low = low + 1
+        search = AddressSearch(self)
+        self.search_report = search.report
+        while True:
+            low = search.find_next()
+            if low is None:
+                break
+            if addrs:
+                new_addr = addrs.pop(0)
+                i.send(gear.ProgramShortAddress(new_addr))
+                r = i.send(gear.VerifyShortAddress(new_addr))
+                if r.value is not True:
+                    raise ProgramShortAddressFailure(new_addr)
+                i.send(gear.Withdraw())
+                search.withdrawn(low)
+                Device(address=new_addr, bus=self)
+            else:
+                i.send(gear.Terminate())
+                raise NoFreeAddress()
         i.send(gear.Terminate())
+
+
+class AddressSearch(object):
+    """Search for the random addresses of ballasts in initialisation
+    state, lowest address first.
+
+    Everything learned from Compare answers is kept between calls to
+    find_next(): addresses below 'low' are known to be free, and each
+    "Yes" answer gives a minimum number of ballasts with an address up
+    to the search address.  An answer received with a framing error
+    means at least two ballasts, so there is still one after the first
+    of them has been withdrawn.  As the framing error may also have
+    been noise on a single answer, an address is only returned after a
+    Compare there was answered.
+
+    The number of Compare commands and of frames in total (including
+    setting the search address) spent on each ballast is recorded as
+    a SearchResult in 'report'.
+    """
+
+    def __init__(self, bus, low=0, high=0xffffff):
+        self.bus = bus
+        # the search address may have been set since the bus last did
+        bus.forget_search_addr()
+        self.low = low
+        self.high = high
+        self.compares = 0
+        self.frames = 0
+        self.report = []
+        # Search address -> minimum number of ballasts not withdrawn
+        # with a random address up to the search address
+        self._occupied = {}
+
+    def _compare(self, addr):
+        self.frames += self.bus.set_search_addr(addr) + 1
+        self.compares += 1
+        response = self.bus.get_interface().send(gear.Compare())
+        if response.value:
+            count = 2 if response.error else 1
+            self._occupied[addr] = max(self._occupied.get(addr, 0), count)
+        return response.value
+
+    def find_next(self):
+        """Find the ballast with the lowest random address that has not
+        been withdrawn.
+
+        If found, returns the random address.  SearchAddr will be set
+        to this address in all ballasts.  The ballast is not
+        withdrawn; call withdrawn() after withdrawing it.
+
+        If not found, returns None.
+        """
+        compares, frames = self.compares, self.frames
+        while True:
+            if self.low > self.high:
+                return None
+            occupied = [a for a in self._occupied if a >= self.low]
+            if occupied:
+                # learned from earlier answers, which may have been noise
+                high = min(occupied)
+                confirmed = False
+            elif self._compare(self.high):
+                high = self.high
+                confirmed = True
+            else:
+                self.low = self.high + 1
+                return None
+            low = self.low
+            while low < high:
+                midpoint = (low + high) // 2
+                if self._compare(midpoint):
+                    high = midpoint
+                    confirmed = True
+                else:
+                    low = midpoint + 1
+            if confirmed or self._compare(low):
+                break
+            # No ballast at or below low after all, search again
+            self.low = low + 1
+            self._occupied = dict(
+                (a, count) for a, count in self._occupied.items() if a > low)
+        self.low = low
+        self.frames += self.bus.set_search_addr(low)
+        self.report.append(SearchResult(
+            low, self.compares - compares, self.frames - frames))
+        return low
+
+    def withdrawn(self, addr):
+        """Tell the search that the ballast with random address addr
+        has been withdrawn.
+        """
+        self.low = addr + 1
+        self._occupied = dict(
+            (a, count - 1) for a, count in self._occupied.items()
+            if a > addr and count > 1)
@@ -3,12 +3,15 @@
 from __future__ import unicode_literals
 from __future__ import division
 from __future__ import absolute_import
+from collections import OrderedDict
+from collections import namedtuple
 from dali import address
 from dali import frame
 from dali.compat import add_metaclass
 from dali.compat import python_2_unicode_compatible
 from dali.exceptions import MissingResponse
 from dali.exceptions import ResponseError
+import threading
 
 
 class CommandTracker(type):
@@ -22,9 +25,12 @@ class CommandTracker(type):
     def __init__(cls, name, bases, attrs):
         if not hasattr(cls, '_commands'):
             cls._commands = []
+            cls._index = {}
         else:
             if cls.__name__[0] != '_':
                 cls._commands.append(cls)
+                # The decoding index is rebuilt on next use
+                cls._index.clear()
 
     @classmethod
     def commands(cls):
@@ -77,6 +83,15 @@ class YesNoResponse(Response):
     def value(self):
         return self._value is not None
 
+    @property
+    def error(self):
+        """True if the answer was received with a framing error, i.e. more
+        than one device answered "Yes".
+        """
+        if self._value is None:
+            return False
+        return self._value.error
+
 
 class BitmapResponseBitDict(type):
     """Metaclass adding dict of status bits."""
@@ -148,6 +163,10 @@ class Command(object):
     Subclasses must provide a class method "from_frame" which, when
     passed a Frame returns a new instance of the class corresponding
     to that command, or "None" if there is no match.
+
+    Subclasses should also provide a class method "_index_keys" which
+    describes the frames "from_frame" can possibly match, so that
+    decoding does not have to try every known command in turn.
     """
 
     # Override this as appropriate
@@ -162,6 +181,17 @@ class Command(object):
     _uses_dtr0 = False
     _uses_dtr1 = False
     _uses_dtr2 = False
+
+    # Commands storing their parameters in DTRs list the DTR numbers
+    # in _sets_dtr, in the order of the parameters.  Commands leaving
+    # a DTR with a value unknown to the sender, e.g. the incremented
+    # DTR0 after ReadMemoryLocation or an answer byte transferred to a
+    # DTR, override the corresponding _modifies_dtrN flag.
+    _sets_dtr = ()
+    _modifies_dtr0 = False
+    _modifies_dtr1 = False
+    _modifies_dtr2 = False
+
     _response = None
     _sendtwice = False
 
@@ -171,6 +201,10 @@ class Command(object):
     # foo.  This parameter is ignored for all other frame lengths.
     _devicetype = 0
 
+    # Set if the command has to be preceded by an EnableDeviceType
+    # command for a device type chosen by the sender.
+    _needs_devicetype = False
+
     def __init__(self, f):
         assert isinstance(f, frame.ForwardFrame)
         self._data = f
@@ -192,9 +226,7 @@ class Command(object):
         if cls != Command:
             return
 
-        for dc in cls._commands:
-            if dc._devicetype != devicetype:
-                continue
+        for dc in cls._candidates(f, devicetype):
             r = dc.from_frame(f)
             if r:
                 return r
@@ -204,6 +236,73 @@ class Command(object):
         # unlikely ever to want to transmit it!
         return cls(f)
 
+    @classmethod
+    def _index_keys(cls):
+        """Describe the frames this command may be decoded from.
+
+        Returns a tuple (highbytes, lowbytes) of the possible values
+        of the most significant and the least significant byte of a
+        frame of length _framesize that from_frame() may match.
+        lowbytes may be None if any value is possible.  The middle
+        byte of 24-bit frames is not taken into account.
+
+        Returns None if this is not known, in which case from_frame()
+        will be tried for every frame.
+        """
+        return None
+
+    @classmethod
+    def _build_index(cls):
+        """Build the decoding index from the known commands.
+
+        The index maps (framesize, devicetype) to a dict of
+        most significant byte to a list of 256 tuples, one per least
+        significant byte, of the commands that may match such a
+        frame.  Within each tuple commands keep the order in which
+        they were declared, so the index gives exactly the same
+        results as trying every command in turn.
+        """
+        index = {}
+        unindexed = []
+        for dc in cls._commands:
+            keys = dc._index_keys()
+            if keys is None:
+                unindexed.append(dc)
+                continue
+            highbytes, lowbytes = keys
+            if lowbytes is None:
+                lowbytes = range(0x100)
+            table = index.setdefault((dc._framesize, dc._devicetype), {})
+            for hb in highbytes:
+                slots = table.get(hb)
+                if slots is None:
+                    slots = table[hb] = [()] * 0x100
+                for lb in lowbytes:
+                    slots[lb] = slots[lb] + (dc,)
+        index[None] = tuple(unindexed)
+        cls._index.update(index)
+
+    @classmethod
+    def _candidates(cls, f, devicetype):
+        """Return the commands that may match the supplied frame, in the
+        order in which they must be tried.
+        """
+        index = cls._index
+        if not index:
+            cls._build_index()
+        candidates = ()
+        table = index.get((len(f), devicetype))
+        if table:
+            d = f.as_integer
+            slots = table.get(d >> (len(f) - 8))
+            if slots:
+                candidates = slots[d & 0xff]
+        unindexed = [dc for dc in index[None] if dc._devicetype == devicetype]
+        if unindexed:
+            candidates = sorted(
+                candidates + tuple(unindexed), key=cls._commands.index)
+        return candidates
+
     @property
     def frame(self):
         """The forward frame to be transmitted for this command."""
@@ -217,6 +316,13 @@ class Command(object):
         """
         return self._sendtwice
 
+    @property
+    def parameters(self):
+        """The parameters of this command, not including its destination,
+        as a tuple.
+        """
+        return ()
+
     @property
     def is_query(self):
         """Does this command return a result?"""
@@ -252,3 +358,112 @@ class Command(object):
         return "({0}){1}".format(type(self), joined)
 
 from_frame = Command.from_frame
+
+
+DecodedFrames = namedtuple(
+    'DecodedFrames', ['commands', 'addresses', 'parameters'])
+
+
+def from_frames(frames, framesizes=16, devicetypes=0):
+    """Decode many frames at once.
+
+    Intended for captured bus traffic, where the same frames occur
+    over and over: each distinct frame is decoded only once.
+
+    :parameter frames: sequence of frames, each given as an integer
+    :parameter framesizes: number of bits of the frames, either as an
+    integer applying to all frames or as a sequence with one entry
+    per frame
+    :parameter devicetypes: type of device each frame is intended
+    for, either as an integer applying to all frames or as a sequence
+    with one entry per frame
+
+    :returns: DecodedFrames tuple of three lists with one entry per
+    frame: the Command class matching the frame, the destination
+    Address of the command or None, and the tuple of command
+    parameters as returned by Command.parameters.
+    """
+    if isinstance(framesizes, int):
+        framesizes = [framesizes] * len(frames)
+    if isinstance(devicetypes, int):
+        devicetypes = [devicetypes] * len(frames)
+    if not len(frames) == len(framesizes) == len(devicetypes):
+        raise ValueError(
+            "framesizes and devicetypes must match the number of frames")
+    decoded = {}
+    commands = []
+    addresses = []
+    parameters = []
+    for key in zip(framesizes, devicetypes, frames):
+        r = decoded.get(key)
+        if r is None:
+            fs, dt, d = key
+            c = from_frame(frame.ForwardFrame(int(fs), int(d)), int(dt))
+            r = decoded[key] = (
+                c.__class__, getattr(c, 'destination', None), c.parameters)
+        commands.append(r[0])
+        addresses.append(r[1])
+        parameters.append(r[2])
+    return DecodedFrames(commands, addresses, parameters)
+
+
+def _freeze(f):
+    """Return an immutable frame equal to f."""
+    if isinstance(f, frame._ImmutableFrame):
+        return f
+    if len(f) == 16:
+        return frame.ForwardFrame.of16(f.as_integer)
+    return frame.ImmutableForwardFrame(len(f), f.as_integer)
+
+
+class CommandCache(object):
+    """Construct commands, reusing previously constructed ones.
+
+    Calling the cache with a command class and its arguments returns
+    a command instance equal to ``cls(*args)``.  The most recently used
+    ``size`` instances are kept, keyed by class and arguments, which
+    must be hashable.  Their frames are replaced by immutable frames;
+    the instances are shared and must not be modified.
+
+    Commands computing their frame from other attributes, e.g. the
+    special commands, can't be given an immutable frame and are
+    constructed anew every time without being cached.
+
+    The cache may be used from several threads.
+    """
+
+    def __init__(self, size=4096):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, cls, *args):
+        if cls.frame is not Command.frame:
+            return cls(*args)
+        key = (cls, args)
+        with self._lock:
+            c = self._cache.pop(key, None)
+            if c is not None:
+                # Re-insert as most recently used
+                self._cache[key] = c
+                self.hits += 1
+                return c
+        c = cls(*args)
+        if isinstance(c.__dict__.get('_data'), frame.Frame):
+            c._data = _freeze(c._data)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = c
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return c
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        """Forget all cached commands."""
+        with self._lock:
+            self._cache.clear()
@@ -55,6 +55,13 @@ class _DeviceCommand(command.Command):
     _framesize = 24
 
 
+# Most significant bytes of 24-bit frames which carry a destination
+# address
+_address_bytes = tuple(
+    b for b in range(1, 0x100, 2)
+    if address.from_frame(frame.ForwardFrame(24, b << 16)) is not None)
+
+
 ###############################################################################
 # Commands from Table 21 start here
 ###############################################################################
@@ -99,6 +106,10 @@ class _StandardDeviceCommand(_DeviceCommand):
 
         return cls(addr)
 
+    @classmethod
+    def _index_keys(cls):
+        return _address_bytes, (cls._opcode,)
+
     def __str__(self):
         return "%s(%s)" % (self.__class__.__name__, self.destination)
 
@@ -330,6 +341,7 @@ class ReadMemoryLocation(_StandardDeviceCommand):
     _inputdev = True
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _modifies_dtr0 = True
     _response = command.Response
     _opcode = 0x3c
 
@@ -458,6 +470,14 @@ class _StandardInstanceCommand(_DeviceCommand):
 
         return cls(addr, instance)
 
+    @classmethod
+    def _index_keys(cls):
+        return _address_bytes, (cls._opcode,)
+
+    @property
+    def parameters(self):
+        return (self.instance,)
+
     def __str__(self):
         return "{}({}, {})".format(
             self.__class__.__name__, self.destination, self.instance)
@@ -651,6 +671,10 @@ class _SpecialDeviceCommand(_DeviceCommand):
            and frame[7:0] == 0x00:
             return cls()
 
+    @classmethod
+    def _index_keys(cls):
+        return (cls._addr,), (0x00,)
+
     def __str__(self):
         return "{}()".format(self.__class__.__name__)
 
@@ -674,6 +698,14 @@ class _SpecialDeviceCommandOneParam(_SpecialDeviceCommand):
         if frame[23:16] == cls._addr and frame[15:8] == cls._instance:
             return cls(frame[7:0])
 
+    @classmethod
+    def _index_keys(cls):
+        return (cls._addr,), None
+
+    @property
+    def parameters(self):
+        return (self._opcode,)
+
     def __str__(self):
         return "{}({:02x})".format(self.__class__.__name__, self._opcode)
 
@@ -698,6 +730,14 @@ class _SpecialDeviceCommandTwoParam(_SpecialDeviceCommand):
         if frame[23:16] == cls._addr:
             return cls(frame[15:8], frame[7:0])
 
+    @classmethod
+    def _index_keys(cls):
+        return (cls._addr,), None
+
+    @property
+    def parameters(self):
+        return (self._instance, self._opcode)
+
     def __str__(self):
         return "{}({:02x}, {:02x})".format(
             self.__class__.__name__, self._instance, self._opcode)
@@ -768,6 +808,7 @@ class WriteMemoryLocation(_SpecialDeviceCommandOneParam):
     _instance = 0x20
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _modifies_dtr0 = True
     _response = command.Response
 
 
@@ -776,24 +817,28 @@ class WriteMemoryLocationNoReply(_SpecialDeviceCommandOneParam):
     _instance = 0x21
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _modifies_dtr0 = True
 
 
 class DTR0(_SpecialDeviceCommandOneParam):
     _addr = 0xc1
     _instance = 0x30
     _uses_dtr0 = True
+    _sets_dtr = (0,)
 
 
 class DTR1(_SpecialDeviceCommandOneParam):
     _addr = 0xc1
     _instance = 0x31
     _uses_dtr1 = True
+    _sets_dtr = (1,)
 
 
 class DTR2(_SpecialDeviceCommandOneParam):
     _addr = 0xc1
     _instance = 0x32
     _uses_dtr2 = True
+    _sets_dtr = (2,)
 
 
 class SendTestframe(_SpecialDeviceCommandOneParam):
@@ -808,6 +853,7 @@ class DirectWriteMemory(_SpecialDeviceCommandTwoParam):
     _addr = 0xc5
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _modifies_dtr0 = True
     _response = command.Response
 
 
@@ -815,11 +861,13 @@ class DTR1DTR0(_SpecialDeviceCommandTwoParam):
     _addr = 0xc7
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _sets_dtr = (1, 0)
 
 
 class DTR2DTR1(_SpecialDeviceCommandTwoParam):
     _addr = 0xc9
     _uses_dtr1 = True
     _uses_dtr2 = True
+    _sets_dtr = (2, 1)
 
 
@@ -2,5 +2,7 @@ __all__ = [
     "base",
     "daliserver",
     "hasseb",
+    "manager",
+    "simulator",
     "tridonic"
 ]
@@ -0,0 +1,186 @@
+"""Drivers for use with asyncio.
+
+Many buses can be driven from a single event loop.  Requires Python 3.7
+or later.  Drivers use the running event loop and have to be created
+from a coroutine.
+"""
+
+from dali.command import from_frame
+from dali.driver.base import AsyncioDALIDriver
+from dali.driver.daliserver import pack_command
+from dali.driver.daliserver import unpack_response
+from dali.driver.tridonic import DALI_USB_NO_RESPONSE
+from dali.driver.tridonic import TridonicDALIUSBDriver
+from dali.frame import BackwardFrame
+from dali.frame import ForwardFrame
+import asyncio
+import errno
+import logging
+import os
+
+
+class AsyncioTridonicDALIUSBDriver(TridonicDALIUSBDriver, AsyncioDALIDriver):
+    """``AsyncioDALIDriver`` implementation for Tridonic DALI USB device.
+
+    The device is accessed through its Linux hidraw device node, which
+    is watched by the event loop; no threads are involved.
+
+    Up to ``window`` commands may be waiting for their response at the
+    same time.  If the gateway does not answer a command within
+    ``timeout`` seconds, it is treated as if no response was received.
+    """
+    logger = logging.getLogger('AsyncioTridonicDALIUSBDriver')
+
+    def __init__(self, path='/dev/hidraw0', window=16, timeout=1.0):
+        if window < 1 or window > 255:
+            raise ValueError('window must be in the range 1..255')
+        self.loop = asyncio.get_running_loop()
+        self.timeout = timeout
+        # transaction mapping
+        self._transactions = dict()
+        self._window = asyncio.Semaphore(window)
+        # the event loop watches a file descriptor for a single writer
+        self._write_lock = asyncio.Lock()
+        self._writable = None
+        self._fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        self.loop.add_reader(self._fd, self._read)
+
+    async def send(self, command):
+        async with self._window:
+            # never reuse the sequence number of a pending transaction
+            while self._next_sn in self._transactions:
+                self._get_sn()
+            data = self.construct(command)
+            sn = data[1]
+            future = self.loop.create_future()
+            self._transactions[sn] = future
+            try:
+                await self._write(data)
+                frame = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                if self.debug:
+                    msg = 'No response received in time: {}'.format(command)
+                    self.logger.warning(msg)
+                frame = None
+            finally:
+                del self._transactions[sn]
+        if command.response:
+            return command.response(frame)
+
+    async def _write(self, data):
+        if self._write_lock.locked():
+            # the next command may be constructed in the same buffer
+            # while waiting
+            data = bytes(data)
+        async with self._write_lock:
+            while True:
+                try:
+                    os.write(self._fd, data)
+                    return
+                except OSError as e:
+                    if e.errno != errno.EAGAIN:
+                        raise
+                # wait until the device takes more reports
+                data = bytes(data)
+                self._writable = self.loop.create_future()
+                self.loop.add_writer(self._fd, self._set_writable)
+                try:
+                    await self._writable
+                finally:
+                    self.loop.remove_writer(self._fd)
+                    self._writable = None
+
+    def _set_writable(self):
+        if not self._writable.done():
+            self._writable.set_result(None)
+
+    def close(self):
+        self.loop.remove_reader(self._fd)
+        self.loop.remove_writer(self._fd)
+        os.close(self._fd)
+        if self._writable is not None:
+            self._writable.cancel()
+        for future in self._transactions.values():
+            future.cancel()
+
+    def _read(self):
+        try:
+            data = os.read(self._fd, 64)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            raise
+        self.receive(data)
+
+    def receive(self, data):
+        frame = self.extract(data)
+        if isinstance(frame, ForwardFrame):
+            command = from_frame(frame)
+            if self.debug:
+                self.logger.info(str(command))
+            if self.dispatcher is not None:
+                self.dispatcher(command)
+            return
+        if isinstance(frame, BackwardFrame):
+            result = frame
+        elif frame is DALI_USB_NO_RESPONSE:
+            result = None
+        else:
+            return
+        future = self._transactions.get(data[8])
+        if future is None or future.done():
+            if self.debug:
+                msg = 'Received response to unknown request: {}'.format(
+                    data[8])
+                self.logger.error(msg)
+            return
+        future.set_result(result)
+
+
+class AsyncioDaliServer(AsyncioDALIDriver):
+    """``AsyncioDALIDriver`` implementation for daliserver
+    (https://github.com/onitake/daliserver)
+
+    Keeps one connection to daliserver open, which is (re-)established
+    when needed.  Commands are sent one at a time.  The connection is
+    closed if a transfer does not complete, e.g. because ``send`` was
+    cancelled, so a late answer is never taken for the next command's.
+    """
+    logger = logging.getLogger('AsyncioDaliServer')
+
+    def __init__(self, host="localhost", port=55825):
+        self._target = (host, port)
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    def construct(self, command):
+        return pack_command(command)
+
+    async def send(self, command):
+        message = self.construct(command)
+        async with self._lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(
+                    *self._target)
+            try:
+                result = await self._transfer(message)
+                if command.is_config:
+                    result = await self._transfer(message)
+            except BaseException:
+                # also on cancellation, the answer may still be on its way
+                self.close()
+                raise
+        return unpack_response(command, result)
+
+    async def _transfer(self, message):
+        self._writer.write(message)
+        return await self._reader.readexactly(4)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+__all__ = ["AsyncioTridonicDALIUSBDriver", "AsyncioDaliServer"]
@@ -1,6 +1,15 @@
+from __future__ import division
 from __future__ import unicode_literals
+import array
+import bisect
 import threading
-import usb
+import time
+
+try:
+    import usb
+except ImportError:
+    # pyusb is only needed for the USB backends
+    usb = None
 
 
 ###############################################################################
@@ -13,6 +22,9 @@ class DALIDriver(object):
 
     A DALI driver represents a service or physical gateway which is able to
     communicate with a DALI bus.
+
+    Configuration commands (``command.is_config``) have to be received
+    twice within 100 ms, drivers take care of sending them twice.
     """
 
     backend = None
@@ -48,7 +60,7 @@ class SyncDALIDriver(DALIDriver):
         """Send command to gateway and return response.
 
         @param command: DALI command to send.
-        @param timeout: Timeout in milliseconds.
+        @param timeout: Timeout in seconds.
         @return response: response to command.
         """
         raise NotImplementedError(
@@ -90,6 +102,114 @@ class AsyncDALIDriver(DALIDriver):
             'Abstract ``AsyncDALIDriver`` does not implement ``receive``')
 
 
+class AsyncioDALIDriver(DALIDriver):
+    """Object for sending commands to DALI drivers from an asyncio event
+    loop.
+
+    Implementations are found in ``dali.driver.aio`` and require Python 3.7
+    or later.
+    """
+
+    dispatcher = None
+    """Callable used for dispatching incoming forward frames.
+    """
+
+    def send(self, command):
+        """Send command to gateway and return response.
+
+        This is a coroutine: ``response = await driver.send(command)``.
+
+        @param command: DALI command to send.
+        @return response: ``command.response`` instance for queries,
+                          otherwise None.
+        """
+        raise NotImplementedError(
+            'Abstract ``AsyncioDALIDriver`` does not implement ``send``')
+
+    def close(self):
+        """Release all resources used by the driver.
+        """
+        raise NotImplementedError(
+            'Abstract ``AsyncioDALIDriver`` does not implement ``close``')
+
+
+###############################################################################
+# driver statistics
+###############################################################################
+
+# monotonic high resolution clock where available
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class LatencyHistogram(object):
+    """Histogram of latencies, e.g. of the queries answered by a driver.
+
+    Latencies are counted in buckets with the upper bounds ``bounds`` in
+    seconds, plus one bucket for all latencies above the last bound.
+    Adding latencies is thread safe.
+    """
+
+    default_bounds = (
+        0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+    def __init__(self, bounds=None):
+        self.bounds = tuple(bounds or self.default_bounds)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all latencies added so far."""
+        with self._lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def add(self, latency):
+        """Count a latency in seconds."""
+        i = bisect.bisect_left(self.bounds, latency)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += latency
+            if latency > self.max:
+                self.max = latency
+
+    @property
+    def mean(self):
+        """Mean latency in seconds, None if empty."""
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, p):
+        """Upper bound of the bucket containing the p-th percentile in
+        seconds, None if empty.  Above the last bound the maximum is
+        returned.
+        """
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if n and seen >= rank:
+                return bound
+        return self.max
+
+    def __str__(self):
+        lines = []
+        lower = 0
+        for bound, n in zip(self.bounds + (None,), self.counts):
+            if bound is None:
+                label = '> {:g} ms'.format(lower * 1000)
+            else:
+                label = '<= {:g} ms'.format(bound * 1000)
+                lower = bound
+            lines.append('{:>12}: {}'.format(label, n))
+        return '\n'.join(lines)
+
+
 ###############################################################################
 # backend contracts
 ###############################################################################
@@ -131,6 +251,22 @@ class Listener(Backend):
 # USB backends
 ###############################################################################
 
+def find_usb_devices(vendor, product):
+    """Find all connected USB devices with vendor and product id.
+
+    @return: List of ``(bus, port_numbers)`` tuples, which can be passed
+             to ``USBBackend``.
+    """
+    if usb is None:
+        raise ImportError('pyusb is required for finding USB devices')
+    import usb.core
+    return [(dev.bus, dev.port_numbers) for dev in usb.core.find(
+        find_all=True,
+        idVendor=vendor,
+        idProduct=product
+    )]
+
+
 class USBBackend(Backend):
     """Backend implementation for communicating with USB devices.
     """
@@ -177,11 +313,23 @@ class USBBackend(Backend):
                    usb.util.ENDPOINT_IN
         self._ep_read = usb.util.find_descriptor(
             intf, custom_match=match_ep_in)
+        # reports are read into this buffer
+        self._read_buffer = array.array(
+            'B', [0] * self._ep_read.wMaxPacketSize)
+        try:
+            self._read_view = memoryview(self._read_buffer)
+        except TypeError:
+            # Python 2 arrays do not support memoryview
+            self._read_view = self._read_buffer
 
     def read(self, timeout=None):
         """Read data from USB device.
+
+        The returned data is a view on a buffer owned by the backend, it
+        is only valid until the next read.
         """
-        return self._ep_read.read(self._ep_read.wMaxPacketSize, timeout=timeout)
+        size = self._ep_read.read(self._read_buffer, timeout=timeout)
+        return self._read_view[:size]
 
     def write(self, data):
         """Write data to USB device.
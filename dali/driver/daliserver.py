@@ -2,9 +2,11 @@ from __future__ import print_function
 from dali.command import Command
 from dali.exceptions import CommunicationError
 import dali.frame
+import errno
 import logging
 import socket
 import struct
+import threading
 
 
 ###############################################################################
@@ -12,19 +14,76 @@ import struct
 ###############################################################################
 
 
+class ConnectionPool(object):
+    """Long-lived connections to one or more daliserver instances.
+
+    A connection is used by one thread at a time and is returned to the
+    pool afterwards, so a pool can be shared between threads and between
+    ``DaliServer`` objects.  Connections that have been closed by
+    daliserver are replaced transparently.
+
+    :param size: maximum number of idle connections kept per daliserver
+    :param timeout: socket timeout in seconds, None to block
+    """
+
+    def __init__(self, size=4, timeout=None):
+        self.size = size
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def connect(self, target):
+        """Open a new connection to target."""
+        return socket.create_connection(target, self.timeout)
+
+    def acquire(self, target):
+        """Get a connection to target.
+
+        :return: tuple of the connection and whether it has been used
+        before
+        """
+        with self._lock:
+            idle = self._idle.get(target)
+            if idle:
+                return idle.pop(), True
+        return self.connect(target), False
+
+    def release(self, target, s):
+        """Return a connection acquired from this pool."""
+        with self._lock:
+            idle = self._idle.setdefault(target, [])
+            if len(idle) < self.size:
+                idle.append(s)
+                return
+        s.close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for s in connections:
+                s.close()
+
+
 class DaliServer(object):
     """Communicate with daliserver
     (https://github.com/onitake/daliserver)
 
     NB this requires daliserver commit
     90e34a0cd2945dc7a15681f11647e708f858521e or later.
+
+    If a ``ConnectionPool`` is passed, connections are taken from it
+    instead of being opened for every command, and the object may be
+    used from several threads at once.
     """
 
     def __init__(self, host="localhost", port=55825,
-                 multiple_frames_per_connection=False):
+                 multiple_frames_per_connection=False, pool=None):
         self._target = (host, port)
         self._s = None
         self._multiple_frames_per_connection = multiple_frames_per_connection
+        self._pool = pool
 
     def __enter__(self):
         if self._multiple_frames_per_connection:
@@ -37,30 +96,20 @@ class DaliServer(object):
             self._s = None
 
     def send(self, command):
-        if self._s:
-            s = self._s
-        else:
-            s = socket.create_connection(self._target)
-
-        assert isinstance(command, Command)
-        message = struct.pack("BB", 2, 0) + command.frame.pack
+        message = pack_command(command)
 
         logging.info(u"command: {}{}".format(
             command, " (twice)" if command.is_config else ""))
 
-        # Set a default result which may be used if the first send fails
-        result = "\x02\xff\x00\x00"
-
-        try:
-            s.send(message)
-            result = s.recv(4)
-            if command.is_config:
-                s.send(message)
-                result = s.recv(4)
-        except:
-            raise
-        finally:
-            if not self._s:
+        if self._s:
+            result = _transfer(self._s, message, command.is_config)
+        elif self._pool:
+            result = self._send_pooled(message, command.is_config)
+        else:
+            s = socket.create_connection(self._target)
+            try:
+                result = _transfer(s, message, command.is_config)
+            finally:
                 s.close()
 
         response = self.unpack_response(command, result)
@@ -70,6 +119,29 @@ class DaliServer(object):
 
         return response
 
+    def _send_pooled(self, message, twice):
+        s, reused = self._pool.acquire(self._target)
+        try:
+            try:
+                result = _transfer(s, message, False)
+            except (socket.error, CommunicationError) as e:
+                if not reused or not _connection_lost(e):
+                    raise
+                # The idle connection went stale before the message
+                # arrived, retry on a new one.  Other errors, e.g. a
+                # timeout, are not retried as daliserver may have sent
+                # the command already.
+                s.close()
+                s = self._pool.connect(self._target)
+                result = _transfer(s, message, False)
+            if twice:
+                result = _transfer(s, message, False)
+        except:
+            s.close()
+            raise
+        self._pool.release(self._target, s)
+        return result
+
     def unpack_response(self, command, result):
         """Unpack result from the given bytestream and creates the
         corresponding response object
@@ -79,24 +151,84 @@ class DaliServer(object):
         :return: the result object
         """
 
-        assert isinstance(command, Command)
+        return unpack_response(command, result)
 
-        ver, status, rval, pad = struct.unpack("BBBB", result)
-        response = None
 
-        if command._response:
-            if status == 0:
-                response = command._response(None)
-            elif status == 1:
-                response = command._response(dali.frame.BackwardFrame(rval))
-            elif status == 255:
-                # This is "failure" - daliserver seems to be reporting
-                # this for a garbled response when several ballasts
-                # reply.  It should be interpreted as "Yes".
-                response = command._response(dali.frame.BackwardFrameError(255))
-            else:
-                raise CommunicationError("status was %d" % status)
+def _transfer(s, message, twice):
+    """Send message on socket s, once or twice, and return the last
+    result.
+    """
+    s.sendall(message)
+    result = _recv_result(s)
+    if twice:
+        s.sendall(message)
+        result = _recv_result(s)
+    return result
 
-        return response
 
-__all__ = ["DaliServer"]
+class _ConnectionClosed(CommunicationError):
+    """Connection closed before any part of the result arrived."""
+
+
+def _recv_result(s):
+    result = b""
+    while len(result) < 4:
+        data = s.recv(4 - len(result))
+        if not data:
+            if not result:
+                raise _ConnectionClosed("connection closed by daliserver")
+            raise CommunicationError("connection closed by daliserver")
+        result += data
+    return result
+
+
+def _connection_lost(e):
+    """Whether error e shows that the connection had been closed by
+    daliserver before the message was sent.
+    """
+    if isinstance(e, _ConnectionClosed):
+        return True
+    return getattr(e, 'errno', None) in (errno.ECONNRESET, errno.EPIPE)
+
+
+def pack_command(command):
+    """Pack the frame of command into a daliserver message.
+
+    :param command: the command to be sent
+    :return: the message bytestream
+    """
+    assert isinstance(command, Command)
+    return struct.pack("BB", 2, 0) + command.frame.pack
+
+
+def unpack_response(command, result):
+    """Unpack result from the given bytestream and creates the
+    corresponding response object
+
+    :param command: the command which waiting for it's response
+    :param result: the result bytestream which came back
+    :return: the result object
+    """
+
+    assert isinstance(command, Command)
+
+    ver, status, rval, pad = struct.unpack("BBBB", result)
+    response = None
+
+    if command._response:
+        if status == 0:
+            response = command._response(None)
+        elif status == 1:
+            response = command._response(dali.frame.BackwardFrame.of(rval))
+        elif status == 255:
+            # This is "failure" - daliserver seems to be reporting
+            # this for a garbled response when several ballasts
+            # reply.  It should be interpreted as "Yes".
+            response = command._response(
+                dali.frame.BackwardFrameError.of(255))
+        else:
+            raise CommunicationError("status was %d" % status)
+
+    return response
+
+__all__ = ["ConnectionPool", "DaliServer"]
@@ -1,13 +1,194 @@
+from __future__ import unicode_literals
 from dali.command import Command
+from dali.driver.base import DALIDriver
+from dali.driver.base import LatencyHistogram
+from dali.driver.base import SyncDALIDriver
+from dali.driver.base import USBListener
+from dali.driver.base import clock
+from dali.exceptions import CommunicationError
+from dali.frame import BackwardFrame
+from dali.frame import BackwardFrameError
 from time import sleep
 import dali.frame
 import logging
 import struct
-import usb.core
+import threading
+
+try:
+    import usb.core
+    import usb.util
+except ImportError:
+    # pyusb is only needed for talking to the device
+    usb = None
+
+
+HASSEB_USB_VENDOR = 0x04cc
+HASSEB_USB_PRODUCT = 0x0802
+
+HASSEB_STATUS_NO_DATA = 0x00
+HASSEB_STATUS_NO_ANSWER = 0x01
+HASSEB_STATUS_OK = 0x02
+HASSEB_STATUS_INVALID_ANSWER = 0x03
+
+# layout of received reports: st bf
+_report = struct.Struct('BB')
+
+
+class HassebDALIUSBNoResponse(object):
+
+    def __repr__(self):
+        return 'NO_RESPONSE'
+
+    __str__ = __repr__
+
+
+HASSEB_DALI_USB_NO_RESPONSE = HassebDALIUSBNoResponse()
+
+
+class HassebDALIUSBDriver(DALIDriver):
+    """``DALIDriver`` implementation for the Hasseb DALI Master
+    (http://hasseb.fi/), based on a NXP LPC1343 ARM microprocessor with open
+    source firmware.
+    """
+    # debug logging
+    debug = False
+    logger = logging.getLogger('HassebDALIUSBDriver')
+
+    def construct(self, command):
+        """Data expected by the DALI Master is the 16 bit forward frame:
+
+        ad cm
+
+        ad: address
+        cm: command
+        """
+        frame = command.frame
+        if len(frame) != 16:
+            raise ValueError('Unsupported frame length: {}'.format(len(frame)))
+        return frame.pack
+
+    def extract(self, data):
+        """Raw data received from the DALI Master:
+
+        st bf .. .. .. .. .. ..
+
+        st: status
+            0x00 = no data available
+            0x01 = no answer
+            0x02 = OK
+            0x03 = invalid answer
+        bf: backward frame
+
+        data may be any object supporting the buffer protocol, e.g. a
+        ``memoryview`` on the read buffer of the backend.
+        """
+        status, bf = _report.unpack_from(data)
+        if status == HASSEB_STATUS_OK:
+            frame = BackwardFrame.of(bf)
+        elif status == HASSEB_STATUS_INVALID_ANSWER:
+            frame = BackwardFrameError.of(255)
+        elif status == HASSEB_STATUS_NO_ANSWER:
+            frame = HASSEB_DALI_USB_NO_RESPONSE
+        else:
+            frame = None
+        if self.debug and frame is not None:
+            self.logger.info('EXTRACT status {} -> {}'.format(status, frame))
+        return frame
+
+
+class SyncHassebDALIUSBDriver(HassebDALIUSBDriver, SyncDALIDriver):
+    """Synchronous ``DALIDriver`` implementation for the Hasseb DALI Master.
+
+    Reports of the device are read by the listener thread of the backend,
+    ``send`` returns as soon as the answer to a query arrived.  The time
+    from writing a query to receiving its answer is counted in
+    ``latency``, a ``LatencyHistogram``.
+
+    ``timeout`` is the default time in seconds to wait for an answer.
+
+    Configuration commands are written twice, ``send_twice_interval``
+    seconds apart: the repeated frame has to follow within 100 ms, after
+    the first frame (about 16 ms) and the settling time have passed.
+    """
+    send_twice_interval = 0.025
+
+    def __init__(self, bus=None, port_numbers=None, interface=0,
+                 timeout=1.5):
+        self.timeout = timeout
+        self.latency = LatencyHistogram()
+        # one transaction at a time
+        self._transaction = threading.Lock()
+        # guards the answer to the pending query
+        self._answer_received = threading.Condition()
+        self._waiting = False
+        self._answer = None
+        self.backend = USBListener(
+            self,
+            HASSEB_USB_VENDOR,
+            HASSEB_USB_PRODUCT,
+            bus=bus,
+            port_numbers=port_numbers,
+            interface=interface
+        )
+
+    def send(self, command, timeout=None):
+        """Send command and return the response to it.
+
+        @param timeout: Time in seconds to wait for the answer to a query,
+                        defaults to ``self.timeout``.
+        """
+        data = self.construct(command)
+        if not command.response:
+            with self._transaction:
+                self.backend.write(data)
+                if command.is_config:
+                    sleep(self.send_twice_interval)
+                    self.backend.write(data)
+            return
+        if timeout is None:
+            timeout = self.timeout
+        with self._transaction:
+            with self._answer_received:
+                self._answer = None
+                self._waiting = True
+                start = clock()
+                self.backend.write(data)
+                deadline = start + timeout
+                while self._answer is None:
+                    remaining = deadline - clock()
+                    if remaining <= 0:
+                        self._waiting = False
+                        raise CommunicationError(
+                            'Device does not respond but command needs it')
+                    self._answer_received.wait(remaining)
+                self.latency.add(clock() - start)
+                frame = self._answer
+        if frame is HASSEB_DALI_USB_NO_RESPONSE:
+            frame = None
+        return command.response(frame)
+
+    def receive(self, data):
+        """Called by the listener thread with every report of the device.
+        """
+        frame = self.extract(data)
+        if frame is None:
+            return
+        with self._answer_received:
+            if not self._waiting:
+                if self.debug:
+                    msg = 'Ignore unexpected answer: {}'.format(frame)
+                    self.logger.info(msg)
+                return
+            self._waiting = False
+            self._answer = frame
+            self._answer_received.notify_all()
+
+    def close(self):
+        self.backend.close()
 
 
 ###############################################################################
-# XXX: Adopt API to ``dali.driver.base``
+# XXX: Legacy API, use ``SyncHassebDALIUSBDriver``
 ###############################################################################
 
 
@@ -33,7 +214,7 @@ class HassebUsb(object):
         self.epRead = None
 
         if device is not None:
-            self._openDeviceByUSBDevice(dev)
+            self._openDeviceByUSBDevice(device)
     
     def _openDevice(self):
         vid = 0x04cc
@@ -115,9 +296,9 @@ class HassebUsb(object):
                 responseStatus = rdData[0]
                 
                 if responseStatus == 2:
-                    return dali.frame.BackwardFrame(rdData[1])
+                    return dali.frame.BackwardFrame.of(rdData[1])
                 elif responseStatus == 3:
-                    return dali.frame.BackwardFrameError(255)
+                    return dali.frame.BackwardFrameError.of(255)
                 
             return None
 
@@ -133,6 +314,9 @@ class HassebUsb(object):
         
         # print(u" SEND: a=0x%x b=0x%x"%(a,b))
         
+        if command.is_config:
+            self._writeDali(a, b)
+            sleep(SyncHassebDALIUSBDriver.send_twice_interval)
         backward = self._writeDali( a, b, needsResponse)
         if command._response:
             response = command._response(backward)
@@ -144,4 +328,9 @@ class HassebUsb(object):
 
         return response
 
-__all__ = ["HassebUsb","HassebUsbFactory"]
+__all__ = [
+    "HassebDALIUSBDriver",
+    "HassebUsb",
+    "HassebUsbFactory",
+    "SyncHassebDALIUSBDriver",
+]
@@ -0,0 +1,157 @@
+from __future__ import unicode_literals
+from collections import namedtuple
+from dali.driver.base import find_usb_devices
+import logging
+import threading
+
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+
+# Result of a batch of commands on one bus: the responses to the commands
+# sent and the exception which stopped the batch or None
+BatchResult = namedtuple('BatchResult', ['responses', 'error'])
+
+
+class DriverManager(object):
+    """Send commands on several DALI buses concurrently.
+
+    Every bus is driven by a ``SyncDALIDriver`` which is used from a
+    worker thread of its own, so a batch of commands sent on all buses
+    takes about as long as on the slowest bus, not as long as on all of
+    them together.
+
+    Buses are identified by name.  ``discover`` opens all Hasseb DALI
+    Master and Tridonic DALI USB gateways connected to this host.
+    """
+    logger = logging.getLogger('DriverManager')
+
+    def __init__(self, drivers=None):
+        self.drivers = dict()
+        self._workers = dict()
+        self._lock = threading.Lock()
+        for name, driver in dict(drivers or {}).items():
+            self.add(name, driver)
+
+    @classmethod
+    def discover(cls):
+        """Manager for all Hasseb and Tridonic gateways found on USB.
+
+        Buses are named ``hasseb:<bus>:<ports>`` and
+        ``tridonic:<bus>:<ports>`` after the USB bus and port numbers of
+        the gateway, e.g. ``tridonic:1:2.1``.
+        """
+        from dali.driver import hasseb
+        from dali.driver import tridonic
+        gateways = (
+            ('hasseb', hasseb.HASSEB_USB_VENDOR, hasseb.HASSEB_USB_PRODUCT,
+             hasseb.SyncHassebDALIUSBDriver),
+            ('tridonic', tridonic.DALI_USB_VENDOR, tridonic.DALI_USB_PRODUCT,
+             tridonic.SyncTridonicDALIUSBDriver),
+        )
+        manager = cls()
+        try:
+            for kind, vendor, product, factory in gateways:
+                for bus, port_numbers in find_usb_devices(vendor, product):
+                    name = '{}:{}:{}'.format(
+                        kind, bus, '.'.join(str(p) for p in port_numbers))
+                    manager.add(name, factory(
+                        bus=bus, port_numbers=port_numbers))
+        except:
+            manager.close()
+            raise
+        return manager
+
+    def add(self, name, driver):
+        """Add a bus driven by driver."""
+        with self._lock:
+            if name in self.drivers:
+                raise ValueError('Bus {} already added'.format(name))
+            self.drivers[name] = driver
+            tasks = queue.Queue()
+            worker = threading.Thread(
+                target=self._work, args=(driver, tasks),
+                name='DriverManager {}'.format(name))
+            worker.daemon = True
+            self._workers[name] = (worker, tasks)
+            worker.start()
+
+    def execute(self, batches):
+        """Send batches of commands, one per bus, concurrently.
+
+        @param batches: Dict of bus name to a sequence of commands, which
+                        are sent in order.
+        @return: Dict of bus name to ``BatchResult``.
+        """
+        pending = []
+        with self._lock:
+            # check all buses before sending anything on any of them
+            for name in batches:
+                if name not in self._workers:
+                    raise KeyError('Unknown bus {}'.format(name))
+                if not self._workers[name][0].is_alive():
+                    raise RuntimeError(
+                        'Worker of bus {} has stopped'.format(name))
+            for name, commands in batches.items():
+                done = threading.Event()
+                result = []
+                self._workers[name][1].put((list(commands), result, done))
+                pending.append((name, result, done))
+        results = dict()
+        for name, result, done in pending:
+            done.wait()
+            results[name] = result[0]
+        return results
+
+    def send(self, commands, buses=None):
+        """Send the same commands on buses, on all buses by default.
+
+        @return: Dict of bus name to ``BatchResult``.
+        """
+        commands = list(commands)
+        if buses is None:
+            buses = list(self.drivers)
+        return self.execute(dict((name, commands) for name in buses))
+
+    def _work(self, driver, tasks):
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            commands, result, done = task
+            responses = []
+            error = None
+            try:
+                for command in commands:
+                    responses.append(driver.send(command))
+            except Exception as e:
+                self.logger.warning('{} failed: {}'.format(command, e))
+                error = e
+            except BaseException as e:
+                # stops the worker, but execute() still gets the result
+                error = e
+                raise
+            finally:
+                result.append(BatchResult(responses, error))
+                done.set()
+
+    def close(self):
+        """Stop the worker threads and close all drivers."""
+        with self._lock:
+            workers, self._workers = self._workers, dict()
+            drivers, self.drivers = self.drivers, dict()
+        for worker, tasks in workers.values():
+            tasks.put(None)
+        for worker, tasks in workers.values():
+            worker.join()
+        for driver in drivers.values():
+            close = getattr(driver, 'close', None)
+            if close is None:
+                close = driver.backend.close
+            close()
+
+
+__all__ = ["BatchResult", "DriverManager"]
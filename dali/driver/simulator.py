@@ -0,0 +1,697 @@
+"""Simulated DALI bus with control gear.
+
+The simulator allows exercising ``dali.bus.Bus``, the drivers and
+commissioning code without any hardware.  A ``SimulatedBus`` holds a
+population of ``SimulatedGear`` objects which react to the commands of
+``dali.gear.general`` roughly as described in IEC 62386-102: levels are
+changed immediately instead of fading, and timers and physical
+selection are not implemented.
+
+Drivers implementing the ``SyncDALIDriver`` and ``AsyncDALIDriver``
+contracts are attached to a bus; several drivers may share one bus and
+see each other's forward frames.
+"""
+
+from __future__ import division
+from __future__ import unicode_literals
+from dali import address
+from dali.command import from_frame
+from dali.driver.base import AsyncDALIDriver
+from dali.driver.base import SyncDALIDriver
+from dali.frame import BackwardFrame
+from dali.frame import BackwardFrameError
+from dali.frame import ForwardFrame
+import dali.gear.general as gear
+import logging
+import random
+
+
+MASK = 0xff
+YES = 0xff
+
+
+class SimulatedGear(object):
+    """Control gear on a ``SimulatedBus``.
+
+    :param short_address: short address 0..63 or None
+    :param random_address: 24-bit random address; None for the reset
+    value 0xffffff
+    :param groups: iterable of groups 0..15 the gear is a member of
+    :param scenes: sequence of 16 scene levels, 255 (MASK) if the gear
+    is not part of the scene
+    :param level: actual arc power level
+    :param device_types: device types supported by the gear
+    """
+
+    physical_minimum = 1
+    version_number = 8
+    extended_version_number = 1
+    light_source_type = 6
+
+    def __init__(self, short_address=None, random_address=None, groups=(),
+                 scenes=None, level=None, device_types=(0,)):
+        self.bus = None
+        self.short_address = short_address
+        self.random_address = 0xffffff if random_address is None \
+            else random_address
+        self.device_types = tuple(device_types)
+        self.lamp_failure = False
+        self.power_failure = True
+        self.dtr0 = 0
+        self.dtr1 = 0
+        self.dtr2 = 0
+        self.memory_banks = {0: [0x1a] + [0] * 0x1a}
+        self._reset()
+        self.groups = 0
+        for group in groups:
+            self.groups |= 1 << group
+        if scenes is not None:
+            self.scenes = list(scenes)
+        self.actual_level = self.power_on_level if level is None else level
+        self.reset_state = not groups and scenes is None
+        # None when not in initialisation state, otherwise whether the
+        # gear has been withdrawn
+        self.withdrawn = None
+        self.search_address = 0xffffff
+        self.enabled_devicetype = 0
+        self.write_enabled = False
+        self._next_devicetype = None
+
+    def _reset(self):
+        """Set the persistent variables to their reset values."""
+        self.max_level = 254
+        self.min_level = self.physical_minimum
+        self.power_on_level = 254
+        self.system_failure_level = 254
+        self.fade_time = 0
+        self.fade_rate = 7
+        self.extended_fade_time = 0
+        self.operating_mode = 0
+        self.last_active_level = 254
+        self.limit_error = False
+        self.scenes = [MASK] * 16
+        self.groups = 0
+        self.reset_state = True
+
+    def addressed_by(self, destination):
+        """Is this gear addressed by the destination of a command?"""
+        if isinstance(destination, address.Broadcast):
+            return True
+        if isinstance(destination, address.BroadcastUnaddressed):
+            return self.short_address is None
+        if isinstance(destination, address.Short):
+            return destination.address == self.short_address
+        if isinstance(destination, address.Group):
+            return bool(self.groups & (1 << destination.group))
+        return False
+
+    def handle(self, command, repeated=False, devicetype=0):
+        """Process a command received from the bus.
+
+        :param command: the command, decoded without device type
+        :param repeated: whether the command was directly preceded by
+        the same command, as required for configuration commands
+        :param devicetype: device type enabled by a preceding
+        EnableDeviceType command
+        :return: the 8-bit answer or None
+        """
+        cls = command.__class__
+        if cls is not gear.QueryNextDeviceType:
+            self._next_devicetype = None
+        handler = _handlers.get(cls)
+        if handler is None:
+            if devicetype in self.device_types:
+                return self.extended_command(
+                    from_frame(command.frame, devicetype), repeated)
+            return
+        if command.is_config and not repeated:
+            return
+        destination = getattr(command, 'destination', None)
+        if destination is not None and not self.addressed_by(destination):
+            return
+        if self.write_enabled and cls not in _keep_write_enabled:
+            self.write_enabled = False
+        return handler(self, command, devicetype)
+
+    def extended_command(self, command, repeated):
+        """Process an application extended command of one of the
+        supported device types.  Override in subclasses; the default
+        implementation ignores them.
+
+        :return: the 8-bit answer or None
+        """
+
+    # Arc power control
+
+    def _arc_power(self, level):
+        if level == MASK:
+            return
+        self.power_failure = False
+        if level == 0:
+            self.actual_level = 0
+            self.limit_error = False
+            return
+        self.limit_error = level < self.min_level or level > self.max_level
+        level = min(max(level, self.min_level), self.max_level)
+        self.actual_level = level
+        self.last_active_level = level
+
+    def _dapc(self, command, devicetype):
+        self._arc_power(command.power)
+
+    def _off(self, command, devicetype):
+        self._arc_power(0)
+
+    def _up(self, command, devicetype):
+        # Fading is not simulated, move by one step instead
+        if self.actual_level:
+            self._arc_power(min(self.actual_level + 1, self.max_level))
+
+    def _down(self, command, devicetype):
+        if self.actual_level:
+            self._arc_power(max(self.actual_level - 1, self.min_level))
+
+    def _step_down_and_off(self, command, devicetype):
+        if self.actual_level <= self.min_level:
+            self._arc_power(0)
+        else:
+            self._arc_power(self.actual_level - 1)
+
+    def _on_and_step_up(self, command, devicetype):
+        if self.actual_level:
+            self._arc_power(min(self.actual_level + 1, self.max_level))
+        else:
+            self._arc_power(self.min_level)
+
+    def _recall_max_level(self, command, devicetype):
+        self._arc_power(self.max_level)
+
+    def _recall_min_level(self, command, devicetype):
+        self._arc_power(self.min_level)
+
+    def _go_to_last_active_level(self, command, devicetype):
+        self._arc_power(self.last_active_level)
+
+    def _go_to_scene(self, command, devicetype):
+        self._arc_power(self.scenes[command.param])
+
+    def _ignore(self, command, devicetype):
+        pass
+
+    # Configuration
+
+    def _config(self, name, value):
+        setattr(self, name, value)
+        self.reset_state = False
+
+    def _do_reset(self, command, devicetype):
+        self._reset()
+        self.actual_level = 254
+        self.random_address = 0xffffff
+        self.search_address = 0xffffff
+
+    def _store_actual_level_in_dtr0(self, command, devicetype):
+        self.dtr0 = self.actual_level
+
+    def _set_operating_mode(self, command, devicetype):
+        if self.dtr0 == 0:
+            self._config('operating_mode', 0)
+
+    def _set_max_level(self, command, devicetype):
+        level = self.dtr0
+        if level == MASK:
+            level = 254
+        self._config('max_level', max(level, self.min_level))
+        if self.actual_level > self.max_level:
+            self.actual_level = self.max_level
+
+    def _set_min_level(self, command, devicetype):
+        level = max(self.dtr0, self.physical_minimum)
+        self._config('min_level', min(level, self.max_level))
+        if self.actual_level and self.actual_level < self.min_level:
+            self.actual_level = self.min_level
+
+    def _set_system_failure_level(self, command, devicetype):
+        self._config('system_failure_level', self.dtr0)
+
+    def _set_power_on_level(self, command, devicetype):
+        self._config('power_on_level', self.dtr0)
+
+    def _set_fade_time(self, command, devicetype):
+        self._config('fade_time', min(self.dtr0, 15))
+
+    def _set_fade_rate(self, command, devicetype):
+        self._config('fade_rate', min(max(self.dtr0, 1), 15))
+
+    def _set_extended_fade_time(self, command, devicetype):
+        self._config('extended_fade_time',
+                     self.dtr0 if self.dtr0 <= 0x4f else 0)
+
+    def _set_scene(self, command, devicetype):
+        self.scenes[command.param] = self.dtr0
+        self.reset_state = False
+
+    def _remove_from_scene(self, command, devicetype):
+        self.scenes[command.param] = MASK
+        self.reset_state = False
+
+    def _add_to_group(self, command, devicetype):
+        self._config('groups', self.groups | (1 << command.param))
+
+    def _remove_from_group(self, command, devicetype):
+        self._config('groups', self.groups & ~(1 << command.param))
+
+    def _set_short_address(self, command, devicetype):
+        if self.dtr0 == MASK:
+            self.short_address = None
+        elif self.dtr0 & 0x81 == 0x01:
+            self.short_address = self.dtr0 >> 1
+
+    def _enable_write_memory(self, command, devicetype):
+        self.write_enabled = True
+
+    # Queries
+
+    def _yes(self, condition):
+        return YES if condition else None
+
+    def _query_status(self, command, devicetype):
+        return (self.lamp_failure << 1) | (bool(self.actual_level) << 2) \
+            | (self.limit_error << 3) | (self.reset_state << 5) \
+            | ((self.short_address is None) << 6) \
+            | (self.power_failure << 7)
+
+    def _query_control_gear_present(self, command, devicetype):
+        return YES
+
+    def _query_lamp_failure(self, command, devicetype):
+        return self._yes(self.lamp_failure)
+
+    def _query_lamp_power_on(self, command, devicetype):
+        return self._yes(self.actual_level)
+
+    def _query_limit_error(self, command, devicetype):
+        return self._yes(self.limit_error)
+
+    def _query_reset_state(self, command, devicetype):
+        return self._yes(self.reset_state)
+
+    def _query_missing_short_address(self, command, devicetype):
+        return self._yes(self.short_address is None)
+
+    def _query_power_failure(self, command, devicetype):
+        return self._yes(self.power_failure)
+
+    def _query_manufacturer_specific_mode(self, command, devicetype):
+        return self._yes(self.operating_mode >= 0x80)
+
+    def _query_control_gear_failure(self, command, devicetype):
+        return None
+
+    def _query_device_type(self, command, devicetype):
+        if len(self.device_types) == 1:
+            return self.device_types[0]
+        self._next_devicetype = 0
+        return MASK
+
+    def _query_next_device_type(self, command, devicetype):
+        n = self._next_devicetype
+        if n is None:
+            return
+        if n >= len(self.device_types):
+            return 254
+        self._next_devicetype = n + 1
+        return self.device_types[n]
+
+    def _query_fade_time_fade_rate(self, command, devicetype):
+        return (self.fade_time << 4) | self.fade_rate
+
+    def _query_scene_level(self, command, devicetype):
+        return self.scenes[command.param]
+
+    def _query_groups_zero_to_seven(self, command, devicetype):
+        return self.groups & 0xff
+
+    def _query_groups_eight_to_fifteen(self, command, devicetype):
+        return self.groups >> 8
+
+    def _query_random_address_h(self, command, devicetype):
+        return (self.random_address >> 16) & 0xff
+
+    def _query_random_address_m(self, command, devicetype):
+        return (self.random_address >> 8) & 0xff
+
+    def _query_random_address_l(self, command, devicetype):
+        return self.random_address & 0xff
+
+    def _query_extended_version_number(self, command, devicetype):
+        if devicetype and devicetype in self.device_types:
+            return self.extended_version_number
+
+    def _read_memory_location(self, command, devicetype):
+        bank = self.memory_banks.get(self.dtr1)
+        if bank is None or self.dtr0 >= len(bank):
+            return
+        value = bank[self.dtr0]
+        if self.dtr0 < 0xff:
+            self.dtr0 += 1
+        return value
+
+    def _write_memory_location(self, command, devicetype):
+        bank = self.memory_banks.get(self.dtr1)
+        if not self.write_enabled or not self.dtr1 or bank is None \
+                or self.dtr0 >= len(bank):
+            return
+        bank[self.dtr0] = command.param
+        if self.dtr0 < 0xff:
+            self.dtr0 += 1
+        if command.is_query:
+            return command.param
+
+    # Special commands
+
+    def _terminate(self, command, devicetype):
+        self.withdrawn = None
+
+    def _set_dtr0(self, command, devicetype):
+        self.dtr0 = command.param
+
+    def _set_dtr1(self, command, devicetype):
+        self.dtr1 = command.param
+
+    def _set_dtr2(self, command, devicetype):
+        self.dtr2 = command.param
+
+    def _initialise(self, command, devicetype):
+        if command.broadcast \
+                or (command.address is None and self.short_address is None) \
+                or (command.address is not None
+                    and command.address == self.short_address):
+            self.withdrawn = False
+
+    def _randomise(self, command, devicetype):
+        if self.withdrawn is not None:
+            rng = self.bus.random if self.bus else random
+            self.random_address = rng.randrange(0x1000000)
+
+    def _compare(self, command, devicetype):
+        if self.withdrawn is False:
+            return self._yes(self.random_address <= self.search_address)
+
+    def _withdraw(self, command, devicetype):
+        if self.withdrawn is False \
+                and self.random_address == self.search_address:
+            self.withdrawn = True
+
+    def _selected(self):
+        return self.withdrawn is not None \
+            and self.random_address == self.search_address
+
+    def _program_short_address(self, command, devicetype):
+        if self._selected():
+            self.short_address = None if command.address == "MASK" \
+                else command.address
+
+    def _verify_short_address(self, command, devicetype):
+        if self.withdrawn is not None:
+            return self._yes(command.address == self.short_address)
+
+    def _query_short_address(self, command, devicetype):
+        if self._selected():
+            if self.short_address is None:
+                return MASK
+            return (self.short_address << 1) | 1
+
+    def _enable_device_type(self, command, devicetype):
+        pass
+
+
+def _attr(name):
+    def handler(self, command, devicetype):
+        return getattr(self, name)
+    return handler
+
+
+def _search_addr(shift):
+    def handler(self, command, devicetype):
+        if self.withdrawn is not None:
+            self.search_address = \
+                (self.search_address & ~(0xff << shift)) \
+                | (command.param << shift)
+    return handler
+
+
+G = SimulatedGear
+_handlers = {
+    gear.DAPC: G._dapc,
+    gear.Off: G._off,
+    gear.Up: G._up,
+    gear.Down: G._down,
+    gear.StepUp: G._up,
+    gear.StepDown: G._down,
+    gear.RecallMaxLevel: G._recall_max_level,
+    gear.RecallMinLevel: G._recall_min_level,
+    gear.StepDownAndOff: G._step_down_and_off,
+    gear.OnAndStepUp: G._on_and_step_up,
+    gear.EnableDAPCSequence: G._ignore,
+    gear.GoToLastActiveLevel: G._go_to_last_active_level,
+    gear.GoToScene: G._go_to_scene,
+    gear.Reset: G._do_reset,
+    gear.StoreActualLevelInDTR0: G._store_actual_level_in_dtr0,
+    gear.SavePersistentVariables: G._ignore,
+    gear.SetOperatingMode: G._set_operating_mode,
+    gear.ResetMemoryBank: G._ignore,
+    gear.IdentifyDevice: G._ignore,
+    gear.SetMaxLevel: G._set_max_level,
+    gear.SetMinLevel: G._set_min_level,
+    gear.SetSystemFailureLevel: G._set_system_failure_level,
+    gear.SetPowerOnLevel: G._set_power_on_level,
+    gear.SetFadeTime: G._set_fade_time,
+    gear.SetFadeRate: G._set_fade_rate,
+    gear.SetExtendedFadeTime: G._set_extended_fade_time,
+    gear.SetScene: G._set_scene,
+    gear.RemoveFromScene: G._remove_from_scene,
+    gear.AddToGroup: G._add_to_group,
+    gear.RemoveFromGroup: G._remove_from_group,
+    gear.SetShortAddress: G._set_short_address,
+    gear.EnableWriteMemory: G._enable_write_memory,
+    gear.QueryStatus: G._query_status,
+    gear.QueryControlGearPresent: G._query_control_gear_present,
+    gear.QueryLampFailure: G._query_lamp_failure,
+    gear.QueryLampPowerOn: G._query_lamp_power_on,
+    gear.QueryLimitError: G._query_limit_error,
+    gear.QueryResetState: G._query_reset_state,
+    gear.QueryMissingShortAddress: G._query_missing_short_address,
+    gear.QueryVersionNumber: _attr('version_number'),
+    gear.QueryContentDTR0: _attr('dtr0'),
+    gear.QueryDeviceType: G._query_device_type,
+    gear.QueryPhysicalMinimum: _attr('physical_minimum'),
+    gear.QueryPowerFailure: G._query_power_failure,
+    gear.QueryContentDTR1: _attr('dtr1'),
+    gear.QueryContentDTR2: _attr('dtr2'),
+    gear.QueryOperatingMode: _attr('operating_mode'),
+    gear.QueryLightSourceType: _attr('light_source_type'),
+    gear.QueryActualLevel: _attr('actual_level'),
+    gear.QueryMaxLevel: _attr('max_level'),
+    gear.QueryMinLevel: _attr('min_level'),
+    gear.QueryPowerOnLevel: _attr('power_on_level'),
+    gear.QuerySystemFailureLevel: _attr('system_failure_level'),
+    gear.QueryFadeTimeFadeRate: G._query_fade_time_fade_rate,
+    gear.QueryManufacturerSpecificMode: G._query_manufacturer_specific_mode,
+    gear.QueryNextDeviceType: G._query_next_device_type,
+    gear.QueryExtendedFadeTime: _attr('extended_fade_time'),
+    gear.QueryControlGearFailure: G._query_control_gear_failure,
+    gear.QuerySceneLevel: G._query_scene_level,
+    gear.QueryGroupsZeroToSeven: G._query_groups_zero_to_seven,
+    gear.QueryGroupsEightToFifteen: G._query_groups_eight_to_fifteen,
+    gear.QueryRandomAddressH: G._query_random_address_h,
+    gear.QueryRandomAddressM: G._query_random_address_m,
+    gear.QueryRandomAddressL: G._query_random_address_l,
+    gear.ReadMemoryLocation: G._read_memory_location,
+    gear.QueryExtendedVersionNumber: G._query_extended_version_number,
+    gear.Terminate: G._terminate,
+    gear.DTR0: G._set_dtr0,
+    gear.Initialise: G._initialise,
+    gear.Randomise: G._randomise,
+    gear.Compare: G._compare,
+    gear.Withdraw: G._withdraw,
+    gear.Ping: G._ignore,
+    gear.SearchaddrH: _search_addr(16),
+    gear.SearchaddrM: _search_addr(8),
+    gear.SearchaddrL: _search_addr(0),
+    gear.ProgramShortAddress: G._program_short_address,
+    gear.VerifyShortAddress: G._verify_short_address,
+    gear.QueryShortAddress: G._query_short_address,
+    gear.EnableDeviceType: G._enable_device_type,
+    gear.DTR1: G._set_dtr1,
+    gear.DTR2: G._set_dtr2,
+    gear.WriteMemoryLocation: G._write_memory_location,
+    gear.WriteMemoryLocationNoReply: G._write_memory_location,
+}
+del G
+
+# Commands that do not end writeEnableState
+_keep_write_enabled = frozenset([
+    gear.EnableWriteMemory, gear.WriteMemoryLocation,
+    gear.WriteMemoryLocationNoReply, gear.DTR0, gear.DTR1, gear.DTR2,
+    gear.QueryContentDTR0, gear.QueryContentDTR1, gear.QueryContentDTR2,
+])
+
+
+class SimulatedBus(object):
+    """A DALI bus populated with ``SimulatedGear``.
+
+    :param gear: iterable of ``SimulatedGear``
+    :param seed: seed for the random number generator used for
+    random addresses, for reproducible simulations
+    """
+
+    def __init__(self, gear=(), seed=None):
+        self.random = random.Random(seed)
+        self.gear = []
+        self.drivers = []
+        # Number of forward frames transmitted on the bus
+        self.frames = 0
+        self._last = None
+        self._repeated = False
+        for g in gear:
+            self.add_gear(g)
+
+    def add_gear(self, g):
+        g.bus = self
+        self.gear.append(g)
+        return g
+
+    def populate(self, count, addressed=False, **kwargs):
+        """Add count new control gear with random addresses.
+
+        :param addressed: if True, the gear is given the lowest short
+        addresses not in use yet
+        :param kwargs: passed to ``SimulatedGear``
+        :return: list of the new ``SimulatedGear``
+        """
+        used = set(g.short_address for g in self.gear)
+        free = [a for a in range(64) if a not in used]
+        if addressed and count > len(free):
+            raise ValueError("not enough free short addresses")
+        added = []
+        for n in range(count):
+            added.append(self.add_gear(SimulatedGear(
+                short_address=free[n] if addressed else None,
+                random_address=self.random.randrange(0x1000000),
+                **kwargs)))
+        return added
+
+    def transmit(self, frame, sender=None):
+        """Transmit a forward frame on the bus.
+
+        The frame is passed to the ``receive`` method of all drivers on
+        the bus except the sender.
+
+        :return: the backward frame received in response: None if no
+        gear answered, ``BackwardFrameError`` if more than one did
+        """
+        self.frames += 1
+        for driver in self.drivers:
+            if driver is not sender:
+                driver.receive(frame)
+        if len(frame) != 16:
+            self._last = None
+            return
+        key = frame.as_integer
+        command = from_frame(frame)
+        if command.__class__ is gear.EnableDeviceType:
+            for g in self.gear:
+                g._next_devicetype = None
+                g.enabled_devicetype = command.param
+            return
+        repeated = key == self._last and not self._repeated
+        self._last = key
+        self._repeated = repeated
+        answers = []
+        for g in self.gear:
+            devicetype = g.enabled_devicetype
+            g.enabled_devicetype = 0
+            answer = g.handle(command, repeated, devicetype)
+            if answer is not None:
+                answers.append(answer)
+        if not answers:
+            return
+        if len(answers) == 1:
+            return BackwardFrame.of(answers[0])
+        return BackwardFrameError.of(255)
+
+
+class SimulatorDriver(SyncDALIDriver):
+    """Synchronous ``DALIDriver`` implementation for a ``SimulatedBus``.
+
+    Configuration commands are transmitted twice.
+    """
+    logger = logging.getLogger('SimulatorDriver')
+    debug = False
+
+    def __init__(self, bus):
+        self.bus = bus
+        bus.drivers.append(self)
+
+    def construct(self, command):
+        return command.frame
+
+    def extract(self, data):
+        return data
+
+    def transmit(self, command):
+        data = self.construct(command)
+        frame = self.bus.transmit(data, sender=self)
+        if command.is_config:
+            frame = self.bus.transmit(data, sender=self)
+        return self.extract(frame)
+
+    def send(self, command, timeout=None):
+        if self.debug:
+            self.logger.info(str(command))
+        frame = self.transmit(command)
+        if command.response:
+            return command.response(frame)
+        return frame
+
+    def receive(self, frame):
+        pass
+
+    def close(self):
+        self.bus.drivers.remove(self)
+
+
+class AsyncSimulatorDriver(SimulatorDriver, AsyncDALIDriver):
+    """Asynchronous ``DALIDriver`` implementation for a
+    ``SimulatedBus``.
+
+    Callbacks are called before ``send`` returns.  Forward frames
+    transmitted by other drivers on the bus are passed to
+    ``dispatcher``.
+    """
+    logger = logging.getLogger('AsyncSimulatorDriver')
+
+    def send(self, command, callback=None, **kw):
+        if self.debug:
+            self.logger.info(str(command))
+        frame = self.transmit(command)
+        if callback is None:
+            return
+        if command.response:
+            callback(command.response(frame), **kw)
+        else:
+            callback(frame, **kw)
+
+    def receive(self, frame):
+        if not isinstance(frame, ForwardFrame) or self.dispatcher is None:
+            return
+        self.dispatcher(from_frame(frame))
+
+
+__all__ = [
+    "SimulatedGear",
+    "SimulatedBus",
+    "SimulatorDriver",
+    "AsyncSimulatorDriver",
+]
@@ -6,11 +6,14 @@ from dali.driver.base import DALIDriver
 from dali.driver.base import SyncDALIDriver
 from dali.driver.base import USBBackend
 from dali.driver.base import USBListener
+from dali.exceptions import CommunicationError
 from dali.frame import BackwardFrame
 from dali.frame import BackwardFrameError
 from dali.frame import ForwardFrame
 import logging
 import struct
+import threading
+import time
 
 
 DALI_USB_VENDOR = 0x17b5
@@ -18,6 +21,8 @@ DALI_USB_PRODUCT = 0x0020
 
 DALI_USB_DIRECTION_DALI = 0x11
 DALI_USB_DIRECTION_USB = 0x12
+DALI_USB_SEND_ONCE = 0x00
+DALI_USB_SEND_TWICE = 0x20
 DALI_USB_TYPE_16BIT = 0x03
 DALI_USB_TYPE_24BIT = 0x04
 DALI_USB_TYPE_NO_RESPONSE = 0x71
@@ -27,6 +32,13 @@ DALI_USB_TYPE_BROADCAST = 0x74
 # DALI_USB_TYPE_UNKNOWN = 0x77
 
 
+# monotonic clock for deadlines where available
+_clock = getattr(time, 'monotonic', time.time)
+
+# layout of received packets: dr ty ?? ec ad cm st st sn
+_packet_in = struct.Struct('<BBxBBBHB')
+
+
 # debug logging related
 DRIVER_CONSTRUCT = 0x0
 DRIVER_EXTRACT = 0x1
@@ -93,45 +105,62 @@ class TridonicDALIUSBDriver(DALIDriver):
     logger = logging.getLogger('TridonicDALIUSBDriver')
     # next sequence number
     _next_sn = 1
+    # packet buffer reused by construct
+    _packet = None
 
     def construct(self, command):
         """Data expected by DALI USB:
 
-        dr sn ?? ty ?? ec ad cm .. .. .. .. .. .. .. ..
+        dr sn rp ty ?? ec ad cm .. .. .. .. .. .. .. ..
         12 1d 00 03 00 00 ff 08 00 00 00 00 00 00 00 00
 
         dr: direction
             0x12 = USB side
         sn: seqnum
+        rp: repeat
+            0x00 = send once
+            0x20 = send twice, used for configuration commands
         ty: type
             0x03 = 16bit
             0x04 = 24bit
         ec: ecommand
         ad: address
         cm: command
+
+        The returned packet is a buffer owned by the driver which gets
+        reused by the next call, it must be written to the device before
+        another command is constructed.
         """
-        dr = DALI_USB_DIRECTION_USB
-        sn = self._get_sn()
+        packet = self._packet
+        if packet is None:
+            packet = self._packet = bytearray(64)
+            packet[0] = DALI_USB_DIRECTION_USB
         frame = command.frame
-        ty = data = None
-        ec = 0x0
+        data = frame.as_integer
         if len(frame) == 16:
             ty = DALI_USB_TYPE_16BIT
-            ad, cm = frame.as_byte_sequence
-            data = struct.pack(
-                "BBBBBBBB" + (64 - 8) * 'x',
-                dr, sn, 0x0, ty, 0x0, ec, ad, cm
-            )
+            ec = 0x0
         elif len(frame) == 24:
             ty = DALI_USB_TYPE_24BIT
-            # XXX: not yet
-            raise ValueError('24 Bit frames not yet')
+            ec = data >> 16
         else:
             raise ValueError('Unknown frame length: {}'.format(len(frame)))
+        ad = (data >> 8) & 0xff
+        cm = data & 0xff
+        sn = self._get_sn()
+        packet[1] = sn
+        if command.is_config:
+            packet[2] = DALI_USB_SEND_TWICE
+        else:
+            packet[2] = DALI_USB_SEND_ONCE
+        packet[3] = ty
+        packet[5] = ec
+        packet[6] = ad
+        packet[7] = cm
         if self.debug:
-            _log_frame(
-                self.logger, DRIVER_CONSTRUCT, dr, ty, ec, ad, cm, None, sn)
-        return data
+            _log_frame(self.logger, DRIVER_CONSTRUCT, packet[0], ty, ec, ad,
+                       cm, None, sn)
+        return packet
 
     def extract(self, data):
         """Raw data received from DALI USB:
@@ -155,22 +184,20 @@ class TridonicDALIUSBDriver(DALIDriver):
         st: status
             internal status code, value unknown
         sn: seqnum
+
+        data may be any object supporting the buffer protocol, e.g. a
+        ``memoryview`` on the read buffer of the backend; it is not
+        copied.
         """
-        dr = data[0]
-        ty = data[1]
-        ec = data[3]
-        ad = data[4]
-        cm = data[5]
-        st = struct.unpack('H', data[6:8])[0]
-        sn = data[8]
+        dr, ty, ec, ad, cm, st, sn = _packet_in.unpack_from(data)
         if self.debug:
             _log_frame(self.logger, DRIVER_EXTRACT, dr, ty, ec, ad, cm, st, sn)
         # DALI -> DALI
         if dr == DALI_USB_DIRECTION_DALI:
             if ty == DALI_USB_TYPE_COMPLETE:
-                return ForwardFrame(16, [ad, cm])
+                return ForwardFrame.of16((ad << 8) | cm)
             elif ty == DALI_USB_TYPE_BROADCAST:
-                return ForwardFrame(16, [ad, cm])
+                return ForwardFrame.of16((ad << 8) | cm)
             elif ty == DALI_USB_TYPE_RESPONSE:
                 # request not from us, ignore response
                 return
@@ -183,7 +210,7 @@ class TridonicDALIUSBDriver(DALIDriver):
             if ty == DALI_USB_TYPE_NO_RESPONSE:
                 return DALI_USB_NO_RESPONSE
             elif ty == DALI_USB_TYPE_RESPONSE:
-                return BackwardFrame(cm)
+                return BackwardFrame.of(cm)
             elif ty == DALI_USB_TYPE_COMPLETE:
                 # XXX: Happens e.g after sending a DAPC command before
                 #      receiving a response. What should we do with it?
@@ -201,10 +228,7 @@ class TridonicDALIUSBDriver(DALIDriver):
     def _get_sn(self):
         """Get next sequence number."""
         sn = self._next_sn
-        if sn > 255:
-            sn = self._next_sn = 1
-        else:
-            self._next_sn += 1
+        self._next_sn = sn % 255 + 1
         return sn
 
 
@@ -222,6 +246,9 @@ class SyncTridonicDALIUSBDriver(TridonicDALIUSBDriver, SyncDALIDriver):
         )
 
     def send(self, command, timeout=None):
+        if timeout is not None:
+            # pyusb takes milliseconds
+            timeout = int(timeout * 1000)
         self.backend.write(self.construct(command))
         frame = None
         # For now read up to 2 frames. This may not be reliable if forward
@@ -239,11 +266,32 @@ class SyncTridonicDALIUSBDriver(TridonicDALIUSBDriver, SyncDALIDriver):
 
 class AsyncTridonicDALIUSBDriver(TridonicDALIUSBDriver, AsyncDALIDriver):
     """Asynchronous ``DALIDriver`` implementation for Tridonic DALI USB device.
+
+    Commands are pipelined: up to ``window`` sent commands may be waiting
+    for their response at the same time, and ``send`` blocks while the
+    window is full.  If the gateway does not answer a command within
+    ``timeout`` seconds, its callback gets called as if the gateway had
+    reported that there was no response.
+
+    Callbacks run on the threads delivering responses; calling ``send``
+    from a callback while the window is full would block those threads,
+    so it raises ``CommunicationError`` instead.
     """
-    # transaction mapping
-    _transactions = dict()
 
-    def __init__(self, bus=None, port_numbers=None, interface=0):
+    def __init__(self, bus=None, port_numbers=None, interface=0,
+                 window=16, timeout=1.0):
+        if window < 1 or window > 255:
+            raise ValueError('window must be in the range 1..255')
+        self.window = window
+        self.timeout = timeout
+        # transaction mapping
+        self._transactions = dict()
+        # guards transactions and sequence numbers
+        self._lock = threading.Condition()
+        self._expiry = None
+        self._closed = False
+        # flags the threads running callbacks
+        self._local = threading.local()
         self.backend = USBListener(
             self,
             DALI_USB_VENDOR,
@@ -254,24 +302,67 @@ class AsyncTridonicDALIUSBDriver(TridonicDALIUSBDriver, AsyncDALIDriver):
         )
 
     def send(self, command, callback=None, **kw):
-        data = self.construct(command)
-        sn = struct.unpack('B', data[1])[0]
-        self._transactions[sn] = {
-            'command': command,
-            'callback': callback,
-            'kw': kw
-        }
-        self.backend.write(data)
+        with self._lock:
+            # back-pressure, wait for a free slot in the window
+            while not self._closed and len(self._transactions) >= self.window:
+                if getattr(self._local, 'callback', False):
+                    raise CommunicationError(
+                        'Window full, cannot wait for it in a callback')
+                self._lock.wait()
+            if self._closed:
+                raise CommunicationError('Driver has been closed')
+            # never reuse the sequence number of a pending transaction
+            while self._next_sn in self._transactions:
+                self._get_sn()
+            data = self.construct(command)
+            sn = data[1]
+            self._transactions[sn] = {
+                'command': command,
+                'callback': callback,
+                'kw': kw,
+                'deadline': _clock() + self.timeout
+            }
+            if self._expiry is None:
+                self._expiry = threading.Thread(
+                    target=self._expire_transactions)
+                self._expiry.daemon = True
+                self._expiry.start()
+            self._lock.notify_all()
+            # the packet buffer is shared, write it before releasing the lock
+            self.backend.write(data)
+
+    def close(self):
+        """Stop the expiry thread and close the backend.
+
+        Pending transactions are dropped without calling their callbacks.
+        """
+        with self._lock:
+            self._closed = True
+            self._transactions.clear()
+            self._lock.notify_all()
+            expiry = self._expiry
+        if expiry is not None and expiry is not threading.current_thread():
+            expiry.join()
+        self.backend.close()
+
+    @property
+    def pending(self):
+        """Number of sent commands waiting for their response."""
+        return len(self._transactions)
 
     def receive(self, data):
         frame = self.extract(data)
         sn = data[8]
-        if isinstance(frame, ForwardFrame):
-            self._handle_dispatch(frame)
-        elif isinstance(frame, BackwardFrame):
-            self._handle_response(sn, frame)
-        elif frame is DALI_USB_NO_RESPONSE:
-            self._handle_response(sn, None)
+        self._local.callback = True
+        try:
+            if isinstance(frame, ForwardFrame):
+                self._handle_dispatch(frame)
+            elif isinstance(frame, BackwardFrame):
+                self._handle_response(sn, frame)
+            elif frame is DALI_USB_NO_RESPONSE:
+                self._handle_response(sn, None)
+        finally:
+            self._local.callback = False
 
     def _handle_dispatch(self, frame):
         command = from_frame(frame)
@@ -285,13 +376,18 @@ class AsyncTridonicDALIUSBDriver(TridonicDALIUSBDriver, AsyncDALIDriver):
         self.dispatcher(command)
 
     def _handle_response(self, sn, frame):
-        request = self._transactions.get(sn)
+        with self._lock:
+            request = self._transactions.pop(sn, None)
+            if request:
+                self._lock.notify_all()
         if not request:
             if self.debug:
                 msg = 'Received response to unknown request: {}'.format(sn)
                 self.logger.error(msg)
             return
-        del self._transactions[sn]
+        self._complete(request, frame)
+
+    def _complete(self, request, frame):
         callback = request['callback']
         if not callback:
             if self.debug:
@@ -303,6 +399,40 @@ class AsyncTridonicDALIUSBDriver(TridonicDALIUSBDriver, AsyncDALIDriver):
         else:
             callback(frame, **request['kw'])
 
+    def _expire_transactions(self):
+        """Complete transactions the gateway did not answer in time.
+
+        Runs in a daemon thread until the driver is closed.
+        """
+        self._local.callback = True
+        while True:
+            with self._lock:
+                expired = []
+                while not expired:
+                    if self._closed:
+                        return
+                    if not self._transactions:
+                        self._lock.wait()
+                        continue
+                    now = _clock()
+                    expired = [
+                        sn for sn, request in self._transactions.items()
+                        if request['deadline'] <= now
+                    ]
+                    if not expired:
+                        deadline = min(
+                            request['deadline']
+                            for request in self._transactions.values())
+                        self._lock.wait(deadline - now)
+                requests = [self._transactions.pop(sn) for sn in expired]
+                self._lock.notify_all()
+            for request in requests:
+                if self.debug:
+                    msg = 'No response received in time: {}'.format(
+                        request['command'])
+                    self.logger.warning(msg)
+                self._complete(request, None)
+
 
 def _test_sync(logger, command):
     print('Test sync driver')
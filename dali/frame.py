@@ -2,15 +2,20 @@ from __future__ import unicode_literals
 from __future__ import division
 from __future__ import absolute_import
 from dali.compat import python_2_unicode_compatible
-import struct
 import sys
 
 
 if sys.version_info < (3,):
     _integer_types = (int, long)
+
+    def _to_bytes(data, length):
+        return ("%0*x" % (length * 2, data)).decode("hex")
 else:
     _integer_types = (int,)
 
+    def _to_bytes(data, length):
+        return data.to_bytes(length, "big")
+
 
 _bad_init_data = TypeError(
     "data must be a sequence of integers all in the range 0..255 or an integer")
@@ -25,6 +30,7 @@ class Frame(object):
 
     Instances of this object are mutable.
     """
+    __slots__ = ("_bits", "_data", "_error", "_packed")
 
     def __init__(self, bits, data=0):
         """Initialise a Frame with the supplied number of data bits.
@@ -58,6 +64,8 @@ class Frame(object):
             raise ValueError(
                 "Initial data will not fit in {} bits".format(bits))
         self._error = False
+        # Cached result of pack
+        self._packed = None
 
     @property
     def error(self):
@@ -142,9 +150,11 @@ class Frame(object):
             template = ((1 << hi + 1 - lo) - 1) << lo
             mask = ((1 << self._bits) - 1) ^ template
             self._data = self._data & mask | (value << lo)
+            self._packed = None
         elif isinstance(key, int):
             if key < 0 or key >= self._bits:
                 raise IndexError("index out of range")
+            self._packed = None
             if value:
                 self._data = self._data | (1 << key)
             else:
@@ -182,15 +192,7 @@ class Frame(object):
         long, the first element in the sequence contains fewer than 8
         bits.
         """
-        remaining = len(self)
-        l = []
-        d = self._data
-        while remaining > 0:
-            l.append(d & 0xff)
-            d = d >> 8
-            remaining = remaining - 8
-        l.reverse()
-        return l
+        return list(bytearray(self.pack))
 
     @property
     def pack(self):
@@ -198,9 +200,15 @@ class Frame(object):
 
         If the frame is not an exact multiple of 8 bits long, the
         first byte in the string will contain fewer than 8 bits.
+
+        The byte string is computed once and cached until the frame
+        is modified.
         """
-        s = self.as_byte_sequence
-        return struct.pack("B" * len(s), *s)
+        packed = self._packed
+        if packed is None:
+            packed = self._packed = _to_bytes(
+                self._data, (self._bits + 7) // 8)
+        return packed
 
     def __str__(self):
         return "{}({},{})".format(self.__class__.__name__, len(self),
@@ -217,6 +225,7 @@ class ForwardFrame(Frame):
     bits are reserved and shall not be used.  Forward Frames with any
     other number of data bits are proprietary.
     """
+    __slots__ = ()
 
     @property
     def is_reserved(self):
@@ -226,6 +235,22 @@ class ForwardFrame(Frame):
     def is_proprietary(self):
         return len(self) not in (16, 20, 24, 32)
 
+    @classmethod
+    def of16(cls, data):
+        """Return the immutable 16-bit forward frame containing data.
+
+        Frames are interned: the same object is returned for every
+        call with the same data.
+
+        :parameter data: the frame contents as an integer
+        """
+        f = _forward16.get(data)
+        if f is None:
+            if not isinstance(data, _integer_types):
+                raise TypeError("data must be an integer")
+            f = _forward16.setdefault(data, ImmutableForwardFrame(16, data))
+        return f
+
 
 class BackwardFrame(Frame):
     """A response to a forward frame.
@@ -238,10 +263,22 @@ class BackwardFrame(Frame):
     one unit responds to a forward frame.  In this case, create a
     BackwardFrameError instead.
     """
+    __slots__ = ()
 
     def __init__(self, data):
         Frame.__init__(self, 8, data)
 
+    @classmethod
+    def of(cls, data):
+        """Return the immutable backward frame containing data.
+
+        Frames are interned: the same object is returned for every
+        call with the same data.
+
+        :parameter data: the frame contents as an integer 0..255
+        """
+        return _interned(_backward, data)
+
 
 class BackwardFrameError(BackwardFrame):
     """A response to a forward frame received with a framing error.
@@ -251,7 +288,71 @@ class BackwardFrameError(BackwardFrame):
     is addressed to a group or broadcast address.  It shall be
     interpreted as "more than one device responded Yes".
     """
+    __slots__ = ()
 
     def __init__(self, data):
         BackwardFrame.__init__(self, data)
         self._error = True
+
+    @classmethod
+    def of(cls, data):
+        """Return the immutable backward frame with framing error
+        containing data.
+
+        Frames are interned: the same object is returned for every
+        call with the same data.
+
+        :parameter data: the frame contents as an integer 0..255
+        """
+        return _interned(_backward_error, data)
+
+
+class _ImmutableFrame(object):
+    """Mixin for frames that can't be modified.
+
+    Immutable frames are hashable and can be shared freely, for
+    example between commands and the responses received by drivers.
+    Use ``ForwardFrame.of16``, ``BackwardFrame.of`` and
+    ``BackwardFrameError.of`` to obtain them.
+    """
+    __slots__ = ()
+
+    def __setitem__(self, key, value):
+        raise TypeError("{} is immutable".format(self.__class__.__name__))
+
+    def __hash__(self):
+        # consistent with __eq__, which ignores framing errors
+        return hash((self._bits, self._data))
+
+
+class ImmutableForwardFrame(_ImmutableFrame, ForwardFrame):
+    """A forward frame that can't be modified."""
+    __slots__ = ()
+
+
+class ImmutableBackwardFrame(_ImmutableFrame, BackwardFrame):
+    """A backward frame that can't be modified."""
+    __slots__ = ()
+
+
+class ImmutableBackwardFrameError(_ImmutableFrame, BackwardFrameError):
+    """A backward frame received with a framing error that can't be
+    modified.
+    """
+    __slots__ = ()
+
+
+# Interned frames
+_forward16 = {}
+_backward = tuple(ImmutableBackwardFrame(d) for d in range(0x100))
+_backward_error = tuple(ImmutableBackwardFrameError(d) for d in range(0x100))
+
+
+def _interned(table, data):
+    """Backward frame containing data from table."""
+    if not isinstance(data, _integer_types):
+        raise TypeError("data must be an integer")
+    if data < 0 or data > 0xff:
+        # raises like the constructor
+        BackwardFrame(data)
+    return table[data]
@@ -20,6 +20,17 @@ class _GearCommand(command.Command):
     _framesize = 16
 
 
+# Most significant bytes of 16-bit frames which carry a destination
+# address, for direct arc power control commands and for standard
+# commands respectively
+_dapc_address_bytes = tuple(
+    b for b in range(0, 0x100, 2)
+    if address.from_frame(frame.ForwardFrame(16, b << 8)) is not None)
+_standard_address_bytes = tuple(
+    b for b in range(1, 0x100, 2)
+    if address.from_frame(frame.ForwardFrame(16, b << 8)) is not None)
+
+
 ###############################################################################
 # Commands from Table 15 start here
 ###############################################################################
@@ -103,6 +114,19 @@ class _StandardCommand(_GearCommand):
 
         return cls(addr)
 
+    @property
+    def parameters(self):
+        if self._hasparam:
+            return (self.param,)
+        return ()
+
+    @classmethod
+    def _index_keys(cls):
+        if cls._hasparam:
+            return _standard_address_bytes, range(cls._cmdval,
+                                                  cls._cmdval + 0x10)
+        return _standard_address_bytes, (cls._cmdval,)
+
     def __str__(self):
         if self._hasparam:
             return "%s(%s,%s)" % (
@@ -159,6 +183,14 @@ class DAPC(_GearCommand):
             return
         return cls(addr, f[7:0])
 
+    @property
+    def parameters(self):
+        return (self.power,)
+
+    @classmethod
+    def _index_keys(cls):
+        return _dapc_address_bytes, None
+
     def __str__(self):
         if self.power == 0:
             power = "OFF"
@@ -318,6 +350,7 @@ class StoreActualLevelInDTR0(_StandardCommand):
     """
     _cmdval = 0x21
     _uses_dtr0 = True
+    _modifies_dtr0 = True
     _sendtwice = True
 
 
@@ -729,6 +762,9 @@ class QueryLightSourceType(_StandardCommand):
     _uses_dtr0 = True
     _uses_dtr1 = True
     _uses_dtr2 = True
+    _modifies_dtr0 = True
+    _modifies_dtr1 = True
+    _modifies_dtr2 = True
     _response = command.Response
 
 
@@ -903,6 +939,7 @@ class ReadMemoryLocation(_StandardCommand):
     _cmdval = 0xc5
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _modifies_dtr0 = True
     _response = command.Response
 
 
@@ -915,6 +952,7 @@ class QueryExtendedVersionNumber(_StandardCommand):
     device type as an 8-bit number.
     """
     _cmdval = 0xff
+    _needs_devicetype = True
     _response = command.Response
 
 
@@ -963,6 +1001,16 @@ class _SpecialCommand(_GearCommand):
                 if frame[7:0] == 0:
                     return cls()
 
+    @property
+    def parameters(self):
+        if self._hasparam:
+            return (self.param,)
+        return ()
+
+    @classmethod
+    def _index_keys(cls):
+        return (cls._cmdval,), None if cls._hasparam else (0,)
+
     @property
     def frame(self):
         return frame.ForwardFrame(16, (self._cmdval, self.param))
@@ -1004,6 +1052,14 @@ class _ShortAddrSpecialCommand(_SpecialCommand):
             if frame[7] is False and frame[0] is True:
                 return cls(frame[6:1])
 
+    @classmethod
+    def _index_keys(cls):
+        return (cls._cmdval,), None
+
+    @property
+    def parameters(self):
+        return (self.address,)
+
     def __str__(self):
         return "{}({})".format(self.__class__.__name__, self.address)
 
@@ -1018,10 +1074,11 @@ class DTR0(_SpecialCommand):
     _cmdval = 0xa3
     _hasparam = True
     _uses_dtr0 = True
+    _sets_dtr = (0,)
 
 
 @python_2_unicode_compatible
-class Initialise(command.Command):
+class Initialise(_GearCommand):
     """This command shall start or re-trigger a timer for 15 minutes; the
     addressing commands shall only be processed within this period.
     All other commands shall still be processed during this period.
@@ -1074,6 +1131,14 @@ class Initialise(command.Command):
             if f[7] is False and f[0] is True:
                 return cls(address=f[6:1])
 
+    @classmethod
+    def _index_keys(cls):
+        return (cls._cmdval,), None
+
+    @property
+    def parameters(self):
+        return (self.broadcast, self.address)
+
     def __str__(self):
         if self.broadcast:
             return "Initialise(broadcast=True)"
@@ -1193,6 +1258,7 @@ class DTR1(_SpecialCommand):
     _cmdval = 0xc3
     _hasparam = True
     _uses_dtr1 = True
+    _sets_dtr = (1,)
 
 
 class DTR2(_SpecialCommand):
@@ -1200,6 +1266,7 @@ class DTR2(_SpecialCommand):
     _cmdval = 0xc5
     _hasparam = True
     _uses_dtr2 = True
+    _sets_dtr = (2,)
 
 
 class WriteMemoryLocation(_SpecialCommand):
@@ -1222,6 +1289,7 @@ class WriteMemoryLocation(_SpecialCommand):
     _hasparam = True
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _modifies_dtr0 = True
     _response = command.Response
 
 
@@ -1235,3 +1303,4 @@ class WriteMemoryLocationNoReply(_SpecialCommand):
     _hasparam = True
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _modifies_dtr0 = True
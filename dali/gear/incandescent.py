@@ -120,6 +120,8 @@ class QueryFeatures(_IncandescentCommand):
     _cmdval = 0xf0
     _uses_dtr0 = True
     _uses_dtr1 = True
+    _modifies_dtr0 = True
+    _modifies_dtr1 = True
     _response = FeaturesByte1Response
 
 
@@ -158,6 +160,7 @@ class QueryFailureStatus(_IncandescentCommand):
     """
     _cmdval = 0xf1
     _uses_dtr1 = True
+    _modifies_dtr1 = True
     _response = FailureStatusByte1Response
 
 
@@ -247,6 +250,7 @@ class QueryRealLoadPower(_IncandescentCommand):
     """
     _cmdval = 0xf7
     _uses_dtr0 = True
+    _modifies_dtr0 = True
     _response = command.Response
 
 
@@ -0,0 +1,377 @@
+"""Compute short sequences of commands for reaching a desired state of
+the control gear on a bus.
+
+Configurations are dicts of short address to the settings of the gear,
+which is a dict with any of the keys:
+
+- ``groups``: bit mask of the groups the gear is member of, None if
+  unknown
+- ``scenes``: dict of scene number to level, MASK (255) if the gear is
+  not part of the scene; a sequence of 16 levels is accepted as well
+- ``fade_time``, ``fade_rate``
+- ``max_level``, ``min_level``, ``power_on_level``,
+  ``system_failure_level``
+
+Commands addressing several gear at once (broadcast and groups) are only
+used when the configuration covers all control gear on the bus, since
+they would change gear the planner does not know about otherwise.
+"""
+from __future__ import unicode_literals
+from dali import address
+from dali.gear import general as gear
+
+
+MASK = 0xff
+
+# settings stored from DTR0: key, query, command
+_dtr_settings = (
+    ('max_level', gear.QueryMaxLevel, gear.SetMaxLevel),
+    ('min_level', gear.QueryMinLevel, gear.SetMinLevel),
+    ('power_on_level', gear.QueryPowerOnLevel, gear.SetPowerOnLevel),
+    ('system_failure_level', gear.QuerySystemFailureLevel,
+     gear.SetSystemFailureLevel),
+    ('fade_time', None, gear.SetFadeTime),
+    ('fade_rate', None, gear.SetFadeRate),
+)
+
+
+def _answer(interface, command):
+    """Answer to query command as integer, None if there was none."""
+    response = interface.send(command)
+    value = response.value if response is not None else None
+    if value is None or value.error:
+        return
+    return value.as_integer
+
+
+def read_configuration(interface, addresses, scenes=range(16)):
+    """Read the configuration of the gear with addresses.
+
+    Gear not answering is left out of the result.
+
+    :param interface: object with a ``send(command)`` method, e.g. a
+    driver or a ``dali.session.GearStateSession``
+    :param addresses: short addresses as integers
+    :param scenes: scene numbers to read
+    :return: configuration dict
+    """
+    configuration = dict()
+    for a in addresses:
+        short = address.Short(a)
+        low = _answer(interface, gear.QueryGroupsZeroToSeven(short))
+        if low is None:
+            continue
+        high = _answer(interface, gear.QueryGroupsEightToFifteen(short))
+        settings = {'groups': None if high is None else high << 8 | low}
+        for key, query, cmd in _dtr_settings:
+            if query is not None:
+                settings[key] = _answer(interface, query(short))
+        fade = _answer(interface, gear.QueryFadeTimeFadeRate(short))
+        if fade is not None:
+            settings['fade_time'] = fade >> 4
+            settings['fade_rate'] = fade & 0x0f
+        settings['scenes'] = dict(
+            (n, _answer(interface, gear.QuerySceneLevel(short, n)))
+            for n in scenes)
+        configuration[a] = settings
+    return configuration
+
+
+def _flatten(settings):
+    """Settings as dict of (key, parameter) to value."""
+    items = dict()
+    for key, value in settings.items():
+        if key == 'groups':
+            if value is None:
+                continue
+            for g in range(16):
+                items[('group', g)] = bool(value & (1 << g))
+        elif key == 'scenes':
+            if not isinstance(value, dict):
+                value = dict(enumerate(value))
+            for n, level in value.items():
+                items[('scene', n)] = level
+        else:
+            items[(key, None)] = value
+    return items
+
+
+class _Addressing(object):
+    """Choose destination addresses covering a set of gear."""
+
+    def __init__(self, gear_groups, complete):
+        # short address -> group mask
+        self.gear_groups = gear_groups
+        self.complete = complete
+
+    def members(self, group):
+        return frozenset(a for a, groups in self.gear_groups.items()
+                         if groups is not None and groups & (1 << group))
+
+    def cover(self, targets, allowed, groups=range(16)):
+        """Destinations addressing all targets and only allowed gear.
+
+        :param groups: groups which may be used
+        """
+        remaining = set(targets)
+        destinations = []
+        if self.complete:
+            everyone = frozenset(self.gear_groups)
+            candidates = []
+            if everyone <= allowed:
+                candidates.append((address.Broadcast(), everyone))
+            # gear with unknown groups may be member of any group
+            if None in self.gear_groups.values():
+                groups = ()
+            for g in groups:
+                members = self.members(g)
+                if members and members <= allowed:
+                    candidates.append((address.Group(g), members))
+            while remaining and candidates:
+                best, members = max(
+                    candidates, key=lambda c: len(c[1] & remaining))
+                if len(members & remaining) < 2:
+                    break
+                destinations.append(best)
+                remaining -= members
+        for a in sorted(remaining):
+            destinations.append(address.Short(a))
+        return destinations
+
+
+def plan_configuration(current, desired, complete=False):
+    """Commands changing the gear from the current to the desired
+    configuration.
+
+    Settings missing in desired are left as they are.  Settings missing
+    in current are treated as unknown and always sent.
+
+    :param current: configuration as returned by ``read_configuration``
+    :param desired: configuration to reach
+    :param complete: whether current contains all control gear on the
+    bus; only then broadcast and group commands are used
+    :return: list of commands
+    """
+    now = dict((a, _flatten(current.get(a, {}))) for a in current)
+    for a in desired:
+        now.setdefault(a, dict())
+    want = dict((a, _flatten(s)) for a, s in desired.items())
+
+    def changes(keys):
+        """(key, value) -> (gear to change, gear that may be addressed)"""
+        result = dict()
+        for a, items in want.items():
+            for key, value in items.items():
+                if key[0] in keys and value is not None \
+                        and now[a].get(key) != value:
+                    result.setdefault((key, value), set()).add(a)
+        for (key, value), targets in result.items():
+            allowed = frozenset(
+                a for a in now if a in targets or (
+                    now[a].get(key) == value and
+                    want.get(a, {}).get(key, value) == value))
+            result[(key, value)] = (targets, allowed)
+        return result
+
+    def groups_of(state):
+        """Group mask of each gear, None if not known completely."""
+        result = dict()
+        for a, items in state.items():
+            if all(('group', g) in items for g in range(16)):
+                result[a] = sum(1 << g for g in range(16)
+                                if items[('group', g)])
+            else:
+                result[a] = None
+        return result
+
+    commands = []
+
+    # group membership, using only groups which do not change
+    group_changes = changes(('group',))
+    unchanged = [g for g in range(16)
+                 if not any(key == ('group', g) for key, v in group_changes)]
+    addressing = _Addressing(groups_of(now), complete)
+    for (key, member), (targets, allowed) in sorted(group_changes.items()):
+        cmd = gear.AddToGroup if member else gear.RemoveFromGroup
+        for destination in addressing.cover(targets, allowed, unchanged):
+            commands.append(cmd(destination, key[1]))
+        for a in targets:
+            now[a][key] = member
+
+    # everything else addresses the gear by their new groups
+    addressing = _Addressing(groups_of(now), complete)
+    keys = ('scene',) + tuple(key for key, q, c in _dtr_settings)
+    planned = []
+    for (key, value), (targets, allowed) in changes(keys).items():
+        for destination in addressing.cover(targets, allowed):
+            planned.append((key, value, destination))
+
+    def command(key, value, destination):
+        name, param = key
+        if name == 'scene':
+            if value == MASK:
+                return gear.RemoveFromScene(destination, param)
+            return gear.SetScene(destination, param)
+        for setting, query, cmd in _dtr_settings:
+            if setting == name:
+                return cmd(destination)
+
+    def widens(key, value, destination):
+        """Whether a min/max level change extends the range of levels;
+        those are sent first so the new range is never empty.
+        """
+        if isinstance(destination, address.Short):
+            addressed = [destination.address]
+        elif isinstance(destination, address.Group):
+            addressed = addressing.members(destination.group)
+        else:
+            addressed = list(now)
+        old = [now[a].get(key) for a in addressed]
+        if None in old:
+            return key[0] == 'max_level'
+        if key[0] == 'max_level':
+            return all(value > v for v in old)
+        if key[0] == 'min_level':
+            return all(value < v for v in old)
+        return False
+
+    def order(item):
+        key, value, destination = item
+        removes = key[0] == 'scene' and value == MASK
+        return (not widens(*item), removes, value, key,
+                str(destination))
+
+    dtr0 = None
+    for key, value, destination in sorted(planned, key=order):
+        cmd = command(key, value, destination)
+        if not isinstance(cmd, gear.RemoveFromScene) and value != dtr0:
+            commands.append(gear.DTR0(value))
+            dtr0 = value
+        commands.append(cmd)
+    return commands
+
+
+def apply_configuration(interface, desired, complete=False):
+    """Read the configuration of the gear in desired, and send the
+    commands needed to reach it.
+
+    :param complete: whether desired contains all control gear on the
+    bus, see ``plan_configuration``
+    :return: list of commands sent
+    """
+    scenes = set()
+    for settings in desired.values():
+        value = settings.get('scenes', ())
+        scenes.update(value if isinstance(value, dict) else range(len(value)))
+    current = read_configuration(interface, desired, sorted(scenes))
+    commands = plan_configuration(current, desired, complete)
+    for cmd in commands:
+        interface.send(cmd)
+    return commands
+
+
+def plan_levels(levels, groups=None, scenes=None, current=None,
+                complete=False, off=True):
+    """Arc power commands bringing gear to levels with as few frames as
+    possible.
+
+    Commands are chosen greedily: each time the ``DAPC`` or ``GoToScene``
+    command is taken which brings the most gear to their level minus the
+    gear it takes away from their level.  Typically this is a broadcast
+    of the most common level followed by commands for the groups and
+    gear wanting other levels.  Gear not part of a scene are not changed
+    by ``GoToScene``.  Levels are assumed to be within the min and max
+    level of the gear.
+
+    :param levels: dict of short address to level, None if the level of
+    the gear does not matter
+    :param groups: dict of short address to group mask, as answered by
+    ``QueryGroupsZeroToSeven`` and ``QueryGroupsEightToFifteen``
+    :param scenes: dict of short address to scene levels, a dict of scene
+    number to level or a sequence of 16 levels
+    :param current: dict of short address to actual level, gear already
+    at their level need no command
+    :param complete: whether levels contains all control gear on the bus;
+    only then broadcast and group commands are used
+    :param off: use ``Off`` for level 0, which switches off immediately,
+    instead of fading with ``DAPC``
+    :return: list of commands
+    """
+    groups = groups or {}
+    scenes = dict(
+        (a, value if isinstance(value, dict) else dict(enumerate(value)))
+        for a, value in (scenes or {}).items())
+    state = dict((a, (current or {}).get(a)) for a in levels)
+    wanted = dict((a, level) for a, level in levels.items()
+                  if level is not None)
+
+    # destination, members, gear which may be members
+    destinations = []
+    if complete:
+        destinations.append(
+            (address.Broadcast(), frozenset(levels), frozenset()))
+        unknown = frozenset(a for a in wanted if groups.get(a) is None)
+        for g in range(16):
+            members = frozenset(
+                a for a in levels
+                if groups.get(a) is not None and groups[a] & (1 << g))
+            if members:
+                destinations.append((address.Group(g), members, unknown))
+    destinations.extend((address.Short(a), frozenset([a]), frozenset())
+                        for a in sorted(levels))
+    scene_numbers = sorted(set(
+        n for value in scenes.values() for n in value))
+
+    def gain(changes):
+        """Gear brought to their level minus gear taken away from it."""
+        result = 0
+        for a, level in changes:
+            if a in wanted and level != state[a]:
+                if level == wanted[a]:
+                    result += 1
+                elif state[a] == wanted[a]:
+                    result -= 1
+        return result
+
+    commands = []
+    while any(state[a] != level for a, level in wanted.items()):
+        best = None
+        for destination, members, maybe in destinations:
+            if maybe:
+                # gear which may be in the group would change as well
+                continue
+            candidates = []
+            for level in sorted(set(wanted[a] for a in members
+                                    if a in wanted)):
+                if level == 0 and off:
+                    cmd = gear.Off(destination)
+                else:
+                    cmd = gear.DAPC(destination, level)
+                candidates.append(
+                    (cmd, [(a, level) for a in members]))
+            for n in scene_numbers:
+                changes = []
+                for a in members:
+                    level = scenes.get(a, {}).get(n)
+                    if level is None:
+                        changes.append((a, None))
+                    elif level != MASK:
+                        changes.append((a, level))
+                candidates.append((gear.GoToScene(destination, n), changes))
+            for cmd, changes in candidates:
+                g = gain(changes)
+                if best is None or g > best[0]:
+                    best = (g, cmd, changes)
+        g, cmd, changes = best
+        commands.append(cmd)
+        for a, level in changes:
+            state[a] = level
+    return commands
+
+
+__all__ = [
+    "apply_configuration",
+    "plan_configuration",
+    "plan_levels",
+    "read_configuration",
+]
@@ -0,0 +1,426 @@
+"""Sessions send commands on behalf of a caller and may leave out or add
+commands based on what they know about the state of the bus.
+
+A session wraps an interface, i.e. any object with a ``send(command)``
+method like the synchronous drivers or ``dali.driver.daliserver``.  It
+has the same ``send`` method itself, so sessions can be stacked and
+passed to ``dali.bus.Bus`` as interface.
+
+What a session knows about the bus is only valid as long as all
+commands go through it.  Call ``forget`` after commands have been sent
+by other means, e.g. by another bus master, and after a power failure.
+"""
+from __future__ import unicode_literals
+from dali import address
+from dali.command import Command
+from dali.frame import BackwardFrame
+from dali.gear import general as gear
+from dali.gear.general import EnableDeviceType
+import time
+
+
+MASK = 0xff
+
+
+class Session(object):
+    """Pass all commands to interface unchanged.
+
+    Base class of the sessions.  ``frames_saved`` counts the frames
+    subclasses did not need to send.
+    """
+
+    def __init__(self, interface):
+        self.interface = interface
+        self.frames_saved = 0
+        self.forget()
+
+    def forget(self):
+        """Forget what is known about the state of the bus."""
+
+    def send(self, command, *args, **kw):
+        """Send command and return the response to it.
+
+        Further arguments are passed to the ``send`` method of the
+        interface.
+        """
+        try:
+            return self.interface.send(command, *args, **kw)
+        except:
+            # the command may or may not have been received
+            self.forget()
+            raise
+
+
+class DTRSession(Session):
+    """Leave out commands setting DTRs to the value they already hold.
+
+    Control gear and control devices have separate DTRs, they are tracked
+    separately by frame size.  Setting a DTR is a broadcast, so the value
+    is known for all devices until a command modifies it in some of them;
+    from then on it is unknown until set again.
+    """
+
+    def forget(self):
+        # DTR0, DTR1 and DTR2 of control gear (16 bit frames) and control
+        # devices (24 bit frames), None if unknown
+        self._dtr = {
+            16: [None, None, None],
+            24: [None, None, None],
+        }
+
+    def dtr(self, n, framesize=16):
+        """Known value of DTRn of control gear, or of control devices with
+        framesize 24, None if unknown.
+        """
+        return self._dtr[framesize][n]
+
+    def send(self, command, *args, **kw):
+        dtr = self._dtr.get(len(command.frame))
+        if dtr is None:
+            return super(DTRSession, self).send(command, *args, **kw)
+        values = tuple(zip(command._sets_dtr, command.parameters))
+        if values and all(dtr[n] == value for n, value in values):
+            self.frames_saved += 1
+            return
+        response = super(DTRSession, self).send(command, *args, **kw)
+        if command._modifies_dtr0:
+            dtr[0] = None
+        if command._modifies_dtr1:
+            dtr[1] = None
+        if command._modifies_dtr2:
+            dtr[2] = None
+        for n, value in values:
+            dtr[n] = value
+        return response
+
+
+class DeviceTypeSession(Session):
+    """Send ``EnableDeviceType`` before application extended commands.
+
+    The enabled device type is only valid for the command following
+    ``EnableDeviceType``, so it is sent before every command with a
+    ``_devicetype``.  ``EnableDeviceType`` commands sent by the caller are
+    held back and only sent if the next command needs a device type
+    chosen by the caller (``_needs_devicetype``, e.g.
+    ``QueryExtendedVersionNumber``) or is not a known command, e.g. a
+    ``Command`` decoded from an unknown frame; otherwise they are
+    redundant.
+    """
+
+    def forget(self):
+        # device type enabled by the caller for the next command
+        self._pending = None
+
+    def send(self, command, *args, **kw):
+        if isinstance(command, EnableDeviceType):
+            if self._pending is not None:
+                self.frames_saved += 1
+            self._pending = command.param
+            return
+        pending, self._pending = self._pending, None
+        devicetype = None
+        if command._devicetype and len(command.frame) == 16:
+            devicetype = command._devicetype
+        elif command._needs_devicetype or type(command) is Command:
+            devicetype = pending
+        if pending is not None and devicetype != pending:
+            self.frames_saved += 1
+        if devicetype is not None:
+            super(DeviceTypeSession, self).send(
+                EnableDeviceType(devicetype), *args, **kw)
+        return super(DeviceTypeSession, self).send(command, *args, **kw)
+
+
+class GearStateSession(DTRSession):
+    """Answer queries about control gear from what is known about it.
+
+    The state of every control gear is kept by short address.  It is
+    learned from the answers to queries and from the commands sent, e.g.
+    ``DAPC`` sets the actual level and ``DTR0`` followed by ``SetScene``
+    sets a scene level.  Queries with a short address as destination are
+    only sent when the answer is not known or has expired.
+
+    The actual level is the level the gear has been told to go to; while
+    fading the gear reports intermediate levels.  Commands to groups
+    update the gear known to be members of the group and make the state
+    of gear with unknown group membership unknown.
+
+    :param ttl: seconds after which a known value expires, None for never.
+    Either a number for all values, or a dict of value name to seconds,
+    the value names being the keys of ``cached_queries`` and
+    ``default`` for the others.
+    :param clock: function returning the current time in seconds
+    """
+
+    # query class -> name of the value it answers
+    cached_queries = {
+        gear.QueryActualLevel: 'actual_level',
+        gear.QueryMaxLevel: 'max_level',
+        gear.QueryMinLevel: 'min_level',
+        gear.QueryPhysicalMinimum: 'physical_minimum',
+        gear.QueryPowerOnLevel: 'power_on_level',
+        gear.QuerySystemFailureLevel: 'system_failure_level',
+        gear.QuerySceneLevel: 'scene',
+        gear.QueryGroupsZeroToSeven: 'groups',
+        gear.QueryGroupsEightToFifteen: 'groups',
+    }
+
+    def __init__(self, interface, ttl=None, clock=time.time):
+        if not isinstance(ttl, dict):
+            ttl = {'default': ttl}
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        super(GearStateSession, self).__init__(interface)
+
+    def forget(self, short_address=None):
+        """Forget the state of the gear with short_address, of all gear
+        and the DTRs if None.
+        """
+        if short_address is None:
+            super(GearStateSession, self).forget()
+            self._gear = dict()
+        else:
+            self._gear.pop(short_address, None)
+
+    def get(self, short_address, key):
+        """Known value of gear with short_address or None.
+
+        :param key: value name, or tuple of ``'scene'`` and scene number
+        or ``'groups'`` and 0 for groups 0..7 and 1 for 8..15
+        """
+        state = self._gear.get(short_address)
+        if not state or key not in state:
+            return
+        value, timestamp = state[key]
+        name = key[0] if isinstance(key, tuple) else key
+        ttl = self.ttl.get(name, self.ttl.get('default'))
+        if ttl is not None and self.clock() - timestamp >= ttl:
+            del state[key]
+            return
+        return value
+
+    def set(self, short_address, key, value):
+        """Remember a value of gear with short_address, None to forget
+        it.
+        """
+        state = self._gear.setdefault(short_address, dict())
+        if value is None:
+            state.pop(key, None)
+        else:
+            state[key] = (value, self.clock())
+
+    def in_group(self, short_address, group):
+        """Whether gear is member of group, None if unknown."""
+        groups = self.get(short_address, ('groups', group // 8))
+        if groups is None:
+            return
+        return bool(groups & (1 << group % 8))
+
+    def send(self, command, *args, **kw):
+        destination = getattr(command, 'destination', None)
+        if command.is_query:
+            key = self._query_key(command)
+            if key is None or not isinstance(destination, address.Short):
+                return super(GearStateSession, self).send(
+                    command, *args, **kw)
+            value = self.get(destination.address, key)
+            if value is not None:
+                self.hits += 1
+                self.frames_saved += 1
+                return command.response(BackwardFrame.of(value))
+            self.misses += 1
+            response = super(GearStateSession, self).send(
+                command, *args, **kw)
+            answer = getattr(response, '_value', None)
+            if isinstance(answer, BackwardFrame) and not answer.error:
+                self.set(destination.address, key, answer.as_integer)
+            return response
+        # the DTRs before the command is sent
+        dtr0 = self.dtr(0)
+        response = super(GearStateSession, self).send(command, *args, **kw)
+        if len(command.frame) != 16:
+            return response
+        handler = _updates.get(command.__class__)
+        if handler is not None:
+            known, unknown = self._targets(destination)
+            for a in known:
+                handler(self, a, command, dtr0)
+            for a in unknown:
+                self.forget(a)
+        elif command.__class__ in _readdress \
+                or command.__class__ is Command:
+            self.forget()
+        elif destination is not None:
+            # may change anything about the addressed gear
+            known, unknown = self._targets(destination)
+            for a in tuple(known) + tuple(unknown):
+                self.forget(a)
+        return response
+
+    def _query_key(self, command):
+        name = self.cached_queries.get(command.__class__)
+        if name == 'scene':
+            return (name, command.param)
+        if name == 'groups':
+            if command.__class__ is gear.QueryGroupsZeroToSeven:
+                return (name, 0)
+            return (name, 1)
+        return name
+
+    def _targets(self, destination):
+        """Short addresses of gear known to be addressed by destination
+        and of gear which might be addressed.
+        """
+        if isinstance(destination, address.Short):
+            return (destination.address,), ()
+        if isinstance(destination, address.Broadcast):
+            return tuple(self._gear), ()
+        if isinstance(destination, address.Group):
+            known = []
+            unknown = []
+            for a in list(self._gear):
+                member = self.in_group(a, destination.group)
+                if member:
+                    known.append(a)
+                elif member is None:
+                    unknown.append(a)
+            return known, unknown
+        return (), ()
+
+    # Updates of the state of gear a after command has been sent
+
+    def _level(self, a, level):
+        """Actual level after an arc power command with level."""
+        if level == MASK:
+            return
+        if level == 0:
+            self.set(a, 'actual_level', 0)
+            return
+        min_level = self.get(a, 'min_level')
+        max_level = self.get(a, 'max_level')
+        if min_level is None or max_level is None:
+            self.set(a, 'actual_level', None)
+            return
+        self.set(a, 'actual_level', min(max(level, min_level), max_level))
+
+    def _dapc(self, a, command, dtr0):
+        self._level(a, command.power)
+
+    def _off(self, a, command, dtr0):
+        self.set(a, 'actual_level', 0)
+
+    def _recall_max_level(self, a, command, dtr0):
+        self.set(a, 'actual_level', self.get(a, 'max_level'))
+
+    def _recall_min_level(self, a, command, dtr0):
+        self.set(a, 'actual_level', self.get(a, 'min_level'))
+
+    def _go_to_scene(self, a, command, dtr0):
+        level = self.get(a, ('scene', command.param))
+        if level is None:
+            self.set(a, 'actual_level', None)
+        else:
+            self._level(a, level)
+
+    def _level_changed(self, a, command, dtr0):
+        self.set(a, 'actual_level', None)
+
+    def _ignore(self, a, command, dtr0):
+        pass
+
+    def _reset(self, a, command, dtr0):
+        physical_minimum = self.get(a, 'physical_minimum')
+        self.forget(a)
+        self.set(a, 'physical_minimum', physical_minimum)
+        self.set(a, 'min_level', physical_minimum)
+        for key in ('actual_level', 'max_level', 'power_on_level',
+                    'system_failure_level'):
+            self.set(a, key, 254)
+        for scene in range(16):
+            self.set(a, ('scene', scene), MASK)
+        self.set(a, ('groups', 0), 0)
+        self.set(a, ('groups', 1), 0)
+
+    def _set_max_level(self, a, command, dtr0):
+        min_level = self.get(a, 'min_level')
+        if dtr0 is None or min_level is None:
+            self.set(a, 'max_level', None)
+        else:
+            self.set(a, 'max_level', min(max(dtr0, min_level), 254))
+        self.set(a, 'actual_level', None)
+
+    def _set_min_level(self, a, command, dtr0):
+        physical_minimum = self.get(a, 'physical_minimum')
+        max_level = self.get(a, 'max_level')
+        if dtr0 is None or physical_minimum is None or max_level is None:
+            self.set(a, 'min_level', None)
+        else:
+            self.set(a, 'min_level',
+                     min(max(dtr0, physical_minimum), max_level))
+        self.set(a, 'actual_level', None)
+
+    def _set_system_failure_level(self, a, command, dtr0):
+        self.set(a, 'system_failure_level', dtr0)
+
+    def _set_power_on_level(self, a, command, dtr0):
+        self.set(a, 'power_on_level', dtr0)
+
+    def _set_scene(self, a, command, dtr0):
+        self.set(a, ('scene', command.param), dtr0)
+
+    def _remove_from_scene(self, a, command, dtr0):
+        self.set(a, ('scene', command.param), MASK)
+
+    def _group(self, a, group, member):
+        key = ('groups', group // 8)
+        groups = self.get(a, key)
+        if groups is not None:
+            bit = 1 << group % 8
+            self.set(a, key, groups | bit if member else groups & ~bit)
+
+    def _add_to_group(self, a, command, dtr0):
+        self._group(a, command.param, True)
+
+    def _remove_from_group(self, a, command, dtr0):
+        self._group(a, command.param, False)
+
+
+_updates = {
+    gear.DAPC: GearStateSession._dapc,
+    gear.Off: GearStateSession._off,
+    gear.Up: GearStateSession._level_changed,
+    gear.Down: GearStateSession._level_changed,
+    gear.StepUp: GearStateSession._level_changed,
+    gear.StepDown: GearStateSession._level_changed,
+    gear.RecallMaxLevel: GearStateSession._recall_max_level,
+    gear.RecallMinLevel: GearStateSession._recall_min_level,
+    gear.StepDownAndOff: GearStateSession._level_changed,
+    gear.OnAndStepUp: GearStateSession._level_changed,
+    gear.EnableDAPCSequence: GearStateSession._ignore,
+    gear.GoToLastActiveLevel: GearStateSession._level_changed,
+    gear.GoToScene: GearStateSession._go_to_scene,
+    gear.Reset: GearStateSession._reset,
+    gear.StoreActualLevelInDTR0: GearStateSession._ignore,
+    gear.SavePersistentVariables: GearStateSession._ignore,
+    gear.SetMaxLevel: GearStateSession._set_max_level,
+    gear.SetMinLevel: GearStateSession._set_min_level,
+    gear.SetSystemFailureLevel: GearStateSession._set_system_failure_level,
+    gear.SetPowerOnLevel: GearStateSession._set_power_on_level,
+    gear.SetFadeTime: GearStateSession._ignore,
+    gear.SetFadeRate: GearStateSession._ignore,
+    gear.SetExtendedFadeTime: GearStateSession._ignore,
+    gear.SetScene: GearStateSession._set_scene,
+    gear.RemoveFromScene: GearStateSession._remove_from_scene,
+    gear.AddToGroup: GearStateSession._add_to_group,
+    gear.RemoveFromGroup: GearStateSession._remove_from_group,
+    gear.IdentifyDevice: GearStateSession._ignore,
+    gear.EnableWriteMemory: GearStateSession._ignore,
+}
+
+# commands which change short addresses
+_readdress = (gear.SetShortAddress, gear.ProgramShortAddress)
+
+
+__all__ = ["DTRSession", "DeviceTypeSession", "GearStateSession", "Session"]
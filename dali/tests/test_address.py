@@ -0,0 +1,115 @@
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali import frame
+
+
+class TestAddress(unittest.TestCase):
+
+    def test_from_frame(self):
+        """decoding tables agree with the address types"""
+        def linear_from_frame(f):
+            for at in address.Address._addrtypes:
+                r = at.from_frame(f)
+                if r:
+                    return r
+
+        for bits, step in ((16, 1), (24, 251)):
+            for d in range(0, 1 << bits, step):
+                f = frame.ForwardFrame(bits, d)
+                a = address.from_frame(f)
+                la = linear_from_frame(f)
+                self.assertIs(a.__class__, la.__class__)
+                self.assertEqual(str(a), str(la))
+        self.assertIsNone(address.from_frame(frame.ForwardFrame(8, 0)))
+        self.assertIsNone(
+            address.from_frame(frame.ForwardFrame(24, 0x7e0000)))
+
+    def test_roundtrip(self):
+        """addresses survive add_to_frame() and from_frame()"""
+        addresses = [address.Short(a) for a in range(64)] \
+            + [address.Group(g) for g in range(16)] \
+            + [address.Broadcast(), address.BroadcastUnaddressed()]
+        for a in addresses:
+            f = frame.ForwardFrame(16, 0x100)
+            a.add_to_frame(f)
+            self.assertEqual(address.from_frame(f), a)
+        for a in addresses + [address.Group(g) for g in range(16, 32)]:
+            f = frame.ForwardFrame(24, 0x10000)
+            a.add_to_frame(f)
+            self.assertEqual(address.from_frame(f), a)
+
+    def test_flyweight(self):
+        """address and instance objects are shared and immutable"""
+        import pickle
+        objects = [
+            address.Short(5), address.Group(20), address.Broadcast(),
+            address.BroadcastUnaddressed(), address.InstanceNumber(3),
+            address.FeatureInstanceType(7), address.Device(),
+            address.ReservedInstance(0x45),
+        ]
+        for o in objects:
+            args = (o._key(),) if o._valueattr else ()
+            self.assertIs(o.__class__(*args), o)
+            self.assertIs(pickle.loads(pickle.dumps(o)), o)
+            self.assertEqual(hash(o), hash(o.__class__(*args)))
+            with self.assertRaises(AttributeError):
+                o.foo = 1
+        with self.assertRaises(AttributeError):
+            address.Short(5).address = 6
+        self.assertEqual(len(set(objects)), len(objects))
+        self.assertNotEqual(address.Short(5), address.Short(6))
+        self.assertNotEqual(address.InstanceNumber(3),
+                            address.InstanceGroup(3))
+        self.assertEqual({address.Group(1): 1}[address.Group(1)], 1)
+        self.assertRaises(NotImplementedError, address.Instance)
+        self.assertRaises(ValueError, address.Short, 64)
+        self.assertRaises(ValueError, address.InstanceType, 32)
+
+    def test_instance_from_frame(self):
+        """instance bytes are decoded"""
+        cases = [
+            (0x05, address.InstanceNumber, 5),
+            (0x85, address.InstanceGroup, 5),
+            (0xc5, address.InstanceType, 5),
+            (0x25, address.FeatureInstanceNumber, 5),
+            (0xa5, address.FeatureInstanceGroup, 5),
+            (0x65, address.FeatureInstanceType, 5),
+            (0xfc, address.FeatureDevice, None),
+            (0xfd, address.FeatureInstanceBroadcast, None),
+            (0xfe, address.Device, None),
+            (0xff, address.InstanceBroadcast, None),
+            (0x45, address.ReservedInstance, 0x45),
+        ]
+        for b, cls, value in cases:
+            i = address.instance_from_frame(
+                frame.ForwardFrame(24, 0x010000 | (b << 8)))
+            self.assertIs(i.__class__, cls)
+            if value is not None:
+                self.assertEqual(i._value, value)
+            f = frame.ForwardFrame(24, 0)
+            i.add_to_frame(f)
+            self.assertEqual(f[15:8], b)
+        self.assertIsNone(
+            address.instance_from_frame(frame.ForwardFrame(16, 0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,284 @@
+from __future__ import unicode_literals
+import errno
+import os
+import socket
+import sys
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali.gear import general as gear
+
+if sys.version_info >= (3, 7):
+    import asyncio
+    from dali.driver import aio
+    Protocol = asyncio.Protocol
+else:
+    # the asyncio drivers need Python 3.7
+    aio = None
+    Protocol = object
+
+requires_aio = unittest.skipIf(aio is None, 'requires Python 3.7')
+
+
+class FakeDaliServerProtocol(Protocol):
+    """Connection to ``FakeDaliServer``."""
+
+    def __init__(self, server):
+        self.server = server
+        self.buffer = b''
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+
+    def data_received(self, data):
+        self.buffer += data
+        while len(self.buffer) >= 4:
+            message, self.buffer = self.buffer[:4], self.buffer[4:]
+            self.server.received.append(message)
+            status, value = self.server.answers.pop(0)
+            self.server.loop.call_later(
+                self.server.delay, self.answer,
+                bytes(bytearray((2, status, value, 0))))
+
+    def answer(self, result):
+        if not self.transport.is_closing():
+            self.transport.write(result)
+
+
+class FakeDaliServer(object):
+    """Answers daliserver messages with ``answers`` after ``delay``."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.answers = []
+        self.received = []
+        self.connections = 0
+        self.delay = 0
+        self.server = loop.run_until_complete(loop.create_server(
+            lambda: FakeDaliServerProtocol(self), '127.0.0.1', 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+
+
+class FakeOS(object):
+    """Stands in for the os module, opens a socket instead of hidraw."""
+
+    def __init__(self, fd):
+        self.fd = fd
+        # number of writes failing as if the device was busy
+        self.busy = 0
+
+    def open(self, path, flags):
+        return self.fd
+
+    def write(self, fd, data):
+        if self.busy:
+            self.busy -= 1
+            raise OSError(errno.EAGAIN, os.strerror(errno.EAGAIN))
+        return os.write(fd, data)
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+
+class AsyncioTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_soon(self, function, *args):
+        """Call function while the loop is running."""
+        future = self.loop.create_future()
+        self.loop.call_soon(lambda: future.set_result(function(*args)))
+        return self.loop.run_until_complete(future)
+
+
+@requires_aio
+class TestAsyncioDaliServer(AsyncioTestCase):
+
+    def setUp(self):
+        super(TestAsyncioDaliServer, self).setUp()
+        self.server = FakeDaliServer(self.loop)
+        self.driver = aio.AsyncioDaliServer('127.0.0.1', self.server.port)
+
+    def tearDown(self):
+        self.driver.close()
+        self.server.close()
+        super(TestAsyncioDaliServer, self).tearDown()
+
+    def test_send(self):
+        self.server.answers = [(1, 0x42), (0, 0), (0, 0), (0, 0)]
+        response = self.loop.run_until_complete(
+            self.driver.send(gear.QueryActualLevel(address.Short(1))))
+        self.assertEqual(response.value.as_integer, 0x42)
+        response = self.loop.run_until_complete(
+            self.driver.send(gear.QueryControlGearPresent(address.Short(2))))
+        self.assertFalse(response.value)
+        # configuration commands are sent twice
+        self.assertIsNone(self.loop.run_until_complete(
+            self.driver.send(gear.AddToGroup(address.Short(1), 3))))
+        self.assertEqual(self.server.received[2:], [b'\x02\x00\x03\x63'] * 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_cancel(self):
+        self.server.answers = [(1, 0xa0), (1, 0xfe)]
+        self.server.delay = 0.1
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(asyncio.wait_for(
+                self.driver.send(gear.QueryActualLevel(address.Short(1))),
+                0.02))
+        # the late answer to the cancelled query is not taken
+        self.server.delay = 0
+        response = self.loop.run_until_complete(
+            self.driver.send(gear.QueryMaxLevel(address.Short(1))))
+        self.assertEqual(response.value.as_integer, 0xfe)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_connection_closed(self):
+        self.server.answers = [(1, 0x42)]
+        self.loop.run_until_complete(
+            self.driver.send(gear.QueryActualLevel(address.Short(1))))
+        self.server.answers = [(1, 0x43)]
+        self.driver._writer.transport.abort()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        with self.assertRaises(Exception):
+            self.loop.run_until_complete(
+                self.driver.send(gear.QueryActualLevel(address.Short(1))))
+        # a new connection is opened for the next command
+        response = self.loop.run_until_complete(
+            self.driver.send(gear.QueryActualLevel(address.Short(1))))
+        self.assertEqual(response.value.as_integer, 0x43)
+
+
+@requires_aio
+class TestAsyncioTridonicDALIUSBDriver(AsyncioTestCase):
+
+    def setUp(self):
+        super(TestAsyncioTridonicDALIUSBDriver, self).setUp()
+        driver_end, self.gateway = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        driver_end.setblocking(False)
+        self.gateway.setblocking(False)
+        self._os = aio.os
+        aio.os = FakeOS(driver_end.detach())
+        # value to answer queries with, None for no response, False for
+        # not answering at all
+        self.answer = None
+        self.packets = []
+        self.loop.add_reader(self.gateway.fileno(), self.receive)
+        self.driver = self.run_soon(
+            aio.AsyncioTridonicDALIUSBDriver, 'hidraw', 16, 0.05)
+
+    def tearDown(self):
+        self.driver.close()
+        aio.os = self._os
+        self.loop.remove_reader(self.gateway.fileno())
+        self.gateway.close()
+        super(TestAsyncioTridonicDALIUSBDriver, self).tearDown()
+
+    def receive(self):
+        packet = bytearray(self.gateway.recv(64))
+        self.packets.append(packet)
+        if self.answer is not False:
+            self.respond(packet[1], self.answer)
+
+    def respond(self, sn, value):
+        report = bytearray(64)
+        report[0] = 0x12
+        report[1] = 0x71 if value is None else 0x72
+        report[5] = value or 0
+        report[8] = sn
+        self.gateway.send(report)
+
+    def send(self, command):
+        return self.loop.run_until_complete(self.driver.send(command))
+
+    def test_send(self):
+        self.answer = 0x42
+        response = self.send(gear.QueryActualLevel(address.Short(1)))
+        self.assertEqual(response.value.as_integer, 0x42)
+        self.answer = None
+        response = self.send(gear.QueryControlGearPresent(address.Short(1)))
+        self.assertFalse(response.value)
+        self.assertIsNone(self.send(gear.Off(address.Broadcast())))
+        self.assertEqual([p[1] for p in self.packets], [1, 2, 3])
+        self.assertEqual(list(self.packets[2][:8]),
+                         [0x12, 3, 0x00, 0x03, 0x00, 0x00, 0xff, 0x00])
+
+    def test_timeout(self):
+        self.answer = False
+        response = self.send(gear.QueryActualLevel(address.Short(1)))
+        self.assertIsNone(response.value)
+        self.assertEqual(self.driver._transactions, {})
+
+    def test_cancel(self):
+        self.answer = False
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(asyncio.wait_for(
+                self.driver.send(gear.QueryActualLevel(address.Short(1))),
+                0.01))
+        self.assertEqual(self.driver._transactions, {})
+        # the late answer to the cancelled query is ignored
+        self.respond(1, 0xa0)
+        self.answer = 0xfe
+        response = self.send(gear.QueryMaxLevel(address.Short(1)))
+        self.assertEqual(response.value.as_integer, 0xfe)
+
+    def test_busy(self):
+        self.answer = 0x42
+        aio.os.busy = 3
+        tasks = [self.loop.create_task(self.driver.send(
+            gear.QueryActualLevel(address.Short(n)))) for n in (1, 2, 3)]
+        responses = self.loop.run_until_complete(asyncio.gather(*tasks))
+        self.assertEqual([r.value.as_integer for r in responses],
+                         [0x42] * 3)
+        self.assertEqual(aio.os.busy, 0)
+        # each command is written once, with its own packet
+        self.assertEqual([(p[1], p[6]) for p in self.packets],
+                         [(1, 0x03), (2, 0x05), (3, 0x07)])
+        self.assertEqual(self.driver._transactions, {})
+        self.assertFalse(self.loop.remove_writer(self.driver._fd))
+
+    def test_write_error(self):
+        aio.os.write = lambda fd, data: os.write(-1, data)
+        with self.assertRaises(OSError):
+            self.send(gear.QueryActualLevel(address.Short(1)))
+        del aio.os.write
+        self.assertEqual(self.driver._transactions, {})
+        # the window slot is given back
+        self.assertFalse(self.driver._window.locked())
+
+    def test_dispatch(self):
+        commands = []
+        self.driver.dispatcher = commands.append
+        report = bytearray(64)
+        report[:6] = bytearray((0x11, 0x73, 0x00, 0x00, 0xff, 0x00))
+        self.gateway.send(report)
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(len(commands), 1)
+        self.assertIsInstance(commands[0], gear.Off)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali.driver.base import LatencyHistogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_add(self):
+        histogram = LatencyHistogram(bounds=(0.01, 0.1))
+        self.assertIsNone(histogram.mean)
+        self.assertIsNone(histogram.percentile(50))
+        for latency in (0.005, 0.01, 0.05, 2.0):
+            histogram.add(latency)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.mean, 0.51625)
+        self.assertEqual(histogram.max, 2.0)
+        self.assertEqual(histogram.percentile(50), 0.01)
+        self.assertEqual(histogram.percentile(75), 0.1)
+        self.assertEqual(histogram.percentile(100), 2.0)
+        self.assertEqual(str(histogram).split('\n'), [
+            '    <= 10 ms: 2', '   <= 100 ms: 1', '    > 100 ms: 1'])
+        histogram.reset()
+        self.assertEqual(histogram.counts, [0, 0, 0])
+        self.assertEqual(histogram.count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
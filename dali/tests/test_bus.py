@@ -0,0 +1,263 @@
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali import bus
+from dali.driver.simulator import SimulatedBus
+from dali.driver.simulator import SimulatorDriver
+from dali.exceptions import NoFreeAddress
+from dali.frame import BackwardFrame
+from dali.frame import BackwardFrameError
+from dali.gear import general as gear
+
+
+class FakeInterface(object):
+    """Answers like control gear with the given short addresses and
+    unaddressed gear with the given random addresses, and records the
+    commands sent.
+    """
+
+    def __init__(self, short_addresses=(), random_addresses=()):
+        self.short_addresses = set(short_addresses)
+        # random addresses of the gear not withdrawn yet
+        self.random_addresses = set(random_addresses)
+        self.search_addr = [0xff, 0xff, 0xff]
+        self.sent = []
+
+    @property
+    def search_address(self):
+        h, m, l = self.search_addr
+        return (h << 16) | (m << 8) | l
+
+    def answer(self, command):
+        if isinstance(command, gear.QueryControlGearPresent):
+            destination = command.destination
+            if isinstance(destination, address.Broadcast):
+                present = bool(self.short_addresses)
+            else:
+                present = destination.address in self.short_addresses
+            if present:
+                return BackwardFrame(0xff)
+        for n, cmd in enumerate((gear.SetSearchAddrH, gear.SetSearchAddrM,
+                                 gear.SetSearchAddrL)):
+            if isinstance(command, cmd):
+                self.search_addr[n] = command.param
+        if isinstance(command, gear.Compare):
+            count = len([a for a in self.random_addresses
+                         if a <= self.search_address])
+            if count == 1:
+                return BackwardFrame(0xff)
+            if count > 1:
+                return BackwardFrameError(0xff)
+        elif isinstance(command, gear.Withdraw):
+            self.random_addresses.discard(self.search_address)
+        elif isinstance(command, gear.ProgramShortAddress):
+            if self.search_address in self.random_addresses:
+                self.short_addresses.add(command.address)
+        elif isinstance(command, gear.VerifyShortAddress):
+            if command.address in self.short_addresses:
+                return BackwardFrame(0xff)
+
+    def send(self, command):
+        self.sent.append(command)
+        answer = self.answer(command)
+        if command._response:
+            return command._response(answer)
+
+
+class TestScan(unittest.TestCase):
+
+    def test_scan(self):
+        """scan finds addressed gear"""
+        interface = FakeInterface([0, 5, 63])
+        b = bus.Bus(interface=interface)
+        b.scan()
+        self.assertEqual(sorted(b._devices), [0, 5, 63])
+        self.assertEqual(len(interface.sent), 64)
+
+    def test_fast_scan(self):
+        """fast scan queries the short addresses if gear answers"""
+        interface = FakeInterface([2])
+        b = bus.Bus(interface=interface)
+        b.scan(fast=True)
+        self.assertEqual(sorted(b._devices), [2])
+        self.assertEqual(len(interface.sent), 65)
+
+    def test_fast_scan_empty(self):
+        """fast scan of an empty bus sends a single frame"""
+        interface = FakeInterface()
+        b = bus.Bus(interface=interface)
+        b.scan(fast=True)
+        self.assertEqual(b._devices, {})
+        self.assertEqual(len(interface.sent), 1)
+        self.assertIsInstance(
+            interface.sent[0].destination, address.Broadcast)
+
+
+class TestSearchAddr(unittest.TestCase):
+
+    def test_set_search_addr(self):
+        """only changed search address bytes are sent"""
+        interface = FakeInterface()
+        b = bus.Bus(interface=interface)
+        b.set_search_addr(0x123456)
+        self.assertEqual(len(interface.sent), 3)
+        b.set_search_addr(0x123457)
+        self.assertEqual(len(interface.sent), 4)
+        self.assertIsInstance(interface.sent[-1], gear.SetSearchAddrL)
+        b.set_search_addr(0x120000)
+        self.assertEqual(len(interface.sent), 6)
+        self.assertEqual(interface.search_address, 0x120000)
+        self.assertEqual(b.search_frames_saved, 3)
+        b.forget_search_addr()
+        b.set_search_addr(0x120000)
+        self.assertEqual(len(interface.sent), 9)
+
+    def test_search_forgets_search_addr(self):
+        """a new search sends the whole search address"""
+        interface = FakeInterface(random_addresses=[0x123456])
+        b = bus.Bus(interface=interface)
+        b.set_search_addr(0xffffff)
+        # e.g. by another bus master
+        interface.send(gear.SetSearchAddrH(0))
+        self.assertEqual(b.find_next(0, 0xffffff), 0x123456)
+
+    def test_assign_short_addresses(self):
+        """all unaddressed gear gets a short address"""
+        interface = FakeInterface([0], [0x100, 0x5000, 0xfff000])
+        b = bus.Bus(interface=interface)
+        b.assign_short_addresses()
+        self.assertEqual(sorted(b._devices), [0, 1, 2, 3])
+        self.assertEqual(interface.short_addresses, set([0, 1, 2, 3]))
+        self.assertEqual(interface.random_addresses, set())
+        self.assertGreater(b.search_frames_saved, 0)
+        self.assertEqual([r.address for r in b.search_report],
+                         [0x100, 0x5000, 0xfff000])
+
+
+class NoisyInterface(FakeInterface):
+    """Garbles the first ``noise`` answers to Compare."""
+
+    def __init__(self, noise, *args):
+        super(NoisyInterface, self).__init__(*args)
+        self.noise = noise
+
+    def answer(self, command):
+        answer = super(NoisyInterface, self).answer(command)
+        if isinstance(command, gear.Compare) and answer is not None \
+                and self.noise:
+            self.noise -= 1
+            return BackwardFrameError(0xff)
+        return answer
+
+
+class TestAddressSearch(unittest.TestCase):
+
+    def search(self, random_addresses):
+        """Find all random addresses, withdrawing each one found."""
+        interface = FakeInterface(random_addresses=random_addresses)
+        search = bus.AddressSearch(bus.Bus(interface=interface))
+        found = []
+        while True:
+            addr = search.find_next()
+            if addr is None:
+                break
+            found.append(addr)
+            self.assertEqual(interface.search_address, addr)
+            interface.send(gear.Withdraw())
+            search.withdrawn(addr)
+        return search, found
+
+    def test_find_next(self):
+        """ballasts are found lowest random address first"""
+        addresses = [0x000000, 0x000001, 0x7fffff, 0xfffffe, 0xffffff]
+        search, found = self.search(reversed(addresses))
+        self.assertEqual(found, addresses)
+        self.assertEqual([r.address for r in search.report], addresses)
+        for r in search.report:
+            self.assertLessEqual(r.compares, 25)
+            self.assertGreaterEqual(r.frames, r.compares)
+
+    def test_empty(self):
+        """a single Compare finds that there are no ballasts"""
+        search, found = self.search([])
+        self.assertEqual(found, [])
+        self.assertEqual(search.compares, 1)
+        self.assertIsNone(search.find_next())
+        self.assertEqual(search.compares, 1)
+
+    def test_knowledge_kept(self):
+        """answers are reused for the following ballasts"""
+        addresses = [0x100000 + 0x1000 * n for n in range(16)]
+        search, found = self.search(addresses)
+        self.assertEqual(found, addresses)
+        # restarting the search from scratch takes 24 Compares per ballast
+        self.assertLess(search.compares, 16 * 24)
+
+    def test_noise(self):
+        """a garbled answer of a single ballast finds no phantom"""
+        interface = NoisyInterface(1, [], [0x100])
+        b = bus.Bus(interface=interface)
+        b.assign_short_addresses()
+        self.assertEqual(sorted(b._devices), [0])
+        self.assertEqual([r.address for r in b.search_report], [0x100])
+        interface = NoisyInterface(3, [], [0x100, 0x200000, 0x300000])
+        search = bus.AddressSearch(bus.Bus(interface=interface))
+        for addr in (0x100, 0x200000, 0x300000):
+            self.assertEqual(search.find_next(), addr)
+            interface.send(gear.Withdraw())
+            search.withdrawn(addr)
+        self.assertIsNone(search.find_next())
+
+
+class TestBusSimulated(unittest.TestCase):
+
+    def setUp(self):
+        self.simulated = SimulatedBus(seed=0)
+        self.driver = SimulatorDriver(self.simulated)
+        self.bus = bus.Bus(interface=self.driver)
+
+    def test_assign_short_addresses(self):
+        """all unaddressed gear gets a short address"""
+        self.simulated.populate(3, addressed=True)
+        self.simulated.populate(20)
+        self.bus.assign_short_addresses()
+        self.assertEqual(sorted(self.bus._devices), list(range(23)))
+        self.assertEqual(
+            sorted(g.short_address for g in self.simulated.gear),
+            list(range(23)))
+        report = self.bus.search_report
+        self.assertEqual(len(report), 20)
+        self.assertEqual(
+            sorted(r.address for r in report),
+            sorted(g.random_address for g in self.simulated.gear[3:]))
+        for r in report:
+            self.assertLessEqual(r.compares, 25)
+            self.assertGreaterEqual(r.frames, r.compares)
+        self.assertGreater(self.bus.search_frames_saved, 0)
+
+    def test_no_free_address(self):
+        """running out of short addresses raises NoFreeAddress"""
+        self.simulated.populate(63, addressed=True)
+        self.simulated.populate(2)
+        self.assertRaises(NoFreeAddress, self.bus.assign_short_addresses)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -99,6 +99,99 @@ class TestCommands(unittest.TestCase):
             self.assertIsInstance(str(command.from_frame(f, dt)),
                                   str)
 
+    def test_index(self):
+        """decoding index gives the same results as trying every command"""
+        def linear_from_frame(f, devicetype):
+            for dc in command.Command._commands:
+                if dc._devicetype != devicetype:
+                    continue
+                r = dc.from_frame(f)
+                if r:
+                    return r
+            return command.Command(f)
+
+        # Trying every command is slow; only check a sample of frames
+        for i, (fs, d, dt) in enumerate(_test_pattern()):
+            if i % 13:
+                continue
+            f = frame.ForwardFrame(fs, d)
+            c = command.from_frame(f, dt)
+            lc = linear_from_frame(f, dt)
+            self.assertIs(c.__class__, lc.__class__)
+            self.assertEqual(c.frame, lc.frame)
+
+    def test_from_frames(self):
+        """batch decoding matches command.from_frame()"""
+        pattern = list(_test_pattern())[::7]
+        # Repeat some frames at the end
+        pattern_ = pattern + pattern[:100]
+        decoded = command.from_frames(
+            [frame.ForwardFrame(fs, d).as_integer for fs, d, dt in pattern_],
+            [fs for fs, d, dt in pattern_],
+            [dt for fs, d, dt in pattern_])
+        self.assertEqual(len(decoded.commands), len(pattern_))
+        for i, (fs, d, dt) in enumerate(pattern):
+            f = frame.ForwardFrame(fs, d)
+            c = command.from_frame(f, dt)
+            cls = decoded.commands[i]
+            self.assertIs(cls, c.__class__)
+            self.assertEqual(
+                [str(p) for p in decoded.parameters[i]],
+                [str(p) for p in c.parameters])
+            if cls is command.Command:
+                self.assertIsNone(decoded.addresses[i])
+                continue
+            # Commands can be rebuilt from the decoded columns
+            args = decoded.parameters[i]
+            if decoded.addresses[i] is not None:
+                args = (decoded.addresses[i],) + args
+            self.assertEqual(cls(*args).frame, f)
+        self.assertEqual(decoded.commands[-100:], decoded.commands[:100])
+        self.assertEqual(
+            command.from_frames([0x0100, 0xfe80]),
+            ([generalgear.Off, generalgear.DAPC],
+             [address.Short(0), address.Broadcast()],
+             [(), (0x80,)]))
+        self.assertRaises(ValueError, command.from_frames, [0x0100], [16, 16])
+
+    def test_command_cache(self):
+        """command cache returns shared commands with immutable frames"""
+        cache = command.CommandCache(size=3)
+        c = cache(generalgear.DAPC, address.Short(5), 100)
+        self.assertIs(c, cache(generalgear.DAPC, address.Short(5), 100))
+        self.assertEqual(c.frame, generalgear.DAPC(5, 100).frame)
+        with self.assertRaises(TypeError):
+            c.frame[0] = True
+        cache(generalgear.Off, address.Broadcast())
+        cache(generalgear.Off, address.Short(1))
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 3, 3))
+        # Least recently used command is dropped first
+        cache(generalgear.DAPC, address.Short(5), 100)
+        cache(generalgear.RecallMaxLevel, address.Short(1))
+        self.assertEqual(len(cache), 3)
+        self.assertIs(c, cache(generalgear.DAPC, address.Short(5), 100))
+        self.assertIsNot(cache(generalgear.Off, address.Broadcast()),
+                         cache(generalgear.Off, address.Short(0)))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        # commands computing their frame are not shared
+        for cls, args in ((generalgear.DTR0, (5,)), (generalgear.Compare, ()),
+                          (generalgear.VerifyShortAddress, (1,))):
+            c = cache(cls, *args)
+            self.assertIsNot(c, cache(cls, *args))
+            c.frame[0] = not c.frame[0]
+            self.assertEqual(cache(cls, *args).frame, cls(*args).frame)
+        self.assertEqual(len(cache), 0)
+
+    def test_frame_mutable(self):
+        """commands return mutable frames"""
+        for c in (generalgear.DAPC(5, 100), generalgear.Off(5),
+                  generalgear.Compare(), generalgear.VerifyShortAddress(1),
+                  generalgear.Initialise(broadcast=True)):
+            f = c.frame
+            self.assertNotIsInstance(f, frame._ImmutableFrame)
+            f[0] = not f[0]
+
     def test_with_integer_destination(self):
         """commands accept integer destination"""
         self.assertEqual(
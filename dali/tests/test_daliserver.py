@@ -0,0 +1,175 @@
+from __future__ import unicode_literals
+import os
+import socket
+import sys
+import threading
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali.driver.daliserver import ConnectionPool
+from dali.driver.daliserver import DaliServer
+from dali.gear import general as gear
+
+
+class FakeDaliServer(object):
+    """daliserver on a local port answering every message with
+    ``answer``, None for not answering.
+    """
+
+    def __init__(self):
+        self.answer = b'\x02\x01\x42\x00'
+        # connections are closed after this many messages, None for never
+        self.messages_per_connection = None
+        self.connections = 0
+        self.received = []
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(8)
+        self.port = self.listener.getsockname()[1]
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                connection, peer = self.listener.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self.handle, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def handle(self, connection):
+        count = 0
+        while count != self.messages_per_connection:
+            message = connection.recv(4)
+            if not message:
+                break
+            self.received.append(message)
+            if self.answer is not None:
+                connection.sendall(self.answer)
+            count += 1
+        connection.close()
+
+    def close(self):
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.listener.close()
+
+
+class FakeSocket(object):
+
+    closed = False
+
+    def sendall(self, data):
+        raise RuntimeError('failed')
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDaliServer()
+        self.target = ('127.0.0.1', self.server.port)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_reuse(self):
+        pool = ConnectionPool()
+        driver = DaliServer(*self.target, pool=pool)
+        for i in range(3):
+            response = driver.send(gear.QueryActualLevel(address.Short(1)))
+            self.assertEqual(response.value.as_integer, 0x42)
+        self.assertEqual(self.server.connections, 1)
+        pool.close()
+
+    def test_stale_connection(self):
+        self.server.messages_per_connection = 1
+        pool = ConnectionPool()
+        driver = DaliServer(*self.target, pool=pool)
+        driver.send(gear.QueryActualLevel(address.Short(1)))
+        response = driver.send(gear.QueryActualLevel(address.Short(1)))
+        self.assertEqual(response.value.as_integer, 0x42)
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(len(self.server.received), 2)
+        pool.close()
+
+    def test_timeout_not_retried(self):
+        pool = ConnectionPool(timeout=0.1)
+        driver = DaliServer(*self.target, pool=pool)
+        driver.send(gear.QueryActualLevel(address.Short(1)))
+        self.server.answer = None
+        with self.assertRaises(socket.timeout):
+            driver.send(gear.Off(address.Short(1)))
+        self.assertEqual(len(self.server.received), 2)
+        self.assertEqual(self.server.connections, 1)
+        # the connection is not given back to the pool
+        self.assertEqual(pool._idle[self.target], [])
+
+    def test_close_on_error(self):
+        s = FakeSocket()
+        pool = ConnectionPool()
+        pool.connect = lambda target: s
+        driver = DaliServer(*self.target, pool=pool)
+        with self.assertRaises(RuntimeError):
+            driver.send(gear.Off(address.Short(1)))
+        self.assertTrue(s.closed)
+        self.assertEqual(pool._idle, {})
+
+    def test_idle_size(self):
+        pool = ConnectionPool(size=2)
+        connections = [pool.acquire(self.target)[0] for i in range(3)]
+        for s in connections:
+            pool.release(self.target, s)
+        self.assertEqual(pool._idle[self.target], connections[:2])
+        with self.assertRaises(socket.error):
+            connections[2].sendall(b'\x02\x00\xff\x00')
+        pool.close()
+        self.assertEqual(pool._idle, {})
+
+    def test_concurrent_acquire(self):
+        pool = ConnectionPool()
+        s, reused = pool.acquire(self.target)
+        pool.release(self.target, s)
+        acquired = []
+        barrier = threading.Event()
+
+        def acquire():
+            barrier.wait()
+            acquired.append(pool.acquire(self.target))
+
+        threads = [threading.Thread(target=acquire) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        barrier.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(reused for s, reused in acquired), 1)
+        self.assertEqual(len(set(id(s) for s, reused in acquired)), 4)
+        for s, reused in acquired:
+            s.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -143,6 +143,54 @@ class TestFrame(unittest.TestCase):
         f = frame.Frame(16, 0xaa55)
         self.assertEqual(f.pack, b'\xaa\x55')
 
+    def test_pack_cache(self):
+        """packed frame is updated when the frame is modified"""
+        f = frame.ForwardFrame(16, 0xaa55)
+        self.assertEqual(f.pack, b'\xaa\x55')
+        f[7:0] = 0x12
+        self.assertEqual(f.pack, b'\xaa\x12')
+        f[15] = False
+        self.assertEqual(f.pack, b'\x2a\x12')
+        self.assertEqual(f.as_byte_sequence, [0x2a, 0x12])
+        self.assertFalse(hasattr(f, '__dict__'))
+
+    def test_interned(self):
+        """interned frames are shared and can't be modified"""
+        f = frame.ForwardFrame.of16(0x1234)
+        self.assertIs(f, frame.ForwardFrame.of16(0x1234))
+        self.assertIsInstance(f, frame.ForwardFrame)
+        self.assertEqual(f, frame.ForwardFrame(16, 0x1234))
+        self.assertEqual(hash(f), hash(frame.ForwardFrame.of16(0x1234)))
+        with self.assertRaises(TypeError):
+            f[0] = True
+        with self.assertRaises(TypeError):
+            f[7:0] = 0
+        self.assertRaises(ValueError, frame.ForwardFrame.of16, 0x10000)
+        self.assertRaises(TypeError, frame.ForwardFrame.of16, (0x12, 0x34))
+        b = frame.BackwardFrame.of(0x55)
+        self.assertIs(b, frame.BackwardFrame.of(0x55))
+        self.assertIsInstance(b, frame.BackwardFrame)
+        self.assertFalse(b.error)
+        e = frame.BackwardFrameError.of(0xff)
+        self.assertIsInstance(e, frame.BackwardFrameError)
+        self.assertTrue(e.error)
+        self.assertIsNot(e, frame.BackwardFrame.of(0xff))
+        for cls in (frame.BackwardFrame, frame.BackwardFrameError):
+            self.assertRaises(ValueError, cls.of, -1)
+            self.assertRaises(ValueError, cls.of, 0x100)
+            self.assertRaises(TypeError, cls.of, (0x12,))
+
+    def test_interned_hash(self):
+        """equal interned frames have equal hashes"""
+        b = frame.BackwardFrame.of(0xff)
+        e = frame.BackwardFrameError.of(0xff)
+        self.assertEqual(b, e)
+        self.assertEqual(e, b)
+        self.assertEqual(hash(b), hash(e))
+        self.assertEqual(len(set([b, e])), 1)
+        self.assertIn(e, {b: None})
+        self.assertIn(b, {e: None})
+
     def test_contains(self):
         """frame __contains__ method works as expected"""
         self.assertTrue(True in frame.Frame(16, 0xaa55))
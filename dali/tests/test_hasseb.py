@@ -0,0 +1,108 @@
+from __future__ import unicode_literals
+import os
+import sys
+import threading
+import time
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali.device import general as device
+from dali.driver import hasseb
+from dali.exceptions import CommunicationError
+from dali.frame import BackwardFrame
+from dali.frame import BackwardFrameError
+from dali.gear import general as gear
+
+
+class FakeListener(object):
+    """Stands in for the USB listener, answers queries from a thread."""
+
+    answer = None
+
+    def __init__(self, driver, vendor, product, **kw):
+        self.driver = driver
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        if self.answer is not None:
+            threading.Thread(
+                target=self.driver.receive, args=(self.answer,)).start()
+
+    def close(self):
+        pass
+
+
+class TestHassebDALIUSBDriver(unittest.TestCase):
+
+    def setUp(self):
+        self._listener = hasseb.USBListener
+        hasseb.USBListener = FakeListener
+
+    def tearDown(self):
+        hasseb.USBListener = self._listener
+
+    def test_construct(self):
+        driver = hasseb.HassebDALIUSBDriver()
+        self.assertEqual(
+            driver.construct(gear.DAPC(address.Short(1), 0x80)),
+            b'\x02\x80')
+        with self.assertRaises(ValueError):
+            driver.construct(device.QueryDeviceStatus(address.Short(1)))
+
+    def test_extract(self):
+        driver = hasseb.HassebDALIUSBDriver()
+        self.assertIsNone(driver.extract(bytearray(8)))
+        self.assertIs(driver.extract(bytearray((1, 0, 0))),
+                      hasseb.HASSEB_DALI_USB_NO_RESPONSE)
+        frame = driver.extract(memoryview(bytearray((2, 0x42))))
+        self.assertIsInstance(frame, BackwardFrame)
+        self.assertEqual(frame.as_integer, 0x42)
+        self.assertIsInstance(driver.extract(bytearray((3, 0))),
+                              BackwardFrameError)
+
+    def test_send(self):
+        driver = hasseb.SyncHassebDALIUSBDriver()
+        self.assertIsNone(driver.send(gear.Off(address.Broadcast())))
+        driver.backend.answer = bytearray((2, 0x42))
+        response = driver.send(gear.QueryActualLevel(address.Short(3)))
+        self.assertEqual(response.value.as_integer, 0x42)
+        driver.backend.answer = bytearray((1, 0))
+        response = driver.send(gear.QueryControlGearPresent(
+            address.Short(3)))
+        self.assertFalse(response.value)
+        self.assertEqual(driver.backend.written,
+                         [b'\xff\x00', b'\x07\xa0', b'\x07\x91'])
+        self.assertEqual(driver.latency.count, 2)
+        # answers nobody waits for are ignored
+        driver.receive(bytearray((2, 0x10)))
+        driver.backend.answer = None
+        with self.assertRaises(CommunicationError):
+            driver.send(gear.QueryActualLevel(address.Short(3)), timeout=0.01)
+        self.assertEqual(driver.latency.count, 2)
+
+    def test_send_twice(self):
+        driver = hasseb.SyncHassebDALIUSBDriver()
+        start = time.time()
+        driver.send(gear.AddToGroup(address.Short(1), 3))
+        self.assertGreaterEqual(time.time() - start,
+                                driver.send_twice_interval)
+        self.assertEqual(driver.backend.written, [b'\x03\x63', b'\x03\x63'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+from __future__ import unicode_literals
+import os
+import sys
+import threading
+import time
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali.driver.manager import DriverManager
+from dali.driver.simulator import SimulatedBus
+from dali.driver.simulator import SimulatorDriver
+from dali.exceptions import CommunicationError
+from dali.gear import general as gear
+
+
+class SlowDriver(SimulatorDriver):
+    """Takes 50 ms for every command, or fails on ``fail`` raising
+    ``error``.
+    """
+
+    fail = None
+    error = CommunicationError('bus failed')
+
+    def send(self, command, timeout=None):
+        if command == self.fail:
+            raise self.error
+        time.sleep(0.05)
+        return super(SlowDriver, self).send(command, timeout)
+
+
+class TestDriverManager(unittest.TestCase):
+
+    def setUp(self):
+        self.buses = dict()
+        drivers = dict()
+        for n in range(4):
+            bus = SimulatedBus(seed=n)
+            bus.populate(n + 1, addressed=True)
+            self.buses['bus{}'.format(n)] = bus
+            drivers['bus{}'.format(n)] = SlowDriver(bus)
+        self.manager = DriverManager(drivers)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def test_send(self):
+        start = time.time()
+        results = self.manager.send([
+            gear.DAPC(address.Broadcast(), 42),
+            gear.QueryActualLevel(address.Short(0)),
+            gear.QueryControlGearPresent(address.Short(1)),
+        ])
+        # the buses work concurrently
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(sorted(results), ['bus0', 'bus1', 'bus2', 'bus3'])
+        for name, result in results.items():
+            self.assertIsNone(result.error)
+            off, level, present = result.responses
+            self.assertEqual(level.value.as_integer, 42)
+            self.assertEqual(present.value, name != 'bus0')
+        self.assertEqual(
+            [g.actual_level for g in self.buses['bus3'].gear], [42] * 4)
+
+    def test_execute(self):
+        failing = gear.QueryActualLevel(address.Short(1))
+        self.manager.drivers['bus1'].fail = failing
+        results = self.manager.execute({
+            'bus1': [gear.Off(address.Broadcast()), failing,
+                     gear.Off(address.Broadcast())],
+            'bus2': [gear.QueryActualLevel(address.Short(2))],
+        })
+        self.assertEqual(sorted(results), ['bus1', 'bus2'])
+        self.assertEqual(len(results['bus1'].responses), 1)
+        self.assertIsInstance(results['bus1'].error, CommunicationError)
+        self.assertIsNone(results['bus2'].error)
+        self.assertEqual(len(results['bus2'].responses), 1)
+
+    def test_execute_unknown_bus(self):
+        with self.assertRaises(KeyError):
+            self.manager.execute({
+                'bus0': [gear.DAPC(address.Broadcast(), 42)],
+                'unknown': [gear.DAPC(address.Broadcast(), 42)],
+            })
+        self.manager.send([gear.QueryActualLevel(address.Short(0))])
+        # nothing has been sent
+        self.assertEqual(self.buses['bus0'].gear[0].actual_level, 254)
+
+    def test_worker_stopped(self):
+        failing = gear.Off(address.Broadcast())
+        self.manager.drivers['bus1'].fail = failing
+        self.manager.drivers['bus1'].error = SystemExit()
+        # SystemExit ends the thread quietly, keep test runners from
+        # reporting it
+        excepthook = getattr(threading, 'excepthook', None)
+        threading.excepthook = lambda args: None
+        try:
+            results = self.manager.execute({'bus1': [failing]})
+            self.assertIsInstance(results['bus1'].error, SystemExit)
+            self.manager._workers['bus1'][0].join()
+        finally:
+            if excepthook is None:
+                del threading.excepthook
+            else:
+                threading.excepthook = excepthook
+        with self.assertRaises(RuntimeError):
+            self.manager.execute({'bus1': [failing]})
+
+    def test_add(self):
+        with self.assertRaises(ValueError):
+            self.manager.add('bus0', SlowDriver(SimulatedBus()))
+
+    def test_close(self):
+        bus = self.buses['bus0']
+        self.manager.close()
+        self.assertEqual(bus.drivers, [])
+        self.assertEqual(self.manager.drivers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
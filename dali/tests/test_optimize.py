@@ -0,0 +1,194 @@
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali.driver.simulator import SimulatedBus
+from dali.driver.simulator import SimulatorDriver
+from dali.gear import general as gear
+from dali.optimize import apply_configuration
+from dali.optimize import plan_configuration
+from dali.optimize import plan_levels
+from dali.optimize import read_configuration
+
+
+class TestConfiguration(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedBus(seed=0)
+        self.gear = self.bus.populate(8, addressed=True)
+        self.driver = SimulatorDriver(self.bus)
+        self.desired = dict((a, {
+            'groups': 1 << (a % 2) | 0x04,
+            'scenes': {0: 100, 1: 50 + 10 * (a % 2), 2: 255},
+            'fade_time': 3,
+            'max_level': 200,
+            'min_level': 20,
+            'power_on_level': 100,
+        }) for a in range(8))
+
+    def check(self, desired):
+        current = read_configuration(self.driver, desired, range(3))
+        for a, settings in desired.items():
+            for key, value in settings.items():
+                self.assertEqual(current[a][key], value,
+                                 '{} of {}'.format(key, a))
+        self.assertEqual(plan_configuration(current, desired), [])
+
+    def test_apply(self):
+        """the configuration is reached with shared commands"""
+        commands = apply_configuration(self.driver, self.desired,
+                                       complete=True)
+        self.check(self.desired)
+        broadcast = [c for c in commands if isinstance(
+            getattr(c, 'destination', None), address.Broadcast)]
+        self.assertEqual(len(broadcast), 6)
+        scenes = [c for c in commands if isinstance(c, gear.SetScene)]
+        self.assertEqual(
+            [str(c.destination) for c in scenes],
+            ['<group 0>', '<group 1>', '<broadcast>'])
+        dtr0 = [c.param for c in commands if isinstance(c, gear.DTR0)]
+        self.assertEqual(dtr0, [3, 20, 50, 60, 100, 200])
+
+    def test_incomplete(self):
+        """without knowing all gear only short addresses are used"""
+        commands = apply_configuration(self.driver, self.desired)
+        self.check(self.desired)
+        for c in commands:
+            if hasattr(c, 'destination'):
+                self.assertIsInstance(c.destination, address.Short)
+
+    def test_unchanged(self):
+        """settings already in place are not sent again"""
+        apply_configuration(self.driver, self.desired, complete=True)
+        self.desired[3]['scenes'][0] = 10
+        self.desired[4]['power_on_level'] = 254
+        self.assertEqual(
+            [str(c) for c in apply_configuration(
+                self.driver, self.desired, complete=True)],
+            ['DTR0(10)', 'SetScene(<address 3>,0)',
+             'DTR0(254)', 'SetPowerOnLevel(<address 4>)'])
+
+    def test_level_range(self):
+        """min and max level are changed in an order keeping them valid"""
+        for low, high in ((20, 50), (200, 254), (1, 10), (100, 150)):
+            desired = dict((a, {'min_level': low, 'max_level': high})
+                           for a in range(8))
+            apply_configuration(self.driver, desired, complete=True)
+            self.check(desired)
+
+    def test_unknown_gear(self):
+        """gear missing in the current configuration gets all settings"""
+        commands = plan_configuration(
+            {}, {5: {'groups': 0x01, 'fade_rate': 3}}, complete=True)
+        self.assertEqual(
+            [str(c) for c in commands],
+            ['AddToGroup(<address 5>,0)'] +
+            ['RemoveFromGroup(<address 5>,{})'.format(g)
+             for g in range(1, 16)] +
+            ['DTR0(3)', 'SetFadeRate(<address 5>)'])
+
+    def test_unknown_groups(self):
+        """groups are not used while the groups of any gear are unknown"""
+        current = dict((a, {'groups': 0x01, 'fade_rate': 7})
+                       for a in (1, 2))
+        desired = {1: {'fade_rate': 3}, 2: {'fade_rate': 3},
+                   3: {'fade_rate': 1}}
+        commands = plan_configuration(current, desired, complete=True)
+        self.assertEqual(
+            [str(c) for c in commands],
+            ['DTR0(1)', 'SetFadeRate(<address 3>)',
+             'DTR0(3)', 'SetFadeRate(<address 1>)',
+             'SetFadeRate(<address 2>)'])
+
+    def test_read_unknown_groups(self):
+        """groups are unknown if either query is not answered"""
+
+        class Driver(SimulatorDriver):
+            def send(self, command, timeout=None):
+                if isinstance(command, gear.QueryGroupsEightToFifteen):
+                    return command._response(None)
+                return super(Driver, self).send(command, timeout)
+
+        current = read_configuration(Driver(self.bus), range(8), ())
+        self.assertEqual(len(current), 8)
+        for settings in current.values():
+            self.assertIsNone(settings['groups'])
+        commands = plan_configuration(
+            current, {0: {'groups': 0x0101}}, complete=True)
+        self.assertEqual(len(commands), 16)
+
+
+class TestLevels(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedBus(seed=0)
+        self.gear = self.bus.populate(20, addressed=True)
+        self.driver = SimulatorDriver(self.bus)
+        self.groups = dict((a, 1 if a < 10 else 2) for a in range(20))
+        for g in self.gear:
+            g.groups = self.groups[g.short_address]
+
+    def apply(self, levels, **kw):
+        commands = plan_levels(levels, self.groups, **kw)
+        for c in commands:
+            self.driver.send(c)
+        for g in self.gear:
+            level = levels.get(g.short_address)
+            if level is not None:
+                self.assertEqual(g.actual_level, level)
+        return [str(c) for c in commands]
+
+    def test_exceptions(self):
+        levels = dict((a, 100) for a in range(20))
+        levels[3] = 50
+        levels[7] = 0
+        self.assertEqual(
+            self.apply(levels, complete=True),
+            ['ArcPower(<broadcast>,100)', 'ArcPower(<address 3>,50)',
+             'Off(<address 7>)'])
+
+    def test_groups(self):
+        levels = dict((a, 100 if a < 10 else 200) for a in range(20))
+        self.assertEqual(
+            self.apply(levels, complete=True),
+            ['ArcPower(<broadcast>,100)', 'ArcPower(<group 1>,200)'])
+        # without knowing all gear on the bus, every gear is addressed
+        self.assertEqual(len(self.apply(levels)), 20)
+
+    def test_scenes(self):
+        levels = dict((a, 100 + a) for a in range(20))
+        scenes = dict((a, {5: levels[a]}) for a in range(20))
+        for g in self.gear:
+            g.scenes[5] = levels[g.short_address]
+        self.assertEqual(
+            self.apply(levels, scenes=scenes, complete=True),
+            ['GoToScene(<broadcast>,5)'])
+
+    def test_current(self):
+        levels = dict((a, 254) for a in range(20))
+        current = dict(levels)
+        levels[4] = 10
+        levels[5] = None
+        self.assertEqual(
+            self.apply(levels, current=current, complete=True),
+            ['ArcPower(<address 4>,10)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
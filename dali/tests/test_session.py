@@ -0,0 +1,275 @@
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali.device import general as device
+from dali.driver.simulator import SimulatedBus
+from dali.driver.simulator import SimulatorDriver
+from dali.command import Command
+from dali.exceptions import CommunicationError
+from dali.frame import ForwardFrame
+from dali.gear import emergency
+from dali.gear import general as gear
+from dali.session import DTRSession
+from dali.session import DeviceTypeSession
+from dali.session import GearStateSession
+import random
+
+
+class FailingDriver(SimulatorDriver):
+
+    def send(self, command, timeout=None):
+        raise CommunicationError('bus failed')
+
+
+class TestDTRSession(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedBus(seed=0)
+        self.gear = self.bus.populate(4, addressed=True)
+        self.session = DTRSession(SimulatorDriver(self.bus))
+
+    def test_scenes(self):
+        """DTR0 is only sent when its value changes"""
+        send = self.session.send
+        for scene, level in enumerate((10, 10, 20, 20)):
+            for a in range(4):
+                send(gear.DTR0(level))
+                send(gear.SetScene(address.Short(a), scene))
+        # 16 DTR0 commands of which 14 are redundant, SetScene is sent
+        # twice
+        self.assertEqual(self.bus.frames, 2 + 16 * 2)
+        self.assertEqual(self.session.frames_saved, 14)
+        self.assertEqual(self.session.dtr(0), 20)
+        for a in range(4):
+            level = send(gear.QuerySceneLevel(address.Short(a), 3)).value
+            self.assertEqual(level.as_integer, 20)
+
+    def test_modified(self):
+        """commands modifying DTRs make their values unknown"""
+        send = self.session.send
+        send(gear.DTR0(1))
+        send(gear.DTR1(2))
+        send(gear.ReadMemoryLocation(address.Short(0)))
+        self.assertIsNone(self.session.dtr(0))
+        self.assertEqual(self.session.dtr(1), 2)
+        frames = self.bus.frames
+        send(gear.DTR0(1))
+        self.assertEqual(self.bus.frames, frames + 1)
+
+    def test_device_dtrs(self):
+        """control devices have DTRs of their own"""
+        send = self.session.send
+        send(gear.DTR0(5))
+        send(device.DTR1DTR0(7, 5))
+        self.assertEqual(self.session.frames_saved, 0)
+        self.assertEqual(self.session.dtr(0, 24), 5)
+        self.assertEqual(self.session.dtr(1, 24), 7)
+        send(device.DTR0(5))
+        self.assertEqual(self.session.frames_saved, 1)
+        self.assertEqual(self.session.dtr(1), None)
+
+    def test_failure(self):
+        """DTRs are unknown after a failed command"""
+        self.session.send(gear.DTR0(5))
+        self.session.interface = FailingDriver(self.bus)
+        with self.assertRaises(CommunicationError):
+            self.session.send(gear.Off(address.Broadcast()))
+        self.assertIsNone(self.session.dtr(0))
+
+
+class RecordingDriver(SimulatorDriver):
+
+    def __init__(self, bus):
+        super(RecordingDriver, self).__init__(bus)
+        self.sent = []
+
+    def send(self, command, timeout=None):
+        self.sent.append(command.frame)
+        return super(RecordingDriver, self).send(command, timeout)
+
+
+class TestDeviceTypeSession(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedBus(seed=0)
+        self.bus.populate(4, addressed=True)
+        self.driver = RecordingDriver(self.bus)
+        self.session = DeviceTypeSession(self.driver)
+
+    def test_audit(self):
+        """every extended command is preceded by exactly one
+        EnableDeviceType
+        """
+        send = self.session.send
+        for a in range(4):
+            send(gear.EnableDeviceType(1))
+            send(emergency.QueryEmergencyMode(address.Short(a)))
+            send(emergency.QueryEmergencyFeatures(address.Short(a)))
+        self.assertEqual(len(self.driver.sent), 16)
+        for enable, query in zip(self.driver.sent[::2],
+                                 self.driver.sent[1::2]):
+            self.assertEqual(enable, gear.EnableDeviceType(1).frame)
+            self.assertEqual(Command.from_frame(query, 1)._devicetype, 1)
+        self.assertEqual(self.session.frames_saved, 0)
+
+    def test_redundant(self):
+        """EnableDeviceType not followed by an extended command is left
+        out
+        """
+        send = self.session.send
+        send(gear.EnableDeviceType(1))
+        send(gear.EnableDeviceType(1))
+        send(gear.QueryActualLevel(address.Short(0)))
+        send(gear.EnableDeviceType(6))
+        send(emergency.QueryEmergencyMode(address.Short(0)))
+        self.assertEqual(self.driver.sent, [
+            gear.QueryActualLevel(address.Short(0)).frame,
+            gear.EnableDeviceType(1).frame,
+            emergency.QueryEmergencyMode(address.Short(0)).frame,
+        ])
+        self.assertEqual(self.session.frames_saved, 3)
+
+    def test_unknown_command(self):
+        """EnableDeviceType is kept for commands the library does not
+        know
+        """
+        unknown = Command(ForwardFrame(16, 0x01ff))
+        self.session.send(gear.EnableDeviceType(200))
+        self.session.send(unknown)
+        self.assertEqual(
+            self.driver.sent,
+            [gear.EnableDeviceType(200).frame, unknown.frame])
+
+    def test_needs_devicetype(self):
+        """EnableDeviceType is kept for commands needing one"""
+        self.bus.populate(1, addressed=True, device_types=(6,))
+        query = gear.QueryExtendedVersionNumber(address.Short(4))
+        self.session.send(gear.EnableDeviceType(6))
+        response = self.session.send(query)
+        self.assertEqual(response.value.as_integer,
+                         self.bus.gear[4].extended_version_number)
+        self.assertEqual(
+            self.driver.sent, [gear.EnableDeviceType(6).frame, query.frame])
+        self.assertEqual(self.session.frames_saved, 0)
+        # device type 0 is a device type as well
+        self.session.send(gear.EnableDeviceType(0))
+        self.session.send(query)
+        self.assertEqual(self.driver.sent[2:], [
+            gear.EnableDeviceType(0).frame, query.frame])
+
+
+class TestGearStateSession(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedBus(seed=0)
+        self.gear = self.bus.populate(4, addressed=True)
+        self.driver = SimulatorDriver(self.bus)
+        self.now = 0
+        self.session = GearStateSession(
+            self.driver, ttl={'actual_level': 10}, clock=lambda: self.now)
+
+    def query(self, cmd, *args):
+        return self.session.send(cmd(address.Short(1), *args)).value
+
+    def test_queries(self):
+        """answers are taken from the cache until they expire"""
+        level = self.query(gear.QueryActualLevel)
+        frames = self.bus.frames
+        self.assertEqual(self.query(gear.QueryActualLevel), level)
+        self.assertEqual(self.bus.frames, frames)
+        self.assertEqual((self.session.hits, self.session.misses), (1, 1))
+        self.now = 10
+        self.query(gear.QueryActualLevel)
+        self.assertEqual(self.bus.frames, frames + 1)
+        self.query(gear.QueryMaxLevel)
+        self.now = 1000
+        self.query(gear.QueryMaxLevel)
+        self.assertEqual(self.bus.frames, frames + 2)
+
+    def test_write_through(self):
+        """commands sent update the cache"""
+        send = self.session.send
+        self.query(gear.QueryMinLevel)
+        self.query(gear.QueryMaxLevel)
+        self.query(gear.QueryGroupsZeroToSeven)
+        send(gear.DAPC(address.Broadcast(), 100))
+        send(gear.AddToGroup(address.Short(1), 3))
+        send(gear.DTR0(42))
+        send(gear.SetScene(address.Short(1), 2))
+        send(gear.Off(address.Group(3)))
+        frames = self.bus.frames
+        self.assertEqual(self.query(gear.QueryActualLevel).as_integer, 0)
+        self.assertEqual(
+            self.query(gear.QueryGroupsZeroToSeven).as_integer, 0x08)
+        self.assertEqual(self.query(gear.QuerySceneLevel, 2).as_integer, 42)
+        send(gear.GoToScene(address.Short(1), 2))
+        self.assertEqual(self.query(gear.QueryActualLevel).as_integer, 42)
+        self.assertEqual(self.bus.frames, frames + 1)
+
+    def test_unknown_members(self):
+        """group commands make the state of possible members unknown"""
+        self.query(gear.QueryActualLevel)
+        self.session.send(gear.Off(address.Group(3)))
+        self.assertIsNone(self.session.get(1, 'actual_level'))
+
+    def test_consistent(self):
+        """the cache agrees with the gear after random commands"""
+        rnd = random.Random(1)
+        send = self.session.send
+        for i in range(300):
+            a = rnd.choice([address.Short(rnd.randrange(4)),
+                            address.Group(rnd.randrange(3)),
+                            address.Broadcast()])
+            n = rnd.randrange(3)
+            send(rnd.choice([
+                gear.DTR0(rnd.choice([0, 1, 50, 200, 254, 255])),
+                gear.DAPC(a, rnd.choice([0, 1, 50, 200, 254, 255])),
+                gear.Off(a),
+                gear.Up(a),
+                gear.RecallMaxLevel(a),
+                gear.RecallMinLevel(a),
+                gear.GoToScene(a, n),
+                gear.SetScene(a, n),
+                gear.RemoveFromScene(a, n),
+                gear.AddToGroup(a, n),
+                gear.RemoveFromGroup(a, n),
+                gear.SetMaxLevel(a),
+                gear.SetMinLevel(a),
+                gear.SetPowerOnLevel(a),
+                gear.Reset(a),
+            ]))
+            short = address.Short(rnd.randrange(4))
+            query = rnd.choice([
+                gear.QueryActualLevel(short),
+                gear.QueryMaxLevel(short),
+                gear.QueryMinLevel(short),
+                gear.QueryPhysicalMinimum(short),
+                gear.QueryPowerOnLevel(short),
+                gear.QuerySceneLevel(short, n),
+                gear.QueryGroupsZeroToSeven(short),
+            ])
+            self.assertEqual(send(query).value.as_integer,
+                             self.driver.send(query).value.as_integer,
+                             '{} after {} commands'.format(query, i))
+        self.assertGreater(self.session.hits, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
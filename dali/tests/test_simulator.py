@@ -0,0 +1,135 @@
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali.driver.simulator import AsyncSimulatorDriver
+from dali.driver.simulator import SimulatedBus
+from dali.driver.simulator import SimulatedGear
+from dali.driver.simulator import SimulatorDriver
+from dali.gear import general as gear
+
+
+class TestSimulator(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedBus(seed=0)
+        self.gear = self.bus.populate(3, addressed=True)
+        self.driver = SimulatorDriver(self.bus)
+
+    def query(self, cmd, *args):
+        return self.driver.send(cmd(address.Short(1), *args)).value
+
+    def test_addressing(self):
+        """gear answers commands addressed to it"""
+        self.bus.add_gear(SimulatedGear(groups=[2]))
+        send = self.driver.send
+        self.assertTrue(send(gear.QueryControlGearPresent(
+            address.Short(2))).value)
+        self.assertFalse(send(gear.QueryControlGearPresent(
+            address.Short(3))).value)
+        self.assertTrue(send(gear.QueryControlGearPresent(
+            address.Group(2))).value)
+        self.assertFalse(send(gear.QueryControlGearPresent(
+            address.Group(3))).value)
+        r = send(gear.QueryMissingShortAddress(address.Broadcast()))
+        self.assertTrue(r.value)
+        self.assertFalse(r.error)
+        r = send(gear.QueryControlGearPresent(address.Broadcast()))
+        self.assertTrue(r.value)
+        self.assertTrue(r.error)
+
+    def test_levels(self):
+        """arc power commands respect min and max level"""
+        self.driver.send(gear.DAPC(address.Broadcast(), 100))
+        self.assertEqual(self.query(gear.QueryActualLevel).as_integer, 100)
+        self.driver.send(gear.DTR0(50))
+        self.driver.send(gear.SetMaxLevel(address.Short(1)))
+        self.assertEqual(self.query(gear.QueryActualLevel).as_integer, 50)
+        self.driver.send(gear.DAPC(address.Short(1), 60))
+        self.assertEqual(self.query(gear.QueryActualLevel).as_integer, 50)
+        self.assertTrue(self.query(gear.QueryLimitError))
+        self.driver.send(gear.Off(address.Short(1)))
+        self.assertFalse(self.query(gear.QueryLampPowerOn))
+        self.driver.send(gear.DTR0(20))
+        self.driver.send(gear.SetScene(address.Short(1), 4))
+        self.driver.send(gear.GoToScene(address.Broadcast(), 4))
+        self.assertEqual(self.query(gear.QueryActualLevel).as_integer, 20)
+        self.assertEqual([g.actual_level for g in self.gear], [100, 20, 100])
+        self.assertEqual(self.query(gear.QuerySceneLevel, 4).as_integer, 20)
+
+    def test_send_twice(self):
+        """configuration commands only take effect when repeated"""
+        self.bus.transmit(gear.AddToGroup(address.Short(1), 5).frame)
+        self.assertEqual(self.gear[1].groups, 0)
+        self.bus.transmit(gear.AddToGroup(address.Short(1), 5).frame)
+        self.assertEqual(self.gear[1].groups, 1 << 5)
+        self.assertEqual(self.query(gear.QueryGroupsZeroToSeven).as_integer,
+                         1 << 5)
+        self.assertFalse(self.query(gear.QueryResetState))
+
+    def test_device_type(self):
+        """device types are reported and enable extended commands"""
+        self.gear[1].device_types = (1, 6)
+        self.assertEqual(self.query(gear.QueryDeviceType).as_integer, 0xff)
+        self.assertEqual(self.query(gear.QueryNextDeviceType).as_integer, 1)
+        self.assertEqual(self.query(gear.QueryNextDeviceType).as_integer, 6)
+        self.assertEqual(self.query(gear.QueryNextDeviceType).as_integer, 254)
+        self.assertEqual(self.query(gear.QueryNextDeviceType).as_integer, 254)
+        self.query(gear.QueryActualLevel)
+        self.assertEqual(self.query(gear.QueryNextDeviceType), None)
+        self.assertEqual(self.query(gear.QueryExtendedVersionNumber), None)
+        self.driver.send(gear.EnableDeviceType(6))
+        self.assertEqual(
+            self.query(gear.QueryExtendedVersionNumber).as_integer, 1)
+
+    def test_memory(self):
+        """memory banks can be read and written"""
+        self.gear[1].memory_banks[1] = [0x10] + [0] * 0x10
+        send = self.driver.send
+        send(gear.DTR1(1))
+        send(gear.DTR0(2))
+        self.assertEqual(
+            send(gear.WriteMemoryLocation(0x55)).value, None)
+        send(gear.EnableWriteMemory(address.Short(1)))
+        self.assertEqual(
+            send(gear.WriteMemoryLocation(0x55)).value.as_integer, 0x55)
+        send(gear.DTR0(2))
+        self.assertEqual(self.query(gear.ReadMemoryLocation).as_integer, 0x55)
+        self.assertEqual(self.query(gear.QueryContentDTR0).as_integer, 3)
+
+    def test_async(self):
+        """asynchronous driver calls back and dispatches frames"""
+        driver = AsyncSimulatorDriver(self.bus)
+        received = []
+        responses = []
+        driver.dispatcher = received.append
+        self.driver.send(gear.RecallMinLevel(address.Short(0)))
+        self.assertIsInstance(received[0], gear.RecallMinLevel)
+        driver.send(gear.QueryActualLevel(address.Short(0)),
+                    callback=lambda r, **kw: responses.append((r, kw)),
+                    tag=1)
+        self.assertEqual(responses[0][0].value.as_integer, 1)
+        self.assertEqual(responses[0][1], {'tag': 1})
+        driver.close()
+        self.driver.send(gear.Off(address.Short(0)))
+        self.assertEqual(len(received), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+from __future__ import unicode_literals
+import os
+import sys
+import threading
+import time
+import unittest
+
+
+try:
+    import dali
+except ImportError:
+    # Realign paths, and try import again
+    # Since pyCharm's unittest runner fails on relative imports
+    path = os.path
+    PACKAGE_PARENT = '../..'
+    SCRIPT_DIR = path.dirname(
+        path.realpath(path.join(os.getcwd(), path.expanduser(__file__)))
+    )
+    sys.path.append(path.normpath(path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+
+from dali import address
+from dali.device import general as device
+from dali.driver import tridonic
+from dali.driver.tridonic import DALI_USB_NO_RESPONSE
+from dali.driver.tridonic import TridonicDALIUSBDriver
+from dali.exceptions import CommunicationError
+from dali.frame import BackwardFrame
+from dali.frame import ForwardFrame
+import array
+from dali.gear import general as gear
+
+
+class TestTridonicDALIUSBDriver(unittest.TestCase):
+
+    def test_construct_16bit(self):
+        driver = TridonicDALIUSBDriver()
+        data = driver.construct(gear.DAPC(address.Short(1), 0x80))
+        self.assertEqual(len(data), 64)
+        self.assertEqual(
+            list(data[:8]), [0x12, 0x01, 0x00, 0x03, 0x00, 0x00, 0x02, 0x80])
+        self.assertEqual(data[8:], bytearray(56))
+
+    def test_construct_24bit(self):
+        driver = TridonicDALIUSBDriver()
+        data = driver.construct(device.QueryDeviceStatus(address.Short(5)))
+        self.assertEqual(
+            list(data[:8]), [0x12, 0x01, 0x00, 0x04, 0x00, 0x0b, 0xfe, 0x30])
+
+    def test_construct_send_twice(self):
+        driver = TridonicDALIUSBDriver()
+        data = driver.construct(gear.AddToGroup(address.Short(1), 3))
+        self.assertEqual(
+            list(data[:8]), [0x12, 0x01, 0x20, 0x03, 0x00, 0x00, 0x03, 0x63])
+        data = driver.construct(gear.Off(address.Short(1)))
+        self.assertEqual(data[2], 0x00)
+
+    def test_construct_reuses_packet(self):
+        driver = TridonicDALIUSBDriver()
+        first = driver.construct(device.QueryDeviceStatus(address.Short(5)))
+        second = driver.construct(gear.Off(address.Broadcast()))
+        self.assertIs(first, second)
+        self.assertEqual(
+            list(second[:8]), [0x12, 0x02, 0x00, 0x03, 0x00, 0x00, 0xff, 0x00])
+        # drivers do not share their packets
+        other = TridonicDALIUSBDriver()
+        self.assertIsNot(other.construct(gear.Off(address.Broadcast())),
+                         first)
+
+    def test_extract(self):
+        driver = TridonicDALIUSBDriver()
+        report = bytearray(64)
+        report[:9] = bytearray(
+            (0x11, 0x73, 0x00, 0x00, 0xff, 0x93, 0xff, 0xff, 0x07))
+        for data in (bytes(report), report, memoryview(report),
+                     array.array('B', report)):
+            self.assertEqual(driver.extract(data), ForwardFrame(16, 0xff93))
+        report[:2] = bytearray((0x12, 0x72))
+        frame = driver.extract(memoryview(report))
+        self.assertIsInstance(frame, BackwardFrame)
+        self.assertEqual(frame.as_integer, 0x93)
+        report[1] = 0x71
+        self.assertIs(driver.extract(report), DALI_USB_NO_RESPONSE)
+        report[0] = 0x42
+        self.assertIsNone(driver.extract(report))
+
+
+class FakeBackend(object):
+    """Stands in for the USB backend, answers every read with a
+    backward frame and records the read timeouts.
+    """
+
+    def __init__(self, vendor, product, **kw):
+        self.timeouts = []
+
+    def write(self, data):
+        pass
+
+    def read(self, timeout=None):
+        self.timeouts.append(timeout)
+        report = bytearray(64)
+        report[:2] = bytearray((0x12, 0x72))
+        report[5] = 0x42
+        return report
+
+
+class TestSyncTridonicDALIUSBDriver(unittest.TestCase):
+
+    def setUp(self):
+        self._backend = tridonic.USBBackend
+        tridonic.USBBackend = FakeBackend
+
+    def tearDown(self):
+        tridonic.USBBackend = self._backend
+
+    def test_timeout(self):
+        """the timeout in seconds is passed to pyusb in milliseconds"""
+        driver = tridonic.SyncTridonicDALIUSBDriver()
+        command = gear.QueryActualLevel(address.Short(1))
+        self.assertEqual(driver.send(command).value.as_integer, 0x42)
+        self.assertEqual(driver.send(command, timeout=0.25).value.as_integer,
+                         0x42)
+        self.assertEqual(driver.backend.timeouts, [None, 250])
+
+
+class FakeListener(object):
+    """Stands in for the USB listener, records the written packets."""
+
+    def __init__(self, driver, vendor, product, **kw):
+        self.driver = driver
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    def close(self):
+        pass
+
+    def answer(self, sn, value=None):
+        """Let the driver receive the answer to sequence number sn."""
+        report = bytearray(64)
+        report[0] = 0x12
+        report[1] = 0x71 if value is None else 0x72
+        report[5] = value or 0
+        report[8] = sn
+        self.driver.receive(report)
+
+
+class TestAsyncTridonicDALIUSBDriver(unittest.TestCase):
+
+    def setUp(self):
+        self._listener = tridonic.USBListener
+        tridonic.USBListener = FakeListener
+
+    def tearDown(self):
+        tridonic.USBListener = self._listener
+
+    def create(self, **kw):
+        driver = tridonic.AsyncTridonicDALIUSBDriver(**kw)
+        self.addCleanup(driver.close)
+        return driver
+
+    def test_response(self):
+        driver = self.create()
+        responses = []
+        driver.send(gear.QueryActualLevel(address.Short(1)),
+                    callback=responses.append)
+        self.assertEqual(driver.pending, 1)
+        driver.backend.answer(1, 0x42)
+        self.assertEqual(driver.pending, 0)
+        self.assertEqual(responses[0].value.as_integer, 0x42)
+        # answers to unknown requests are ignored
+        driver.backend.answer(1, 0x42)
+        self.assertEqual(len(responses), 1)
+
+    def test_back_pressure(self):
+        driver = self.create(window=2)
+        driver.send(gear.Off(address.Short(1)))
+        driver.send(gear.Off(address.Short(2)))
+        sender = threading.Thread(
+            target=driver.send, args=(gear.Off(address.Short(3)),))
+        sender.start()
+        sender.join(0.1)
+        self.assertTrue(sender.is_alive())
+        self.assertEqual(len(driver.backend.written), 2)
+        driver.backend.answer(1)
+        sender.join(1)
+        self.assertFalse(sender.is_alive())
+        self.assertEqual(len(driver.backend.written), 3)
+        self.assertEqual(driver.pending, 2)
+
+    def test_send_from_callback_with_full_window(self):
+        driver = self.create(window=1)
+        errors = []
+
+        def callback(response):
+            try:
+                driver.send(gear.Off(address.Short(2)))
+                driver.send(gear.Off(address.Short(3)))
+            except CommunicationError as e:
+                errors.append(e)
+
+        driver.send(gear.Off(address.Short(1)), callback=callback)
+        driver.backend.answer(1)
+        # the first send fits into the window freed by the response
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(len(driver.backend.written), 2)
+
+    def test_timeout(self):
+        driver = self.create(timeout=0.05)
+        responses = []
+        done = threading.Event()
+
+        def callback(response):
+            responses.append(response)
+            done.set()
+
+        start = time.time()
+        driver.send(gear.QueryActualLevel(address.Short(1)),
+                    callback=callback)
+        self.assertTrue(done.wait(2))
+        self.assertGreaterEqual(time.time() - start, 0.05)
+        self.assertIsNone(responses[0].value)
+        self.assertEqual(driver.pending, 0)
+        # late answer of the expired transaction is ignored
+        driver.backend.answer(1, 0x42)
+        self.assertEqual(len(responses), 1)
+
+    def test_close(self):
+        driver = self.create(window=1)
+        driver.send(gear.Off(address.Short(1)))
+        expiry = driver._expiry
+        self.assertTrue(expiry.is_alive())
+        errors = []
+
+        def send():
+            try:
+                driver.send(gear.Off(address.Short(2)))
+            except CommunicationError as e:
+                errors.append(e)
+
+        # waiting for the window
+        sender = threading.Thread(target=send)
+        sender.start()
+        sender.join(0.05)
+        driver.close()
+        self.assertFalse(expiry.is_alive())
+        sender.join(1)
+        self.assertEqual(len(errors), 1)
+        with self.assertRaises(CommunicationError):
+            driver.send(gear.Off(address.Short(1)))
+
+    def test_skip_pending_sequence_numbers(self):
+        driver = self.create()
+        driver.send(gear.Off(address.Short(1)))
+        driver.send(gear.Off(address.Short(2)))
+        driver.backend.answer(1)
+        # wrap around to the sequence number still pending
+        driver._next_sn = 2
+        driver.send(gear.Off(address.Short(3)))
+        self.assertEqual(
+            [bytearray(data)[1] for data in driver.backend.written],
+            [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()